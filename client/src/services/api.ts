@@ -1,6 +1,7 @@
 import axios from "axios";
 import {
   Restaurant,
+  Recommendation,
   UserPreferences,
   RecommendationsResponse,
   ApiStatus,
@@ -40,3 +41,47 @@ export const getRecommendations = async (
   });
   return response.data;
 };
+
+// Streams recommendations from the NDJSON endpoint, calling onRecommendation
+// as soon as each validated recommendation arrives.
+export const streamRecommendations = async (
+  preferences: UserPreferences,
+  onRecommendation: (recommendation: Recommendation) => void
+): Promise<RecommendationsResponse> => {
+  const response = await fetch(`${API_BASE_URL}/recommendations/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ preferences }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const result: RecommendationsResponse = { recommendations: [] };
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  const handleLine = (line: string) => {
+    if (!line.trim()) return;
+    const event = JSON.parse(line);
+    if (event.type === "recommendation") {
+      result.recommendations.push(event.recommendation);
+      onRecommendation(event.recommendation);
+    } else if (event.type === "error") {
+      result.error = event.error;
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+
+  return result;
+};
@@ -32,14 +32,43 @@ client = None
 gmaps = None
 maps_api_available = False
 
+# Streamlit reruns this script on every interaction, so client creation and the
+# live API checks are cached per process instead of repeated on each rerun.
+@st.cache_resource
+def init_openai_client(api_key):
+    """Create the OpenAI client and verify the key once per process"""
+    openai_client = openai.OpenAI(api_key=api_key)
+    openai_client.models.list()
+    return openai_client
+
+class MapsProbeError(Exception):
+    """Google Maps API test request did not return OK"""
+
+@st.cache_data(ttl=3600)
+def probe_google_maps(api_key):
+    """Test the API key with a simple Places API request, at most once an hour
+
+    Failures raise MapsProbeError, so only a successful probe is cached and a
+    transient error is retried on the next rerun.
+    """
+    test_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location=-33.8670522,151.1957362&radius=500&type=restaurant&key={api_key}"
+    test_data = requests.get(test_url, timeout=10).json()
+    if test_data.get('status') != 'OK':
+        raise MapsProbeError(f"Status: {test_data.get('status')}, Error: {test_data.get('error_message', 'No error message')}")
+    return test_data
+
+@st.cache_resource
+def init_gmaps_client(api_key):
+    """Create the Google Maps client once per process"""
+    return googlemaps.Client(key=api_key)
+
 # Check if API keys are valid
 if not openai_api_key or openai_api_key == "your_openai_api_key_here":
     st.error("OpenAI API key not found. Please add your API key to the .env file.")
     st.stop()
 else:
     try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        client.models.list()
+        client = init_openai_client(openai_api_key)
         # Show success message only once at the beginning
         if not st.session_state.api_messages_shown:
             st.success("OpenAI API initialized successfully!")
@@ -54,16 +83,14 @@ try:
         st.error("Google Maps API key not found in environment variables")
         st.stop()
     
-    # Test the API key with a simple Places API request
-    test_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location=-33.8670522,151.1957362&radius=500&type=restaurant&key={google_maps_api_key}"
-    test_response = requests.get(test_url)
-    test_data = test_response.json()
-    
-    if test_data.get('status') != 'OK':
-        st.error(f"Google Maps API test failed. Status: {test_data.get('status')}, Error: {test_data.get('error_message', 'No error message')}")
+    # Test the API key with a simple Places API request (cached across reruns)
+    try:
+        probe_google_maps(google_maps_api_key)
+    except MapsProbeError as e:
+        st.error(f"Google Maps API test failed. {str(e)}")
         st.stop()
     
-    gmaps = googlemaps.Client(key=google_maps_api_key)
+    gmaps = init_gmaps_client(google_maps_api_key)
     maps_api_available = True  # Set the flag to True when API is successfully initialized
     
     # Show success message only once at the beginning
@@ -1,102 +1,90 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 import os
 import json
 import dotenv
 import openai
 import googlemaps
-import requests
+import httpx
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+import functools
+import itertools
+import time
+import hashlib
+import threading
+import uuid
+import heapq
 import shutil
 from termcolor import colored
+import click
+from cache import GeocodeCache, StaleWhileRevalidateCache, SingleFlight, StreamingSingleFlight, TTLCache, normalize_zipcode
+from parsing import RecommendationStreamParser, parse_recommendations
+from log_writer import LogWriter, read_entries, render_summary
+from metrics import MetricsRegistry
+from optimizer import build_recommendations, restaurant_key
+from menu_store import MenuStore
+from restaurant_catalog import RestaurantCatalog
+from scoring import CALORIE_BOUNDS, MACRO_BOUNDS, max_restaurant_score, rank_restaurants, score_candidates, score_restaurant
+from tokens import count_tokens, warm as warm_tokenizer
+from resilience import Deadline, hedged_call, retry_call
+from transport import HttpPools
 
 # Load environment variables
 dotenv.load_dotenv(override=True)
 
-# Create logs directory if it doesn't exist
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+# Per-stage latency histograms and counters, exposed at /api/metrics
+metrics = MetricsRegistry()
+metrics.describe('stage_duration_seconds', 'Time spent in each stage of the recommendation pipeline')
+metrics.describe('request_duration_seconds', 'Total time spent handling a request')
+metrics.describe('requests_total', 'Requests handled, by endpoint and status code')
+metrics.describe('sample_fallback_total', 'Responses that fell back to SAMPLE_RESTAURANTS')
+metrics.describe('upstream_errors_total', 'Errors returned by Google Maps or OpenAI')
+metrics.describe('openai_tokens_total', 'Tokens used by OpenAI completions')
+metrics.describe('parse_failures_total', 'OpenAI responses that were not valid JSON')
+metrics.describe('openai_retries_total', 'OpenAI calls retried after a transient error')
+metrics.describe('openai_hedges_total', 'Hedged second OpenAI calls started because the first was slow')
+metrics.describe('catalog_lookups_total', 'Restaurant lookups answered by the local catalog (hit) or sent to the Places API')
+metrics.describe('restaurant_early_starts_total', 'Recommendations that started before every Place Details lookup had finished')
 
-def format_json(data):
-    """Format JSON data with proper indentation and sorting"""
-    if isinstance(data, str):
-        try:
-            data = json.loads(data)
-        except json.JSONDecodeError:
-            return {"raw_text": data}
-    return data
+# Request logs are written by a background thread to daily JSONL files
+LOG_DIR = os.environ.get("LOG_DIR", "logs")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", 7))
 
-def log_to_file(data, prefix='request', timestamp=None):
-    """Write JSON data to a log file with timestamp and pretty formatting"""
-    if timestamp is None:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # Create a session directory for related logs
-    session_dir = f"logs/session_{timestamp}"
-    if not os.path.exists(session_dir):
-        os.makedirs(session_dir)
-    
-    # Create a filename with timestamp
-    filename = f"{session_dir}/{prefix}.json"
+log_writer = LogWriter(log_dir=LOG_DIR, max_bytes=LOG_MAX_BYTES, retention_days=LOG_RETENTION_DAYS)
+
+# Clients may send the same X-Request-ID twice, so it is logged next to the trace ID, never used as one
+CLIENT_REQUEST_ID_MAX_LENGTH = 128
+
+def new_trace_id():
+    """Return a unique, time-sortable trace ID for one request"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+def current_trace_id():
+    """Return the trace ID of the request being handled, if any"""
+    if has_request_context():
+        return g.get('trace_id')
+    return None
+
+def log_to_file(data, prefix='request', trace_id=None, client_request_id=None):
+    """Queue a log entry for the background writer; never blocks the request"""
+    if trace_id is None:
+        trace_id = current_trace_id() or new_trace_id()
     
-    try:
-        # Format the data
-        formatted_data = format_json(data)
-        
-        # Add metadata to the log
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "type": prefix,
-            "data": formatted_data
-        }
-        
-        # Write to file with pretty printing
-        with open(filename, 'w') as f:
-            json.dump(log_entry, f, indent=2, sort_keys=True)
-        
-        # Create a human-readable summary
-        summary_file = f"{session_dir}/summary.txt"
-        with open(summary_file, 'a') as f:
-            f.write(f"\n{'='*50}\n")
-            f.write(f"Log Entry: {prefix}\n")
-            f.write(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"{'='*50}\n")
-            
-            if prefix == 'request':
-                prefs = formatted_data.get('preferences', {})
-                f.write("User Preferences:\n")
-                f.write(f"- Calories: {prefs.get('calorie_count')} kcal\n")
-                f.write(f"- Protein: {prefs.get('macronutrients', {}).get('protein_grams')}g\n")
-                f.write(f"- Price Range: ${prefs.get('price_range', [0,0])[0]} - ${prefs.get('price_range', [0,0])[1]}\n")
-            
-            elif prefix == 'restaurants':
-                if isinstance(formatted_data, list):
-                    f.write(f"Found {len(formatted_data)} restaurants\n")
-                    for restaurant in formatted_data[:5]:  # Show first 5
-                        f.write(f"- {restaurant.get('name', 'Unknown')}\n")
-                    if len(formatted_data) > 5:
-                        f.write(f"  ... and {len(formatted_data) - 5} more\n")
-            
-            elif prefix == 'final_recommendations':
-                recs = formatted_data.get('recommendations', [])
-                f.write(f"Generated {len(recs)} recommendations\n")
-                for idx, rec in enumerate(recs, 1):
-                    f.write(f"\n{idx}. {rec.get('restaurant_name')}\n")
-                    f.write(f"   Dish: {rec.get('dish_name')}\n")
-                    f.write(f"   Calories: {rec.get('calories')} kcal\n")
-                    f.write(f"   Price: ${rec.get('price_range')}\n")
-            
-            f.write("\n")
-        
-        print(colored(f"Logged {prefix} to {filename}", 'green'))
-        
-    except Exception as e:
-        error_msg = f"Error logging to file: {str(e)}"
-        print(colored(error_msg, 'red'))
-        
-        # Log the error
-        with open(f"{session_dir}/errors.txt", 'a') as f:
-            f.write(f"{datetime.now().isoformat()}: {error_msg}\n")
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "trace_id": trace_id,
+        "type": prefix,
+        "data": data
+    }
+    if client_request_id:
+        entry["client_request_id"] = client_request_id
+    # Time since the request started, so stages can be joined for latency analysis
+    if has_request_context() and 'request_started' in g:
+        entry["elapsed_ms"] = round((time.monotonic() - g.request_started) * 1000, 1)
+    with metrics.timer('logging'):
+        log_writer.write(entry)
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -106,6 +94,286 @@ CORS(app)  # Enable CORS for all routes
 openai_api_key = os.environ.get("OPENAI_API_KEY")
 google_maps_api_key = os.environ.get("GOOGLE_MAPS_API_KEY")
 
+# Place Details fan-out settings
+PLACE_DETAILS_MAX_WORKERS = int(os.environ.get("PLACE_DETAILS_MAX_WORKERS", 10))
+PLACE_DETAILS_TIMEOUT = float(os.environ.get("PLACE_DETAILS_TIMEOUT", 5))
+PLACE_DETAILS_FIELDS = ['place_id', 'name', 'formatted_address', 'rating', 'price_level', 'opening_hours', 'business_status', 'user_ratings_total', 'type']
+
+# Nearby Search returns up to 20 places per page and at most 3 pages. A next_page_token
+# only becomes valid about 2 seconds after it is issued, so each extra page adds that
+# much to a cold lookup; Place Details for earlier pages run in the meantime
+NEARBY_MAX_RESULTS = int(os.environ.get("NEARBY_MAX_RESULTS", 20))
+NEARBY_PAGE_TOKEN_DELAY = float(os.environ.get("NEARBY_PAGE_TOKEN_DELAY", 2))
+NEARBY_PAGE_ATTEMPTS = 3
+NEARBY_RESULTS_LIMIT = 60
+
+# Shared pool so detail lookups for one search run in parallel
+place_details_executor = ThreadPoolExecutor(max_workers=PLACE_DETAILS_MAX_WORKERS, thread_name_prefix='place-details')
+
+# HTTP connection pools shared by the Google Maps and OpenAI clients. Each pool should
+# hold as many connections as calls the process makes at once, so requests reuse warm
+# keep-alive connections instead of paying for a TCP and TLS handshake
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", max(PLACE_DETAILS_MAX_WORKERS, 100)))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 60))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "false").lower() == "true"
+# Client-side rate limit of the googlemaps library
+MAPS_QUERIES_PER_SECOND = int(os.environ.get("MAPS_QUERIES_PER_SECOND", 60))
+
+http_pools = HttpPools(HTTP_POOL_SIZE, HTTP_KEEPALIVE_EXPIRY, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, http2=HTTP2_ENABLED)
+maps_session = None
+
+# Geocode cache settings; set GEOCODE_CACHE_DB to share cached ZIPs across workers
+GEOCODE_CACHE_DB = os.environ.get("GEOCODE_CACHE_DB")
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", 10000))
+GEOCODE_CACHE_TTL = int(os.environ.get("GEOCODE_CACHE_TTL", 30 * 24 * 3600))
+
+geocode_cache = GeocodeCache(db_path=GEOCODE_CACHE_DB, maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL)
+
+# Restaurant-set cache settings
+RESTAURANT_CACHE_SIZE = int(os.environ.get("RESTAURANT_CACHE_SIZE", 1024))
+RESTAURANT_CACHE_TTL = int(os.environ.get("RESTAURANT_CACHE_TTL", 600))
+RESTAURANT_CACHE_STALE_TTL = int(os.environ.get("RESTAURANT_CACHE_STALE_TTL", 3600))
+
+restaurant_cache = StaleWhileRevalidateCache(
+    maxsize=RESTAURANT_CACHE_SIZE,
+    ttl=RESTAURANT_CACHE_TTL,
+    stale_ttl=RESTAURANT_CACHE_STALE_TTL
+)
+
+# Recommendation (OpenAI response) cache settings
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 512))
+RECOMMENDATION_CACHE_TTL = int(os.environ.get("RECOMMENDATION_CACHE_TTL", 900))
+# Numeric targets are rounded to these steps so near-identical requests share a cache entry
+CALORIE_BUCKET = 50
+MACRO_BUCKET = 5
+
+recommendation_cache = TTLCache(maxsize=RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL)
+
+# Validated recommendations are ranked by distance to the targets and the best
+# RECOMMENDATION_LIMIT are returned (0 returns them all)
+RECOMMENDATION_LIMIT = int(os.environ.get("RECOMMENDATION_LIMIT", 5))
+
+# Concurrent identical upstream calls share one in-flight execution
+restaurant_flight = StreamingSingleFlight()
+completion_flight = SingleFlight()
+
+# Every request gets REQUEST_DEADLINE seconds; upstream calls are bounded by what is left
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", 30))
+
+# OpenAI call settings. Each attempt times out after OPENAI_TIMEOUT seconds and transient
+# errors are retried with jittered exponential backoff. With hedging on, a second call is
+# started once the first has taken longer than the recent p95 attempt latency
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 20))
+OPENAI_RETRIES = int(os.environ.get("OPENAI_RETRIES", 2))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", 0.5))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", 4))
+OPENAI_HEDGE_ENABLED = os.environ.get("OPENAI_HEDGE_ENABLED", "false").lower() == "true"
+OPENAI_HEDGE_MIN_DELAY = float(os.environ.get("OPENAI_HEDGE_MIN_DELAY", 2))
+# Attempts observed before the p95 is trusted; until then OPENAI_HEDGE_MIN_DELAY is used
+OPENAI_HEDGE_MIN_SAMPLES = 20
+
+hedge_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("OPENAI_HEDGE_MAX_WORKERS", 32)), thread_name_prefix='openai-hedge')
+
+# OpenAI completion settings
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_TEMPERATURE = 0.7
+OPENAI_MAX_TOKENS = 1000
+SYSTEM_PROMPT = "You are a helpful AI dining assistant that provides restaurant recommendations in JSON format. Always respond with valid JSON."
+
+# Instructions shared by every recommendation request. They are sent first and never
+# change, so the provider can cache the prefix; only RAG_PROMPT_TEMPLATE varies.
+# OpenAI only caches prompts of 1024 tokens or more on models that support it
+# (gpt-4o and later), and this prefix is about 700 tokens, so today it is not cached.
+RAG_INSTRUCTIONS = """Based on the restaurant data and user preferences in the user message, provide MULTIPLE diverse meal recommendations that match their dietary goals. Aim to provide at least 3-5 different recommendations from different restaurants.
+
+CRITICAL REQUIREMENTS:
+1. Provide AT LEAST 3 different recommendations that match the targets in the user message:
+   - Total calories within ±30% of the calorie target
+   - Protein, carbs and fats within ±40% of their targets
+   - Total price within the price range
+
+2. For EACH restaurant, suggest multiple ways to meet the targets:
+   - Provide different combinations of items
+   - Example: "Grilled Chicken + Rice + Vegetables" or "Burger + Side Salad + Sweet Potato"
+   - Include specific portion sizes and modifications
+   - Suggest different options for different preferences
+
+3. Focus on practical combinations that will help reach ALL macro targets:
+   - If carbs are low, suggest adding bread, rice, or potato sides
+   - If protein is low, suggest adding grilled chicken or protein shake
+   - If fats are low, suggest adding dressings or avocado
+
+4. Make recommendations DIVERSE:
+   - Include different cuisines
+   - Mix of lighter and heartier options
+   - Various protein sources (meat, fish, vegetarian)
+   - Different meal types (bowls, sandwiches, platters)
+
+Please provide recommendations in this exact JSON format:
+{
+    "recommendations": [
+        {
+            "restaurant_name": "Restaurant Name",
+            "address": "Full Address",
+            "dish_name": "Main Dish + Side Items",
+            "calories": 1000,
+            "macronutrients": {
+                "protein": 75,
+                "carbs": 100,
+                "fats": 33
+            },
+            "reason": "Explanation of how this meets the targets",
+            "price_range": 15
+        },
+        {
+            "restaurant_name": "Different Restaurant",
+            "address": "Different Address",
+            "dish_name": "Different Combination",
+            "calories": 950,
+            "macronutrients": {
+                "protein": 70,
+                "carbs": 95,
+                "fats": 35
+            },
+            "reason": "Different explanation",
+            "price_range": 18
+        }
+    ]
+}
+
+Note: 
+- The price_range should be a single numeric value representing the estimated total cost in dollars
+- Provide at least 3 different recommendations
+- Each recommendation should be from a different restaurant if possible
+- Make sure combinations are practical and available at the restaurant
+- Include specific portion sizes and modifications needed
+- When a restaurant lists menu items, build its meals only from those items, name them exactly as listed joined with " + ", and use their nutrition and price values"""
+
+RAG_SYSTEM_PROMPT = f"{SYSTEM_PROMPT}\n\n{RAG_INSTRUCTIONS}"
+
+# How the model is made to return the recommendation shape: "text" relies on the
+# prompt alone, "json_schema" uses structured outputs (needs a model that supports
+# them, e.g. gpt-4o-mini) and "tool" forces a submit_recommendations function call
+OPENAI_OUTPUT_MODE = os.environ.get("OPENAI_OUTPUT_MODE", "text").lower()
+OPENAI_OUTPUT_MODES = ('text', 'json_schema', 'tool')
+# Model families that accept response_format json_schema; the first gpt-4o snapshot does not
+STRUCTURED_OUTPUT_MODELS = ('gpt-4o', 'gpt-4.1', 'gpt-5', 'o1', 'o3', 'o4')
+STRUCTURED_OUTPUT_EXCLUDED = ('gpt-4o-2024-05-13',)
+
+
+def supports_structured_outputs(model):
+    """Whether model accepts a json_schema response_format"""
+    model = model.lower()
+    return model.startswith(STRUCTURED_OUTPUT_MODELS) and model not in STRUCTURED_OUTPUT_EXCLUDED
+
+
+if OPENAI_OUTPUT_MODE not in OPENAI_OUTPUT_MODES:
+    print(f"Unknown OPENAI_OUTPUT_MODE {OPENAI_OUTPUT_MODE!r}, using text")
+    OPENAI_OUTPUT_MODE = 'text'
+elif OPENAI_OUTPUT_MODE == 'json_schema' and not supports_structured_outputs(OPENAI_MODEL):
+    # Every request would be rejected with a 400; a forced tool call enforces the same schema
+    print(f"{OPENAI_MODEL} does not support structured outputs, using OPENAI_OUTPUT_MODE=tool")
+    OPENAI_OUTPUT_MODE = 'tool'
+RECOMMENDATIONS_TOOL = "submit_recommendations"
+
+_number = {"type": "number"}
+_string = {"type": "string"}
+RECOMMENDATIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "restaurant_name": _string,
+                    "address": _string,
+                    "dish_name": _string,
+                    "calories": _number,
+                    "macronutrients": {
+                        "type": "object",
+                        "properties": {"protein": _number, "carbs": _number, "fats": _number},
+                        "required": ["protein", "carbs", "fats"],
+                        "additionalProperties": False
+                    },
+                    "reason": _string,
+                    "price_range": _number
+                },
+                "required": ["restaurant_name", "address", "dish_name", "calories", "macronutrients", "reason", "price_range"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["recommendations"],
+    "additionalProperties": False
+}
+
+RAG_PROMPT_TEMPLATE = """Restaurant Data:
+{restaurant_json}
+
+User Preferences:
+{preferences_json}
+
+Targets:
+   - Total calories: {calories} calories
+   - Protein: {protein} grams
+   - Carbs: {carbs} grams
+   - Fats: {fats} grams
+   - Price range: ${min_price} - ${max_price}"""
+
+# Restaurants are ranked against the preferences and the best ones packed into the
+# prompt until their JSON reaches PROMPT_RESTAURANT_TOKENS (or PROMPT_MAX_RESTAURANTS)
+PROMPT_RESTAURANT_TOKENS = int(os.environ.get("PROMPT_RESTAURANT_TOKENS", 1500))
+PROMPT_MAX_RESTAURANTS = int(os.environ.get("PROMPT_MAX_RESTAURANTS", 8))
+
+# On a cold restaurant lookup the prompt is built as soon as RESTAURANT_EARLY_CANDIDATES
+# restaurants scoring at least RESTAURANT_EARLY_MIN_QUALITY of max_restaurant_score
+# have arrived, instead of after the slowest Place Details call.
+# 0 waits for every restaurant
+RESTAURANT_EARLY_CANDIDATES = int(os.environ.get("RESTAURANT_EARLY_CANDIDATES", PROMPT_MAX_RESTAURANTS))
+RESTAURANT_EARLY_MIN_QUALITY = float(os.environ.get("RESTAURANT_EARLY_MIN_QUALITY", 0.75))
+
+# Local meal optimizer settings. MENU_DB_PATH points to the SQLite menu store that
+# maps a restaurant's place_id (or name) to menu items with nutrition and price.
+MENU_DB_PATH = os.environ.get("MENU_DB_PATH")
+MENU_ITEMS_IN_PROMPT = int(os.environ.get("MENU_ITEMS_IN_PROMPT", 8))
+OPTIMIZER_MIN_RESULTS = int(os.environ.get("OPTIMIZER_MIN_RESULTS", 3))
+OPTIMIZER_MAX_ITEMS = int(os.environ.get("OPTIMIZER_MAX_ITEMS", 3))
+OPTIMIZER_LLM_REASONS = os.environ.get("OPTIMIZER_LLM_REASONS", "false").lower() == "true"
+
+menu_store = None
+if MENU_DB_PATH:
+    try:
+        menu_store = MenuStore(MENU_DB_PATH)
+    except Exception as e:
+        print(f"Error opening menu store: {str(e)}")
+
+# Local restaurant catalog. With RESTAURANT_CATALOG_DB set, restaurant lookups are answered
+# from a spatial index of crawled restaurants when a fresh crawl covers the area; misses
+# go to the Places API and queue the area for the background crawler
+RESTAURANT_CATALOG_DB = os.environ.get("RESTAURANT_CATALOG_DB")
+RESTAURANT_CATALOG_MAX_AGE = int(os.environ.get("RESTAURANT_CATALOG_MAX_AGE", 7 * 24 * 3600))
+RESTAURANT_CATALOG_REFRESH_INTERVAL = int(os.environ.get("RESTAURANT_CATALOG_REFRESH_INTERVAL", 24 * 3600))
+RESTAURANT_CATALOG_MAX_RESULTS = int(os.environ.get("RESTAURANT_CATALOG_MAX_RESULTS", 20))
+RESTAURANT_CATALOG_CRAWL_ENABLED = os.environ.get("RESTAURANT_CATALOG_CRAWL_ENABLED", "true").lower() == "true"
+RESTAURANT_CATALOG_CRAWL_INTERVAL = int(os.environ.get("RESTAURANT_CATALOG_CRAWL_INTERVAL", 60))
+# The crawler also needs coordinates and the UTC offset to answer open-now queries later
+CATALOG_DETAILS_FIELDS = PLACE_DETAILS_FIELDS + ['geometry', 'utc_offset']
+# Crawls are off the request path, so Place Details lookups may take longer
+CATALOG_DETAILS_TIMEOUT = 30
+
+restaurant_catalog = None
+if RESTAURANT_CATALOG_DB:
+    try:
+        restaurant_catalog = RestaurantCatalog(RESTAURANT_CATALOG_DB, max_age=RESTAURANT_CATALOG_MAX_AGE)
+    except Exception as e:
+        print(f"Error opening restaurant catalog: {str(e)}")
+
+# Set to start a crawl without waiting for RESTAURANT_CATALOG_CRAWL_INTERVAL
+catalog_crawl_wakeup = threading.Event()
+
 # Initialize clients
 client = None
 gmaps = None
@@ -155,100 +423,504 @@ SAMPLE_RESTAURANTS = [
     }
 ]
 
-# Initialize OpenAI client
-if openai_api_key and openai_api_key != "your_openai_api_key_here":
-    try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        client.models.list()
-        print("OpenAI API initialized successfully!")
-    except Exception as e:
-        print(f"Error initializing OpenAI client: {str(e)}")
-
-# Initialize Google Maps client
-try:
-    if google_maps_api_key:
-        # Test the API key with a simple Places API request
-        test_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location=-33.8670522,151.1957362&radius=500&type=restaurant&key={google_maps_api_key}"
-        test_response = requests.get(test_url)
-        test_data = test_response.json()
+# Health probe settings; the probe runs in a background thread so it never blocks startup
+HEALTH_PROBE_ENABLED = os.environ.get("HEALTH_PROBE_ENABLED", "true").lower() != "false"
+HEALTH_PROBE_INTERVAL = int(os.environ.get("HEALTH_PROBE_INTERVAL", 300))
+
+# Latest probe result per API: {"ok": bool, "checked_at": epoch seconds, "error": str or None}
+health_probe = {}
+clients_initialized = False
+clients_lock = threading.Lock()
+
+def init_clients():
+    """Create the OpenAI and Google Maps clients once per process, without network calls"""
+    global client, gmaps, maps_session, maps_api_available, clients_initialized
+    if clients_initialized:
+        return
+    with clients_lock:
+        if clients_initialized:
+            return
+        
+        # Initialize OpenAI client
+        if openai_api_key and openai_api_key != "your_openai_api_key_here":
+            try:
+                # Retries and timeouts are handled by call_openai, not the SDK
+                client = openai.OpenAI(
+                    api_key=openai_api_key,
+                    max_retries=0,
+                    http_client=http_pools.httpx_client('openai', timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT))
+                )
+                print("OpenAI client created")
+            except Exception as e:
+                print(f"Error initializing OpenAI client: {str(e)}")
+        
+        # Initialize Google Maps client
+        maps_session = http_pools.requests_session('google_maps')
+        try:
+            if google_maps_api_key:
+                gmaps = googlemaps.Client(
+                    key=google_maps_api_key,
+                    requests_session=maps_session,
+                    connect_timeout=HTTP_CONNECT_TIMEOUT,
+                    read_timeout=HTTP_READ_TIMEOUT,
+                    queries_per_second=MAPS_QUERIES_PER_SECOND
+                )
+                maps_api_available = True
+                print("Google Maps client created")
+            else:
+                print("Google Maps API key not found in environment variables")
+        except Exception as e:
+            print(f"Error initializing Google Maps client: {str(e)}")
+        
+        clients_initialized = True
         
-        if test_data.get('status') == 'OK':
-            gmaps = googlemaps.Client(key=google_maps_api_key)
-            maps_api_available = True
-            print("Google Maps API initialized successfully!")
+        # Load the tokenizer before the first prompt is built, without blocking startup
+        warm_tokenizer(OPENAI_MODEL)
+        if HEALTH_PROBE_ENABLED:
+            threading.Thread(target=health_probe_loop, name='health-probe', daemon=True).start()
+        if restaurant_catalog is not None and RESTAURANT_CATALOG_CRAWL_ENABLED and gmaps:
+            threading.Thread(target=catalog_crawler_loop, name='catalog-crawler', daemon=True).start()
+
+def probe_apis():
+    """Check both APIs with a live request and record the results in health_probe"""
+    global maps_api_available
+    if client:
+        try:
+            client.models.list()
+            health_probe['openai'] = {"ok": True, "checked_at": time.time(), "error": None}
+        except Exception as e:
+            health_probe['openai'] = {"ok": False, "checked_at": time.time(), "error": str(e)}
+            print(f"OpenAI API health probe failed: {str(e)}")
+    
+    if gmaps:
+        try:
+            # Test the API key with a simple Places API request
+            test_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location=-33.8670522,151.1957362&radius=500&type=restaurant&key={google_maps_api_key}"
+            test_data = maps_session.get(test_url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)).json()
+            ok = test_data.get('status') == 'OK'
+            error = None if ok else f"Status: {test_data.get('status')}, Error: {test_data.get('error_message', 'No error message')}"
+            health_probe['google_maps'] = {"ok": ok, "checked_at": time.time(), "error": error}
+            # A rejected key falls back to sample data instead of failing every request
+            maps_api_available = ok
+            if not ok:
+                print(f"Google Maps API health probe failed. {error}")
+        except Exception as e:
+            # Network errors are reported but do not disable the API
+            health_probe['google_maps'] = {"ok": False, "checked_at": time.time(), "error": str(e)}
+            print(f"Google Maps API health probe failed: {str(e)}")
+
+def health_probe_loop():
+    """Probe the APIs now and then every HEALTH_PROBE_INTERVAL seconds"""
+    while True:
+        probe_apis()
+        if HEALTH_PROBE_INTERVAL <= 0:
+            return
+        time.sleep(HEALTH_PROBE_INTERVAL)
+
+def health_probe_report():
+    """Return the cached probe results with their age in seconds"""
+    report = {}
+    for name, result in list(health_probe.items()):
+        report[name] = {
+            "ok": result["ok"],
+            "age_seconds": round(time.time() - result["checked_at"], 1),
+            "error": result["error"]
+        }
+    return report
+
+def fetch_place_details(place_ids, timeout=None, fields=PLACE_DETAILS_FIELDS, on_result=None):
+    """Fetch Place Details for place_ids concurrently, preserving order
+
+    place_ids can be any iterable, e.g. a generator over paged search results: each
+    lookup starts as soon as its id arrives and timeout counts from the last one.
+    on_result(details) is called from a worker thread as each lookup succeeds.
+    """
+    if timeout is None:
+        timeout = PLACE_DETAILS_TIMEOUT
+    results = {}
+    results_lock = threading.Lock()
+    closed = False
+    
+    def collect(index, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        details = future.result().get('result')
+        if not details:
+            return
+        with results_lock:
+            # Lookups finishing after the timeout are left out, as are their callbacks
+            if closed:
+                return
+            results[index] = details
+            if on_result is not None:
+                on_result(details)
+    
+    # Submit each lookup as its id arrives; the pool bounds how many are in flight
+    lookups = []
+    for place_id in place_ids:
+        future = place_details_executor.submit(gmaps.place, place_id, fields=fields)
+        future.add_done_callback(functools.partial(collect, len(lookups)))
+        lookups.append((place_id, future))
+    wait([future for _, future in lookups], timeout=timeout)
+    with results_lock:
+        closed = True
+        restaurants = [results[index] for index in sorted(results)]
+    
+    failed = 0
+    for index, (place_id, future) in enumerate(lookups):
+        if index in results:
+            continue
+        if not future.done() or future.cancelled():
+            future.cancel()
+            error = 'Timeout'
+        elif future.exception() is not None:
+            error = f"{type(future.exception()).__name__}: {future.exception()}"
         else:
-            print(f"Google Maps API test failed. Status: {test_data.get('status')}, Error: {test_data.get('error_message', 'No error message')}")
-    else:
-        print("Google Maps API key not found in environment variables")
-except Exception as e:
-    print(f"Error initializing Google Maps client: {str(e)}")
+            # No result in the response, or it only arrived after the timeout
+            continue
+        # Skip this place but keep the rest of the results
+        failed += 1
+        metrics.inc('upstream_errors_total', service='place_details')
+        print(f"Error fetching details for place {place_id}: {error}")
+    
+    if failed:
+        print(f"Place Details: {failed} of {len(lookups)} lookups failed")
+    return restaurants
+
+def iter_nearby_places(location, radius, open_now, max_results=None):
+    """Yield Nearby Search results page by page, following next_page_token up to max_results places
+
+    An error on the first page is raised; an error on a later page ends the
+    results early but keeps the places already yielded.
+    """
+    if max_results is None:
+        max_results = NEARBY_MAX_RESULTS
+    with metrics.timer('nearby_search'):
+        page = gmaps.places_nearby(location=location, radius=radius, type='restaurant', open_now=open_now)
+    count = 0
+    while True:
+        for place in page.get('results', [])[:max(max_results - count, 0)]:
+            count += 1
+            yield place
+        token = page.get('next_page_token')
+        if not token or count >= max_results:
+            return
+        try:
+            page = fetch_next_nearby_page(token)
+        except Exception as e:
+            metrics.inc('upstream_errors_total', service='nearby_search')
+            print(f"Error fetching the next Nearby Search page: {str(e)}")
+            return
+
+def fetch_next_nearby_page(page_token):
+    """Fetch the Nearby Search page for page_token, waiting until Google accepts the token"""
+    for attempt in range(NEARBY_PAGE_ATTEMPTS):
+        time.sleep(NEARBY_PAGE_TOKEN_DELAY)
+        try:
+            with metrics.timer('nearby_search_page'):
+                return gmaps.places_nearby(page_token=page_token)
+        except googlemaps.exceptions.ApiError as e:
+            # A token used before it is valid is rejected as INVALID_REQUEST
+            if e.status != 'INVALID_REQUEST' or attempt == NEARBY_PAGE_ATTEMPTS - 1:
+                raise
+
+def geocode_zipcode(zipcode):
+    """Resolve a zipcode to {"lat", "lng"}, using the geocode cache when possible"""
+    location = geocode_cache.get(zipcode)
+    if location is not None:
+        return location
+    
+    with metrics.timer('geocode'):
+        geocode_result = gmaps.geocode(zipcode)
+    if not geocode_result:
+        return None
+    
+    location = geocode_result[0]['geometry']['location']
+    geocode_cache.set(zipcode, location)
+    return location
+
+def restaurant_cache_key(zipcode, radius, open_now):
+    return (normalize_zipcode(zipcode), int(radius), bool(open_now))
+
+def is_cacheable_restaurants(restaurants):
+    # Never cache the sample-data fallback used when the Places API fails
+    return restaurants is not SAMPLE_RESTAURANTS
 
-def get_restaurants_by_zipcode(zipcode, radius=5000):
-    """Get restaurants using Google Places API by zipcode"""
+def known_restaurants(zipcode, radius, open_now):
+    """Restaurants available without a Places lookup (sample data, the catalog or the cache), else None"""
     if not maps_api_available:
         print("Google Maps API is not available. Using sample restaurant data instead.")
+        metrics.inc('sample_fallback_total', reason='maps_unavailable')
         return SAMPLE_RESTAURANTS
     
+    if restaurant_catalog is not None:
+        restaurants = catalog_restaurants(zipcode, radius, open_now)
+        if restaurants:
+            return restaurants
+    
+    return restaurant_cache.get(
+        restaurant_cache_key(zipcode, radius, open_now),
+        lambda: restaurant_stream(zipcode, radius, open_now).result(),
+        should_cache=is_cacheable_restaurants
+    )
+
+def restaurant_stream(zipcode, radius, open_now):
+    """Start (or join) the Places lookup for a search and return its ResultStream of restaurants
+
+    The lookup runs in the background and stores its complete result in the
+    restaurant cache, even if every caller stopped reading early.
+    """
+    key = restaurant_cache_key(zipcode, radius, open_now)
+    
+    def produce(publish):
+        restaurants = fetch_restaurants_by_zipcode(zipcode, radius, open_now, on_restaurant=publish)
+        restaurant_cache.set(key, restaurants, should_cache=is_cacheable_restaurants)
+        return restaurants
+    
+    return restaurant_flight.stream(key, produce)
+
+def get_restaurants_by_zipcode(zipcode, radius=5000, open_now=True):
+    """Get restaurants by zipcode, served from the restaurant cache when possible"""
+    restaurants = known_restaurants(zipcode, radius, open_now)
+    if restaurants is not None:
+        return restaurants
+    return restaurant_stream(zipcode, radius, open_now).result()
+
+def gather_restaurants(zipcode, preferences, radius=5000, open_now=True):
+    """Restaurants to recommend from, returned early once enough good candidates have arrived
+
+    On a cold lookup restaurants are read as their Place Details arrive, and the
+    result is returned once RESTAURANT_EARLY_CANDIDATES of them score at least
+    RESTAURANT_EARLY_MIN_QUALITY of the best possible score; the rest of the
+    lookup carries on in the background.
+    """
+    restaurants = known_restaurants(zipcode, radius, open_now)
+    if restaurants is not None:
+        return restaurants
+    
+    stream = restaurant_stream(zipcode, radius, open_now)
+    if RESTAURANT_EARLY_CANDIDATES > 0:
+        threshold = RESTAURANT_EARLY_MIN_QUALITY * max_restaurant_score()
+        arrived = []
+        good = 0
+        for restaurant in stream:
+            arrived.append(restaurant)
+            if score_restaurant(restaurant, preferences) >= threshold:
+                good += 1
+                if good >= RESTAURANT_EARLY_CANDIDATES:
+                    metrics.inc('restaurant_early_starts_total')
+                    return arrived
+    # Every restaurant arrived (or none did, e.g. the sample-data fallback)
+    return stream.result()
+
+def catalog_lookup(location, radius, open_now):
+    """Restaurants around location from the local catalog, or None if it cannot answer
+
+    Areas the catalog does not cover yet are queued for the crawler. An empty
+    answer also returns None, so the Places API and its fallbacks decide.
+    """
+    with metrics.timer('catalog_lookup'):
+        restaurants = restaurant_catalog.nearby(
+            location['lat'], location['lng'], radius, open_now=open_now, limit=RESTAURANT_CATALOG_MAX_RESULTS
+        )
+    if restaurants is None:
+        metrics.inc('catalog_lookups_total', result='miss')
+        if restaurant_catalog.request_area(location['lat'], location['lng'], radius):
+            catalog_crawl_wakeup.set()
+        return None
+    if not restaurants:
+        metrics.inc('catalog_lookups_total', result='empty')
+        return None
+    metrics.inc('catalog_lookups_total', result='hit')
+    return restaurants
+
+def catalog_restaurants(zipcode, radius, open_now):
+    """Restaurants near a zipcode from the local catalog, or None to use the Places API"""
+    try:
+        location = geocode_zipcode(zipcode)
+    except Exception as e:
+        print(f"Error geocoding {zipcode} for the restaurant catalog: {str(e)}")
+        return None
+    if location is None:
+        return None
+    return catalog_lookup(location, radius, open_now)
+
+def crawl_catalog_area(lat, lng, radius):
+    """Search an area without the open-now filter and store every restaurant found in the catalog"""
+    with metrics.timer('catalog_crawl'):
+        places = iter_nearby_places({"lat": lat, "lng": lng}, radius, False, max_results=NEARBY_RESULTS_LIMIT)
+        locations = {place['place_id']: place['geometry']['location'] for place in places if place.get('geometry')}
+        places = fetch_place_details(list(locations), timeout=CATALOG_DETAILS_TIMEOUT, fields=CATALOG_DETAILS_FIELDS)
+    for place in places:
+        place.setdefault('geometry', {"location": locations.get(place.get('place_id'))})
+    return restaurant_catalog.store_area(lat, lng, radius, places)
+
+def catalog_crawler_loop():
+    """Crawl queued and stale catalog areas, then wait for RESTAURANT_CATALOG_CRAWL_INTERVAL or a new miss"""
+    while True:
+        try:
+            for lat, lng, radius in restaurant_catalog.claim_areas(RESTAURANT_CATALOG_REFRESH_INTERVAL):
+                try:
+                    count = crawl_catalog_area(lat, lng, radius)
+                    print(f"Catalog crawl stored {count} restaurants within {radius:g} m of {lat}, {lng}")
+                except Exception as e:
+                    # The claim expires, so the area is retried later
+                    metrics.inc('upstream_errors_total', service='catalog_crawl')
+                    print(f"Catalog crawl of {lat}, {lng} failed: {str(e)}")
+        except Exception as e:
+            print(f"Catalog crawler error: {str(e)}")
+        catalog_crawl_wakeup.wait(RESTAURANT_CATALOG_CRAWL_INTERVAL)
+        catalog_crawl_wakeup.clear()
+
+def fetch_restaurants_by_zipcode(zipcode, radius=5000, open_now=True, on_restaurant=None):
+    """Get restaurants using Google Places API by zipcode
+
+    Place Details lookups start while later result pages are still being fetched;
+    on_restaurant(details) is called as each one arrives.
+    """
     try:
         # First, geocode the zipcode to get coordinates
-        geocode_result = gmaps.geocode(zipcode)
-        if not geocode_result:
+        location = geocode_zipcode(zipcode)
+        if location is None:
             print(f"Could not find location for zipcode: {zipcode}")
             # Use a fallback location for testing
             print("Using a fallback location (San Francisco) for testing purposes.")
             location = {"lat": 37.7749, "lng": -122.4194}
-        else:
-            location = geocode_result[0]['geometry']['location']
         
         # Get nearby restaurants
-        places_result = gmaps.places_nearby(
-            location=location,
-            radius=radius,
-            type='restaurant',
-            open_now=True
-        )
-        
-        if not places_result.get('results'):
+        places = iter_nearby_places(location, radius, open_now)
+        first_place = next(places, None)
+        if first_place is None:
             print(f"No restaurants found near {zipcode}. Using a fallback location.")
             # Use a fallback location with known restaurants
             fallback_location = {"lat": 37.7749, "lng": -122.4194}
-            places_result = gmaps.places_nearby(
-                location=fallback_location,
-                radius=radius,
-                type='restaurant',
-                open_now=True
-            )
+            places = iter_nearby_places(fallback_location, radius, open_now)
+        else:
+            places = itertools.chain([first_place], places)
         
         # Get detailed information for each restaurant
-        restaurants = []
-        for place in places_result.get('results', []):
-            place_id = place['place_id']
-            # Use valid fields for the Places API
-            details = gmaps.place(place_id, fields=['name', 'formatted_address', 'rating', 'price_level', 'opening_hours', 'business_status', 'user_ratings_total'])
-            if details.get('result'):
-                restaurants.append(details['result'])
+        place_ids = (place['place_id'] for place in places)
+        with metrics.timer('place_details'):
+            restaurants = fetch_place_details(place_ids, on_result=on_restaurant)
         
         if not restaurants:
             print("No restaurants found. Using sample data instead.")
+            metrics.inc('sample_fallback_total', reason='no_results')
             return SAMPLE_RESTAURANTS
             
         return restaurants
     except Exception as e:
         error_message = str(e)
         print(f"Error fetching restaurants: {error_message}")
+        metrics.inc('upstream_errors_total', service='google_maps')
+        metrics.inc('sample_fallback_total', reason='maps_error')
         
         # Fallback to sample data
         print("Using sample restaurant data instead.")
         return SAMPLE_RESTAURANTS
 
-def create_rag_prompt(restaurants, preferences):
-    """Create a RAG prompt with restaurant data and user preferences"""
-    # Limit the number of restaurants to avoid exceeding token limit
-    limited_restaurants = restaurants[:8]  # Increased from 5 to 8
+def get_menus(restaurants):
+    """Return {restaurant key: menu items} for the restaurants that have menu data"""
+    if menu_store is None:
+        return {}
+    with metrics.timer('menu_lookup'):
+        return menu_store.get_menus([restaurant_key(restaurant) for restaurant in restaurants])
+
+def ground_recommendations(recommendations_data, restaurants):
+    """Replace model-estimated nutrition and price with menu data when every item in a dish is on the menu"""
+    recommendations = recommendations_data.get('recommendations', [])
+    if menu_store is None or not isinstance(recommendations, list):
+        return recommendations_data
+    
+    keys_by_name = {restaurant.get('name'): restaurant_key(restaurant) for restaurant in restaurants}
+    menus = get_menus(restaurants)
+    for rec in recommendations:
+        if not isinstance(rec, dict):
+            continue
+        items = {item['name'].lower(): item for item in menus.get(keys_by_name.get(rec.get('restaurant_name')), [])}
+        parts = [part.strip().lower() for part in str(rec.get('dish_name', '')).split('+')]
+        if not items or not all(part in items for part in parts):
+            continue
+        matched = [items[part] for part in parts]
+        rec['calories'] = round(sum(item['calories'] for item in matched))
+        rec['macronutrients'] = {name: round(sum(item[name] for item in matched)) for name in ('protein', 'carbs', 'fats')}
+        rec['price_range'] = round(sum(item['price'] for item in matched), 2)
+        rec['grounded'] = True
+    return recommendations_data
+
+def validate_streamed_recommendation(rec, restaurants, preferences, seen_restaurants):
+    """Ground and validate one streamed recommendation, returning the ones to send
+
+    A restaurant already in seen_restaurants is only sent again when the dish
+    misses at most one target. Streams are validated one recommendation at a
+    time in arrival order, without RECOMMENDATION_LIMIT.
+    """
+    grounded = ground_recommendations({"recommendations": [rec]}, restaurants)
+    validated = []
+    for enhanced_rec in validate_recommendations(grounded, preferences):
+        restaurant_name = enhanced_rec.get('restaurant_name', '')
+        if restaurant_name in seen_restaurants and len(enhanced_rec["missing_targets"]) > 1:
+            continue
+        seen_restaurants.add(restaurant_name)
+        validated.append(enhanced_rec)
+    return validated
+
+def optimize_recommendations(restaurants, preferences):
+    """Build recommendations from menu data with the local optimizer, or [] if there is none"""
+    menus = get_menus(restaurants)
+    if not menus:
+        return []
+    with metrics.timer('optimizer'):
+        # Over-generate so validation can pick the best RECOMMENDATION_LIMIT
+        recommendations = build_recommendations(
+            restaurants, menus, preferences,
+            limit=max(RECOMMENDATION_LIMIT, 1) * 2, max_items=OPTIMIZER_MAX_ITEMS
+        )
+    if recommendations and OPTIMIZER_LLM_REASONS and client:
+        add_llm_reasons(recommendations, preferences)
+    return recommendations
+
+def add_llm_reasons(recommendations, preferences):
+    """Ask the LLM for friendlier reason text; the numbers themselves come from the optimizer"""
+    meals = [
+        {"restaurant": rec["restaurant_name"], "meal": rec["dish_name"], "calories": rec["calories"],
+         "macronutrients": rec["macronutrients"], "price": rec["price_range"]}
+        for rec in recommendations
+    ]
+    prompt = (
+        "For each meal below, write one or two sentences explaining why it fits the user's goals. "
+        "Do not change any numbers.\n\n"
+        f"User Preferences:\n{json.dumps(preferences, separators=(',', ':'))}\n\n"
+        f"Meals:\n{json.dumps(meals, separators=(',', ':'))}\n\n"
+        'Respond with JSON in this exact format: {"reasons": ["reason for meal 1", "reason for meal 2"]}'
+    )
+    try:
+        reasons = json.loads(generate_completion_text(prompt, SYSTEM_PROMPT, None)).get("reasons", [])
+        for rec, reason in zip(recommendations, reasons):
+            if isinstance(reason, str) and reason.strip():
+                rec["reason"] = reason.strip()
+    except Exception as e:
+        print(f"Error generating reasons with OpenAI, keeping optimizer reasons: {e}")
+
+def build_restaurant_context(restaurants, preferences=None):
+    """Build the concise restaurant context that is embedded in the RAG prompt
+
+    Restaurants that best fit the preferences are added first, as long as the
+    context stays within PROMPT_RESTAURANT_TOKENS.
+    """
+    preferences = preferences or {}
+    target_calories = preferences.get('calorie_count')
     
     # Create a more concise restaurant context
     restaurant_context = []
-    for restaurant in limited_restaurants:
+    used_tokens = 0
+    smallest = None
+    for restaurant in rank_restaurants(restaurants, preferences):
+        if len(restaurant_context) >= PROMPT_MAX_RESTAURANTS:
+            break
+        # Stop once even the smallest entry so far would not fit
+        if smallest is not None and used_tokens + smallest > PROMPT_RESTAURANT_TOKENS:
+            break
         restaurant_info = {
             "name": restaurant.get("name", "Unknown"),
             "formatted_address": restaurant.get("formatted_address", "Address not available"),
@@ -257,177 +929,119 @@ def create_rag_prompt(restaurants, preferences):
             "types": restaurant.get("types", []),
             "opening_hours": restaurant.get("opening_hours", {"open_now": False})
         }
+        # Ground the model in real menu items closest to the calorie target
+        if menu_store is not None and target_calories:
+            try:
+                menu = menu_store.closest_items(restaurant_key(restaurant), target_calories, MENU_ITEMS_IN_PROMPT)
+            except Exception as e:
+                print(f"Error reading menu items: {str(e)}")
+                menu = []
+            if menu:
+                restaurant_info["menu"] = menu
+        
+        # +1 for the separating comma; skip entries that don't fit but keep trying smaller ones
+        tokens = count_tokens(json.dumps(restaurant_info, separators=(',', ':')), OPENAI_MODEL) + 1
+        smallest = tokens if smallest is None else min(smallest, tokens)
+        if restaurant_context and used_tokens + tokens > PROMPT_RESTAURANT_TOKENS:
+            continue
         restaurant_context.append(restaurant_info)
+        used_tokens += tokens
     
-    restaurant_json = json.dumps(restaurant_context, separators=(',', ':'))
-    
-    # Get user's price range
-    min_price = preferences.get('price_range', [10, 25])[0]
-    max_price = preferences.get('price_range', [10, 25])[1]
-    
-    prompt = f"""Based on the following restaurant data and user preferences, provide MULTIPLE diverse meal recommendations that match their dietary goals. Aim to provide at least 3-5 different recommendations from different restaurants.
-
-Restaurant Data:
-{restaurant_json}
-
-User Preferences:
-{json.dumps(preferences, separators=(',', ':'))}
-
-CRITICAL REQUIREMENTS:
-1. Provide AT LEAST 3 different recommendations that match these targets:
-   - Total calories: {preferences.get('calorie_count')} calories (±30%)
-   - Protein: {preferences.get('macronutrients', {}).get('protein_grams')} grams (±40%)
-   - Carbs: {preferences.get('macronutrients', {}).get('carbs_grams')} grams (±40%)
-   - Fats: {preferences.get('macronutrients', {}).get('fats_grams')} grams (±40%)
-   - Price range: ${min_price} - ${max_price}
-
-2. For EACH restaurant, suggest multiple ways to meet the targets:
-   - Provide different combinations of items
-   - Example: "Grilled Chicken + Rice + Vegetables" or "Burger + Side Salad + Sweet Potato"
-   - Include specific portion sizes and modifications
-   - Suggest different options for different preferences
-
-3. Focus on practical combinations that will help reach ALL macro targets:
-   - If carbs are low, suggest adding bread, rice, or potato sides
-   - If protein is low, suggest adding grilled chicken or protein shake
-   - If fats are low, suggest adding dressings or avocado
+    return restaurant_context
 
-4. Make recommendations DIVERSE:
-   - Include different cuisines
-   - Mix of lighter and heartier options
-   - Various protein sources (meat, fish, vegetarian)
-   - Different meal types (bowls, sandwiches, platters)
-
-Please provide recommendations in this exact JSON format:
-{{
-    "recommendations": [
-        {{
-            "restaurant_name": "Restaurant Name",
-            "address": "Full Address",
-            "dish_name": "Main Dish + Side Items",
-            "calories": 1000,
-            "macronutrients": {{
-                "protein": 75,
-                "carbs": 100,
-                "fats": 33
-            }},
-            "reason": "Explanation of how this meets the targets",
-            "price_range": 15
-        }},
-        {{
-            "restaurant_name": "Different Restaurant",
-            "address": "Different Address",
-            "dish_name": "Different Combination",
-            "calories": 950,
-            "macronutrients": {{
-                "protein": 70,
-                "carbs": 95,
-                "fats": 35
-            }},
-            "reason": "Different explanation",
-            "price_range": 18
-        }}
-    ]
-}}
+def create_rag_prompt(restaurant_context, preferences):
+    """Create the per-request part of the RAG prompt: restaurant data, preferences and targets
 
-Note: 
-- The price_range should be a single numeric value representing the estimated total cost in dollars
-- Provide at least 3 different recommendations
-- Each recommendation should be from a different restaurant if possible
-- Make sure combinations are practical and available at the restaurant
-- Include specific portion sizes and modifications needed"""
+    restaurant_context comes from build_restaurant_context. The instructions and
+    response format are the static RAG_SYSTEM_PROMPT.
+    """
+    price_range = preferences.get('price_range', [10, 25])
+    macros = preferences.get('macronutrients', {})
     
-    return prompt
+    return RAG_PROMPT_TEMPLATE.format(
+        restaurant_json=json.dumps(restaurant_context, separators=(',', ':')),
+        preferences_json=json.dumps(preferences, separators=(',', ':')),
+        calories=preferences.get('calorie_count'),
+        protein=macros.get('protein_grams'),
+        carbs=macros.get('carbs_grams'),
+        fats=macros.get('fats_grams'),
+        min_price=price_range[0],
+        max_price=price_range[1]
+    )
+
+def validate_recommendations(recommendations_data, preferences, limit=None):
+    """Validate recommendations and add information about missing targets
 
-def validate_recommendations(recommendations_data, preferences):
-    """Validate recommendations and add information about missing targets"""
+    Recommendations are ordered by their weighted distance to the calorie, macro
+    and price targets; with limit, only the closest limit are returned.
+    """
     recommendations = recommendations_data.get('recommendations', [])
     if not recommendations:
         return []
         
     target_calories = preferences.get('calorie_count')
     target_macros = preferences.get('macronutrients', {})
-    target_protein = target_macros.get('protein_grams')
-    target_carbs = target_macros.get('carbs_grams')
-    target_fats = target_macros.get('fats_grams')
-    price_range = preferences.get('price_range', [10, 25])
-    min_price, max_price = price_range[0], price_range[1]
+    targets = {
+        "protein": target_macros.get('protein_grams'),
+        "carbs": target_macros.get('carbs_grams'),
+        "fats": target_macros.get('fats_grams')
+    }
     
-    def is_within_range(value, target, target_type=None):
-        if not target or not value:
-            return True
+    # Pull the numbers out of every recommendation, then range-check them all in one vectorized pass
+    columns = {name: [] for name in ('calories', 'protein', 'carbs', 'fats', 'price')}
+    rows = []
+    for rec in recommendations:
         try:
-            value = float(value)
-            target = float(target)
-            
-            if target_type == 'macro':
-                lower_bound = target * 0.55
-                upper_bound = target * 1.45
-            elif target_type == 'price':
-                # Price must be within the specified range
-                return min_price <= value <= max_price
-            else:  # calories
-                lower_bound = target * 0.85  # Stricter bounds for calories
-                upper_bound = target * 1.15
-            
-            return lower_bound <= value <= upper_bound
-        except (TypeError, ValueError):
-            return False
+            macros = rec.get('macronutrients', {})
+            row = {
+                "calories": rec.get('calories', 0),
+                "price": rec.get('price_range', 0),
+                "protein": macros.get('protein', 0),
+                "carbs": macros.get('carbs', 0),
+                "fats": macros.get('fats', 0)
+            }
+        except Exception as e:
+            row = e
+        rows.append(row)
+        for name in columns:
+            columns[name].append(row.get(name) if isinstance(row, dict) else None)
+    
+    # Price has never been enforced here (the old range check had no price target to compare against)
+    scores = score_candidates(preferences=preferences, enforce_price=False, **columns)
+    in_range = scores["in_range"]
     
-    def get_missing_targets(calories, protein, carbs, fats, price):
+    def out_of_range(label, value, target, low_factor, unit=''):
+        # Comparing a non-numeric value raises, which skips the recommendation as before
+        if not isinstance(value, (int, float)):
+            raise TypeError(f"'<' not supported between instances of '{type(value).__name__}' and 'float'")
+        direction = "Low" if value < float(target) * low_factor else "High"
+        return f"{direction} {label}: {value}{unit} (target: {target}{unit})"
+    
+    def get_missing_targets(index, row):
         missing = []
-        required_missing = []  # New list for required targets (calories and price)
+        required_missing = []  # Required targets (calories) skip the recommendation
         
-        # Check calories - required target
-        if not is_within_range(calories, target_calories):
-            if calories < float(target_calories) * 0.85:
-                required_missing.append(f"Low calories: {calories} (target: {target_calories})")
-            else:
-                required_missing.append(f"High calories: {calories} (target: {target_calories})")
-        
-        # Check price - required target
-        if not is_within_range(price, None, 'price'):
-            if price < min_price:
-                required_missing.append(f"Price too low: ${price} (min: ${min_price})")
-            else:
-                required_missing.append(f"Price too high: ${price} (max: ${max_price})")
+        if not in_range["calories"][index]:
+            required_missing.append(out_of_range("calories", row["calories"], target_calories, CALORIE_BOUNDS[0]))
         
         # Check macros - optional targets
-        if not is_within_range(protein, target_protein, 'macro'):
-            if protein < float(target_protein) * 0.55:
-                missing.append(f"Low protein: {protein}g (target: {target_protein}g)")
-            else:
-                missing.append(f"High protein: {protein}g (target: {target_protein}g)")
-                
-        if not is_within_range(carbs, target_carbs, 'macro'):
-            if carbs < float(target_carbs) * 0.55:
-                missing.append(f"Low carbs: {carbs}g (target: {target_carbs}g)")
-            else:
-                missing.append(f"High carbs: {carbs}g (target: {target_carbs}g)")
-                
-        if not is_within_range(fats, target_fats, 'macro'):
-            if fats < float(target_fats) * 0.55:
-                missing.append(f"Low fats: {fats}g (target: {target_fats}g)")
-            else:
-                missing.append(f"High fats: {fats}g (target: {target_fats}g)")
+        for name in ('protein', 'carbs', 'fats'):
+            if not in_range[name][index]:
+                missing.append(out_of_range(name, row[name], targets[name], MACRO_BOUNDS[0], 'g'))
         
         return missing, required_missing
     
     enhanced_recommendations = []
     seen_restaurants = set()
     
-    for rec in recommendations:
+    for index, (rec, row) in enumerate(zip(recommendations, rows)):
         try:
-            calories = rec.get('calories', 0)
-            price = rec.get('price_range', 0)
-            macros = rec.get('macronutrients', {})
-            protein = macros.get('protein', 0)
-            carbs = macros.get('carbs', 0)
-            fats = macros.get('fats', 0)
+            if isinstance(row, Exception):
+                raise row
             restaurant_name = rec.get('restaurant_name', '')
             
             # Get list of missing targets
-            missing_targets, required_missing = get_missing_targets(calories, protein, carbs, fats, price)
+            missing_targets, required_missing = get_missing_targets(index, row)
             
             # Skip recommendations that don't meet required targets (calories or price)
             if required_missing:
@@ -438,7 +1052,8 @@ def validate_recommendations(recommendations_data, preferences):
             enhanced_rec = {
                 **rec,
                 "missing_targets": missing_targets,  # Only includes macro targets
-                "matches_all_targets": len(missing_targets) == 0
+                "matches_all_targets": len(missing_targets) == 0,
+                "target_distance": round(float(scores["score"][index]), 4)
             }
             
             # Add suggestions for missing macro targets
@@ -463,19 +1078,247 @@ def validate_recommendations(recommendations_data, preferences):
             print(f"Error processing recommendation: {str(e)}")
             continue
     
-    # Sort recommendations: perfect matches first, then by number of missing targets
-    enhanced_recommendations.sort(key=lambda x: (not x["matches_all_targets"], len(x["missing_targets"])))
+    # Closest to the targets first; ties keep the model's order
+    ranked = [(rec["target_distance"], position, rec) for position, rec in enumerate(enhanced_recommendations)]
+    if limit:
+        ranked = heapq.nsmallest(limit, ranked)
+    else:
+        ranked.sort()
+    
+    return [rec for _, _, rec in ranked]
+
+def _bucket(value, step):
+    """Round a numeric target to the nearest step, leaving non-numeric values alone"""
+    try:
+        return int(round(float(value) / step) * step)
+    except (TypeError, ValueError):
+        return value
+
+def normalize_preferences_for_cache(preferences):
+    """Canonical form of preferences used in recommendation cache keys"""
+    macros = preferences.get('macronutrients', {}) or {}
+    return {
+        "calorie_count": _bucket(preferences.get('calorie_count'), CALORIE_BUCKET),
+        "macronutrients": {name: _bucket(macros.get(name), MACRO_BUCKET) for name in ('protein_grams', 'carbs_grams', 'fats_grams')},
+        "price_range": list(preferences.get('price_range', [10, 25])),
+        "cuisine_preferences": sorted(str(c).strip().lower() for c in preferences.get('cuisine_preferences', []) or []),
+        "allergies": sorted(str(a).strip().lower() for a in preferences.get('allergies', []) or [])
+    }
+
+def recommendation_cache_key(restaurant_context, preferences):
+    """Hash the restaurant context, normalized preferences and model settings into a cache key"""
+    key_data = {
+        "restaurants": restaurant_context,
+        "preferences": normalize_preferences_for_cache(preferences),
+        "model": OPENAI_MODEL,
+        "temperature": OPENAI_TEMPERATURE
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def build_completion_request(rag_prompt, system_prompt=RAG_SYSTEM_PROMPT, output_schema=RECOMMENDATIONS_SCHEMA):
+    """Keyword arguments for client.chat.completions.create for a RAG prompt
+
+    With an output_schema, OPENAI_OUTPUT_MODE decides how the model is held to it.
+    """
+    request_kwargs = {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": rag_prompt}
+        ],
+        "temperature": OPENAI_TEMPERATURE,
+        "max_tokens": OPENAI_MAX_TOKENS
+    }
+    if output_schema is not None and OPENAI_OUTPUT_MODE == 'json_schema':
+        request_kwargs["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "recommendations", "strict": True, "schema": output_schema}
+        }
+    elif output_schema is not None and OPENAI_OUTPUT_MODE == 'tool':
+        request_kwargs["tools"] = [{
+            "type": "function",
+            "function": {
+                "name": RECOMMENDATIONS_TOOL,
+                "description": "Submit the meal recommendations",
+                "parameters": output_schema
+            }
+        }]
+        request_kwargs["tool_choice"] = {"type": "function", "function": {"name": RECOMMENDATIONS_TOOL}}
+    return request_kwargs
+
+def message_text(message):
+    """Text of a completion message or stream delta: the tool call arguments if there are any, else the content"""
+    tool_calls = getattr(message, 'tool_calls', None)
+    if tool_calls:
+        return ''.join(call.function.arguments or '' for call in tool_calls if call.function)
+    return message.content
+
+def current_deadline():
+    """The current request's deadline, or a fresh REQUEST_DEADLINE outside a request"""
+    if has_request_context() and 'deadline' in g:
+        return g.deadline
+    return Deadline(REQUEST_DEADLINE)
+
+def is_transient_openai_error(error):
+    """Errors worth retrying: timeouts, connection failures, rate limits and 5xx responses"""
+    return isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+def hedge_delay():
+    """Seconds to wait before hedging: the recent p95 attempt latency, at least OPENAI_HEDGE_MIN_DELAY"""
+    p95 = metrics.quantile('stage_duration_seconds', 0.95, min_count=OPENAI_HEDGE_MIN_SAMPLES, stage='openai_attempt')
+    return max(p95 or 0.0, OPENAI_HEDGE_MIN_DELAY)
+
+def openai_timeout(deadline):
+    """Timeout for one OpenAI attempt: OPENAI_TIMEOUT, with HTTP_CONNECT_TIMEOUT to connect, cut to the time left"""
+    total = deadline.timeout(OPENAI_TIMEOUT)
+    return httpx.Timeout(total, connect=min(HTTP_CONNECT_TIMEOUT, total))
+
+def call_openai(request_kwargs, deadline, hedge=False, stage='openai_attempt'):
+    """Create a completion within the deadline, retrying transient errors and optionally hedging"""
+    def attempt():
+        with metrics.timer(stage):
+            try:
+                return client.chat.completions.create(**request_kwargs, timeout=openai_timeout(deadline))
+            except Exception:
+                metrics.inc('upstream_errors_total', service='openai')
+                raise
+    
+    def attempt_once():
+        if not hedge:
+            return attempt()
+        return hedged_call(attempt, min(hedge_delay(), deadline.remaining()), hedge_executor,
+                           on_hedge=lambda: metrics.inc('openai_hedges_total'))
+    
+    def on_retry(error, retry):
+        metrics.inc('openai_retries_total')
+        print(f"Retrying OpenAI call after {type(error).__name__}: {str(error)}")
+    
+    return retry_call(attempt_once, OPENAI_RETRIES, OPENAI_RETRY_BASE_DELAY, OPENAI_RETRY_MAX_DELAY,
+                      deadline=deadline, should_retry=is_transient_openai_error, on_retry=on_retry)
+
+def generate_completion_text(rag_prompt, system_prompt=RAG_SYSTEM_PROMPT, output_schema=RECOMMENDATIONS_SCHEMA):
+    """Call OpenAI for a prompt, sharing the call with identical requests already in flight"""
+    request_kwargs = build_completion_request(rag_prompt, system_prompt, output_schema)
+    key = hashlib.sha256(json.dumps(request_kwargs, sort_keys=True).encode('utf-8')).hexdigest()
+    deadline = current_deadline()
+    
+    def create():
+        with metrics.timer('openai_completion'):
+            completion = call_openai(request_kwargs, deadline, hedge=OPENAI_HEDGE_ENABLED)
+        record_token_usage(getattr(completion, 'usage', None))
+        return message_text(completion.choices[0].message)
     
-    return enhanced_recommendations
+    return completion_flight.do(key, create)
+
+def stream_completion_text(rag_prompt):
+    """Call OpenAI with streaming enabled and yield the response text as it arrives"""
+    start = time.perf_counter()
+    # Retries can only happen before the first chunk, so streams are never hedged
+    stream = call_openai(
+        {**build_completion_request(rag_prompt), "stream": True, "stream_options": {"include_usage": True}},
+        current_deadline(),
+        stage='openai_stream_connect'
+    )
+    try:
+        first_chunk = True
+        for event in stream:
+            if getattr(event, 'usage', None):
+                record_token_usage(event.usage)
+            text = message_text(event.choices[0].delta) if event.choices else None
+            if text:
+                if first_chunk:
+                    metrics.observe('stage_duration_seconds', time.perf_counter() - start, stage='openai_first_token')
+                    first_chunk = False
+                yield text
+    except Exception:
+        metrics.inc('upstream_errors_total', service='openai')
+        raise
+    finally:
+        metrics.observe('stage_duration_seconds', time.perf_counter() - start, stage='openai_completion')
+
+def record_token_usage(usage):
+    """Add the token counts reported by an OpenAI completion to the metrics"""
+    if usage is None:
+        return
+    metrics.inc('openai_tokens_total', usage.prompt_tokens or 0, kind='prompt')
+    metrics.inc('openai_tokens_total', usage.completion_tokens or 0, kind='completion')
 
 # API Routes
+@app.before_request
+def ensure_clients():
+    """Lazily create the API clients in the serving process on its first request"""
+    init_clients()
+
+@app.before_request
+def assign_trace_id():
+    """Give every request a fresh trace ID and keep the client's X-Request-ID for the request log"""
+    g.trace_id = new_trace_id()
+    g.client_request_id = request.headers.get('X-Request-ID', '')[:CLIENT_REQUEST_ID_MAX_LENGTH]
+    g.request_started = time.monotonic()
+    g.deadline = Deadline(REQUEST_DEADLINE)
+
+@app.after_request
+def add_trace_header(response):
+    """Return the trace ID so clients can quote it when reporting problems"""
+    if 'trace_id' in g:
+        response.headers['X-Trace-ID'] = g.trace_id
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency and status; streamed bodies are timed up to the first byte"""
+    if 'request_started' in g and request.endpoint != 'api_metrics':
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe('request_duration_seconds', time.monotonic() - g.request_started, endpoint=endpoint)
+        metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Expose latency summaries, counters and cache statistics in Prometheus text format"""
+    gauges = []
+    for name, stats in (('geocode', geocode_cache.stats()), ('restaurants', restaurant_cache.stats()), ('recommendations', recommendation_cache.stats())):
+        gauges.append(('cache_hits', {'cache': name}, stats['hits']))
+        gauges.append(('cache_misses', {'cache': name}, stats['misses']))
+        gauges.append(('cache_size', {'cache': name}, stats['size']))
+    for name, flight in (('restaurants', restaurant_flight), ('completions', completion_flight)):
+        stats = flight.stats()
+        gauges.append(('single_flight_collapsed', {'call': name}, stats['collapsed']))
+        gauges.append(('single_flight_executions', {'call': name}, stats['executions']))
+    for name, stats in http_pools.stats().items():
+        gauges.append(('http_pool_size', {'pool': name}, stats['size']))
+        gauges.append(('http_pool_connections', {'pool': name, 'state': 'in_use'}, stats['in_use']))
+        gauges.append(('http_pool_connections', {'pool': name, 'state': 'idle'}, stats['idle']))
+        gauges.append(('http_connections_opened', {'pool': name}, stats['opened']))
+    if restaurant_catalog is not None:
+        catalog_stats = restaurant_catalog.stats()
+        gauges.append(('catalog_restaurants', {}, catalog_stats['restaurants']))
+        gauges.append(('catalog_areas', {'state': 'fresh'}, catalog_stats['fresh_areas']))
+        gauges.append(('catalog_areas', {'state': 'stale'}, catalog_stats['areas'] - catalog_stats['fresh_areas']))
+    log_stats = log_writer.stats()
+    gauges.append(('log_queue_size', {}, log_stats['queued']))
+    gauges.append(('log_entries_dropped', {}, log_stats['dropped']))
+    
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/status', methods=['GET'])
 def api_status():
     """Check the status of the API and its dependencies"""
     return jsonify({
         'status': 'ok',
         'openai_api': 'available' if client else 'unavailable',
-        'google_maps_api': 'available' if maps_api_available else 'unavailable'
+        'google_maps_api': 'available' if maps_api_available else 'unavailable',
+        'health_probe': health_probe_report(),
+        'geocode_cache': geocode_cache.stats(),
+        'restaurant_cache': restaurant_cache.stats(),
+        'recommendation_cache': recommendation_cache.stats(),
+        'log_writer': log_writer.stats(),
+        'http_pools': http_pools.stats(),
+        'restaurant_catalog': restaurant_catalog.stats() if restaurant_catalog is not None else None,
+        'single_flight': {
+            'restaurants': restaurant_flight.stats(),
+            'completions': completion_flight.stats()
+        }
     })
 
 @app.route('/api/restaurants', methods=['GET'])
@@ -483,16 +1326,17 @@ def get_restaurants():
     """Get restaurants by ZIP code"""
     zipcode = request.args.get('zipcode', '46556')
     radius = int(request.args.get('radius', 5000))
+    open_now = request.args.get('open_now', 'true').lower() != 'false'
     
-    restaurants = get_restaurants_by_zipcode(zipcode, radius)
+    restaurants = get_restaurants_by_zipcode(zipcode, radius, open_now)
     return jsonify(restaurants)
 
 @app.route('/api/recommendations', methods=['POST'])
 def get_recommendations():
     """Get restaurant recommendations based on user preferences"""
     try:
-        print("\n=== New Recommendation Request ===")
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        trace_id = g.trace_id
+        print(f"\n=== New Recommendation Request [{trace_id}] ===")
         print("Request received at:", datetime.now())
         
         if not request.is_json:
@@ -505,7 +1349,7 @@ def get_recommendations():
         
         data = request.json
         # Log the incoming request
-        log_to_file(data, 'request', timestamp)
+        log_to_file(data, 'request', trace_id, client_request_id=g.client_request_id)
         print("Received data:", json.dumps(data, indent=2))
         
         if not data or 'preferences' not in data:
@@ -522,45 +1366,58 @@ def get_recommendations():
         print(f"Processing preferences for zipcode: {zipcode}")
         
         # Get restaurants
-        restaurants = get_restaurants_by_zipcode(zipcode)
+        with metrics.timer('restaurant_lookup'):
+            restaurants = gather_restaurants(zipcode, preferences)
         # Log the restaurants data
-        log_to_file(restaurants, 'restaurants', timestamp)
+        log_to_file(restaurants, 'restaurants', trace_id)
         print(f"Found {len(restaurants)} restaurants")
         
+        # Prefer the local optimizer when enough restaurants have menu data
+        if data.get('mode') != 'llm':
+            optimized = validate_recommendations({"recommendations": optimize_recommendations(restaurants, preferences)}, preferences, RECOMMENDATION_LIMIT)
+            if len(optimized) >= OPTIMIZER_MIN_RESULTS or (optimized and data.get('mode') == 'optimizer'):
+                log_to_file({"recommendations": optimized, "source": "optimizer"}, 'final_recommendations', trace_id)
+                print(f"Returning {len(optimized)} optimizer recommendations to client")
+                return jsonify({"recommendations": optimized}), 200, {'X-Recommendation-Source': 'optimizer'}
+        
         # Create RAG prompt with restaurant data
-        rag_prompt = create_rag_prompt(restaurants, preferences)
+        with metrics.timer('prompt_build'):
+            restaurant_context = build_restaurant_context(restaurants, preferences)
+            rag_prompt = create_rag_prompt(restaurant_context, preferences)
         # Log the RAG prompt
-        log_to_file({"prompt": rag_prompt}, 'prompt', timestamp)
+        log_to_file({"prompt": rag_prompt}, 'prompt', trace_id)
         print("Generated RAG prompt")
         
+        # Identical recent requests reuse the cached completion unless the client opts out
+        cache_key = recommendation_cache_key(restaurant_context, preferences)
+        use_cache = 'no-cache' not in request.headers.get('Cache-Control', '').lower()
+        response_text = recommendation_cache.get(cache_key) if use_cache else None
+        cache_status = 'HIT' if response_text is not None else ('BYPASS' if not use_cache else 'MISS')
+        
         try:
-            print("Calling OpenAI API...")
-            # Make OpenAI API call
-            completion = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI dining assistant that provides restaurant recommendations in JSON format. Always respond with valid JSON."},
-                    {"role": "user", "content": rag_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            # Get the response text
-            response_text = completion.choices[0].message.content
+            if response_text is None:
+                print("Calling OpenAI API...")
+                # Make OpenAI API call
+                response_text = generate_completion_text(rag_prompt)
+                print("OpenAI API response received")
+            else:
+                print("Using cached OpenAI response")
             # Log the raw OpenAI response
-            log_to_file({"raw_response": response_text}, 'openai_response', timestamp)
-            print("OpenAI API response received")
+            log_to_file({"raw_response": response_text, "cache": cache_status, "endpoint": "recommendations", "limit": RECOMMENDATION_LIMIT}, 'openai_response', trace_id)
             print("Response:", response_text)
             
             try:
                 # Parse the response as JSON and validate
-                recommendations_data = json.loads(response_text)
+                with metrics.timer('json_parse'):
+                    recommendations_data = parse_recommendations(response_text)
                 print("Successfully parsed OpenAI response as JSON")
+                recommendation_cache.set(cache_key, response_text)
                 
-                valid_recommendations = validate_recommendations(recommendations_data, preferences)
+                with metrics.timer('validation'):
+                    recommendations_data = ground_recommendations(recommendations_data, restaurants)
+                    valid_recommendations = validate_recommendations(recommendations_data, preferences, RECOMMENDATION_LIMIT)
                 # Log the validated recommendations
-                log_to_file({"recommendations": valid_recommendations}, 'final_recommendations', timestamp)
+                log_to_file({"recommendations": valid_recommendations}, 'final_recommendations', trace_id)
                 print(f"Found {len(valid_recommendations)} valid recommendations")
                 
                 if not valid_recommendations:
@@ -568,12 +1425,13 @@ def get_recommendations():
                     return jsonify({
                         "error": "No recommendations found that match your dietary goals",
                         "recommendations": []
-                    }), 200
+                    }), 200, {'X-Cache': cache_status}
                 
                 print("Returning recommendations to client")
-                return jsonify({"recommendations": valid_recommendations})
+                return jsonify({"recommendations": valid_recommendations}), 200, {'X-Cache': cache_status}
                 
             except json.JSONDecodeError as e:
+                metrics.inc('parse_failures_total')
                 print(f"Error parsing OpenAI response as JSON: {e}")
                 print("Response text:", response_text)
                 error_response = {
@@ -581,7 +1439,7 @@ def get_recommendations():
                     "recommendations": [],
                     "raw_response": response_text
                 }
-                log_to_file(error_response, 'error', timestamp)
+                log_to_file(error_response, 'error', trace_id)
                 return jsonify(error_response), 200
                 
         except Exception as e:
@@ -590,7 +1448,7 @@ def get_recommendations():
                 'error': f'Error generating recommendations: {str(e)}',
                 'recommendations': []
             }
-            log_to_file(error_response, 'error', timestamp)
+            log_to_file(error_response, 'error', trace_id)
             return jsonify(error_response), 200
             
     except Exception as e:
@@ -599,8 +1457,155 @@ def get_recommendations():
             'error': f'Server error: {str(e)}',
             'recommendations': []
         }
-        log_to_file(error_response, 'error', timestamp)
+        log_to_file(error_response, 'error', trace_id)
+        return jsonify(error_response), 200
+
+@app.route('/api/recommendations/stream', methods=['POST'])
+def stream_recommendations():
+    """Stream validated recommendations as NDJSON as soon as each one is generated"""
+    trace_id = g.trace_id
+    print(f"\n=== New Streaming Recommendation Request [{trace_id}] ===")
+    
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+    if not client:
+        return jsonify({'error': 'OpenAI API is not available'}), 503
+    
+    try:
+        data = request.json
+        log_to_file(data, 'request', trace_id, client_request_id=g.client_request_id)
+        if not data or 'preferences' not in data:
+            return jsonify({'error': 'Missing preferences'}), 400
+    
+        preferences = data.get('preferences', {})
+        zipcode = preferences.get('zipcode', '')
+        if not zipcode:
+            return jsonify({'error': 'ZIP code is required'}), 400
+    
+        with metrics.timer('restaurant_lookup'):
+            restaurants = gather_restaurants(zipcode, preferences)
+        log_to_file(restaurants, 'restaurants', trace_id)
+    
+        # Optimizer results are already complete, so send them all at once
+        if data.get('mode') != 'llm':
+            optimized = validate_recommendations({"recommendations": optimize_recommendations(restaurants, preferences)}, preferences, RECOMMENDATION_LIMIT)
+            if len(optimized) >= OPTIMIZER_MIN_RESULTS or (optimized and data.get('mode') == 'optimizer'):
+                log_to_file({"recommendations": optimized, "source": "optimizer"}, 'final_recommendations', trace_id)
+                lines = [json.dumps({"type": "recommendation", "recommendation": rec}) + "\n" for rec in optimized]
+                lines.append(json.dumps({"type": "done", "count": len(optimized)}) + "\n")
+                return Response(lines, mimetype='application/x-ndjson', headers={'X-Recommendation-Source': 'optimizer'})
+    
+        with metrics.timer('prompt_build'):
+            restaurant_context = build_restaurant_context(restaurants, preferences)
+            rag_prompt = create_rag_prompt(restaurant_context, preferences)
+        log_to_file({"prompt": rag_prompt}, 'prompt', trace_id)
+    
+        cache_key = recommendation_cache_key(restaurant_context, preferences)
+        use_cache = 'no-cache' not in request.headers.get('Cache-Control', '').lower()
+        cached_text = recommendation_cache.get(cache_key) if use_cache else None
+        cache_status = 'HIT' if cached_text is not None else ('BYPASS' if not use_cache else 'MISS')
+    except Exception as e:
+        # Same JSON error shape as /api/recommendations when anything fails before streaming starts
+        print(f"Error in streaming recommendations endpoint: {e}")
+        error_response = {
+            'error': f'Server error: {str(e)}',
+            'recommendations': []
+        }
+        log_to_file(error_response, 'error', trace_id)
         return jsonify(error_response), 200
+    
+    def generate():
+        parser = RecommendationStreamParser()
+        seen_restaurants = set()
+        sent = []
+        response_parts = []
+        try:
+            chunks = [cached_text] if cached_text is not None else stream_completion_text(rag_prompt)
+            for chunk in chunks:
+                response_parts.append(chunk)
+                for rec in parser.feed(chunk):
+                    # Validate each recommendation as soon as its object closes
+                    with metrics.timer('validation'):
+                        validated = validate_streamed_recommendation(rec, restaurants, preferences, seen_restaurants)
+                    for enhanced_rec in validated:
+                        sent.append(enhanced_rec)
+                        yield json.dumps({"type": "recommendation", "recommendation": enhanced_rec}) + "\n"
+            
+            response_text = ''.join(response_parts)
+            log_to_file({"raw_response": response_text, "cache": cache_status, "endpoint": "stream", "limit": None}, 'openai_response', trace_id)
+            try:
+                parse_recommendations(response_text)
+                recommendation_cache.set(cache_key, response_text)
+            except json.JSONDecodeError as e:
+                metrics.inc('parse_failures_total')
+                print(f"Streamed OpenAI response is not valid JSON: {e}")
+            log_to_file({"recommendations": sent}, 'final_recommendations', trace_id)
+            
+            if not sent:
+                yield json.dumps({"type": "error", "error": "No recommendations found that match your dietary goals"}) + "\n"
+            yield json.dumps({"type": "done", "count": len(sent)}) + "\n"
+        except Exception as e:
+            print(f"Error streaming recommendations: {e}")
+            error_response = {'error': f'Error generating recommendations: {str(e)}', 'recommendations': sent}
+            log_to_file(error_response, 'error', trace_id)
+            yield json.dumps({"type": "error", "error": error_response['error']}) + "\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Cache': cache_status, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# CLI commands
+@app.cli.command('preload-geocodes')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+def preload_geocodes(csv_path):
+    """Seed the geocode cache from a CSV of ZIP centroids (zipcode,lat,lng)"""
+    count = geocode_cache.preload_csv(csv_path)
+    print(colored(f"Preloaded {count} ZIP centroids into the geocode cache", 'green'))
+    if not GEOCODE_CACHE_DB:
+        print(colored("GEOCODE_CACHE_DB is not set, so preloaded entries only live in this process", 'yellow'))
+
+@app.cli.command('import-menus')
+@click.argument('menu_path', type=click.Path(exists=True, dir_okay=False))
+def import_menus(menu_path):
+    """Bulk import menu items from JSON ({place_id: [items]}) or CSV into the menu store"""
+    if menu_store is None:
+        print(colored("Set MENU_DB_PATH to the menu store file before importing", 'red'))
+        return
+    count = menu_store.import_file(menu_path)
+    stats = menu_store.stats()
+    print(colored(f"Imported {count} menu items; store now has {stats['items']} items for {stats['restaurants']} restaurants", 'green'))
+
+@app.cli.command('crawl-restaurants')
+@click.argument('zipcodes', nargs=-1, required=True)
+@click.option('--radius', default=5000, show_default=True, help='Search radius in meters')
+def crawl_restaurants(zipcodes, radius):
+    """Crawl the restaurants around ZIP codes into the restaurant catalog now"""
+    if restaurant_catalog is None:
+        print(colored("Set RESTAURANT_CATALOG_DB to the catalog file before crawling", 'red'))
+        return
+    init_clients()
+    if not gmaps:
+        print(colored("The Google Maps API is not available", 'red'))
+        return
+    for zipcode in zipcodes:
+        location = geocode_zipcode(zipcode)
+        if location is None:
+            print(colored(f"Could not geocode {zipcode}", 'yellow'))
+            continue
+        count = crawl_catalog_area(location['lat'], location['lng'], radius)
+        print(colored(f"{zipcode}: stored {count} restaurants", 'green'))
+    stats = restaurant_catalog.stats()
+    print(colored(f"Catalog now has {stats['restaurants']} restaurants in {stats['areas']} areas", 'green'))
+
+@app.cli.command('log-summary')
+@click.argument('log_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--trace-id', default=None, help='Only render entries for this request')
+def log_summary(log_path, trace_id):
+    """Render a JSONL request log as a human-readable summary"""
+    entries = [e for e in read_entries(log_path) if trace_id is None or e.get('trace_id') == trace_id]
+    print(render_summary(entries))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
@@ -0,0 +1,715 @@
+"""
+ASGI entry point with an async recommendation pipeline.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4
+
+/api/restaurants, /api/recommendations and /api/recommendations/stream run on
+asyncio: Geocoding, Nearby Search and Place Details go through one pooled
+httpx.AsyncClient and completions through openai.AsyncOpenAI, so a slow
+upstream call holds a coroutine rather than a thread. Every other route is
+served by the Flask app in a thread pool. Caches, metrics, logging, prompt
+building and validation are shared with app.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import openai
+from asgiref.wsgi import WsgiToAsgi
+
+import app as nutrigo
+from cache import AsyncSingleFlight, AsyncStreamingSingleFlight
+from parsing import RecommendationStreamParser, parse_recommendations
+from resilience import Deadline, async_hedged_call, async_retry_call
+from scoring import max_restaurant_score, score_restaurant
+
+MAPS_BASE_URL = "https://maps.googleapis.com/maps/api"
+
+# Without a lifespan handshake the clients are created on the first request instead
+async_client = None
+maps_http = None
+
+restaurant_flight = AsyncStreamingSingleFlight()
+completion_flight = AsyncSingleFlight()
+
+flask_app = WsgiToAsgi(nutrigo.app)
+
+
+class MapsError(Exception):
+    """Non-OK status from a Google Maps web service"""
+
+    def __init__(self, status, message=''):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+def init_async_clients():
+    """Create the async OpenAI and HTTP clients once per process"""
+    global async_client, maps_http
+    nutrigo.init_clients()
+    if maps_http is not None:
+        return
+
+    if os.environ.get("NUTRIGO_FAKE_UPSTREAMS", "false").lower() == "true":
+        from fakes import FakeOpenAIClient, install_fakes
+
+        maps, _ = install_fakes(
+            nutrigo,
+            maps_latency=float(os.environ.get("FAKE_MAPS_LATENCY", 0.05)),
+            openai_latency=float(os.environ.get("FAKE_OPENAI_LATENCY", 1.0))
+        )
+        async_client = FakeOpenAIClient(latency=float(os.environ.get("FAKE_OPENAI_LATENCY", 1.0)), asynchronous=True)
+        maps_http = nutrigo.http_pools.httpx_client('google_maps_async', asynchronous=True, transport=maps.transport())
+        print("Serving with fake Google Maps and OpenAI clients")
+        return
+
+    # Pooled like the sync clients; Place Details lookups per request are still limited
+    # to PLACE_DETAILS_MAX_WORKERS
+    if nutrigo.openai_api_key and nutrigo.openai_api_key != "your_openai_api_key_here":
+        async_client = openai.AsyncOpenAI(
+            api_key=nutrigo.openai_api_key,
+            max_retries=0,
+            http_client=nutrigo.http_pools.httpx_client(
+                'openai_async',
+                timeout=httpx.Timeout(nutrigo.OPENAI_TIMEOUT, connect=nutrigo.HTTP_CONNECT_TIMEOUT),
+                asynchronous=True
+            )
+        )
+    maps_http = nutrigo.http_pools.httpx_client('google_maps_async', asynchronous=True)
+
+
+async def close_async_clients():
+    if async_client is not None:
+        await async_client.close()
+    if maps_http is not None:
+        await maps_http.aclose()
+
+
+# --- Google Maps -----------------------------------------------------------
+
+async def maps_get(service, params):
+    """GET a Maps web service (e.g. "geocode/json") and return its JSON body"""
+    response = await maps_http.get(f"{MAPS_BASE_URL}/{service}", params={**params, "key": nutrigo.google_maps_api_key})
+    response.raise_for_status()
+    body = response.json()
+    if body.get("status") not in ("OK", "ZERO_RESULTS"):
+        raise MapsError(body.get('status'), body.get('error_message', ''))
+    return body
+
+
+async def geocode_zipcode(zipcode):
+    """Resolve a zipcode to {"lat", "lng"}, using the shared geocode cache when possible"""
+    # The geocode cache falls back to SQLite on a memory miss
+    location = await asyncio.to_thread(nutrigo.geocode_cache.get, zipcode)
+    if location is not None:
+        return location
+
+    with nutrigo.metrics.timer('geocode'):
+        body = await maps_get("geocode/json", {"address": zipcode})
+    if not body.get("results"):
+        return None
+
+    location = body["results"][0]["geometry"]["location"]
+    await asyncio.to_thread(nutrigo.geocode_cache.set, zipcode, location)
+    return location
+
+
+async def nearby_search(location, radius, open_now):
+    params = {"location": f"{location['lat']},{location['lng']}", "radius": radius, "type": "restaurant"}
+    if open_now:
+        params["opennow"] = "true"
+    with nutrigo.metrics.timer('nearby_search'):
+        return await maps_get("place/nearbysearch/json", params)
+
+
+async def fetch_next_nearby_page(page_token):
+    """Fetch the Nearby Search page for page_token, waiting until Google accepts the token"""
+    for attempt in range(nutrigo.NEARBY_PAGE_ATTEMPTS):
+        await asyncio.sleep(nutrigo.NEARBY_PAGE_TOKEN_DELAY)
+        try:
+            with nutrigo.metrics.timer('nearby_search_page'):
+                return await maps_get("place/nearbysearch/json", {"pagetoken": page_token})
+        except MapsError as e:
+            # A token used before it is valid is rejected as INVALID_REQUEST
+            if e.status != 'INVALID_REQUEST' or attempt == nutrigo.NEARBY_PAGE_ATTEMPTS - 1:
+                raise
+
+
+async def iter_nearby_places(location, radius, open_now, max_results=None):
+    """Yield Nearby Search results page by page, following next_page_token up to max_results places"""
+    if max_results is None:
+        max_results = nutrigo.NEARBY_MAX_RESULTS
+    page = await nearby_search(location, radius, open_now)
+    count = 0
+    while True:
+        for place in page.get('results', [])[:max(max_results - count, 0)]:
+            count += 1
+            yield place
+        token = page.get('next_page_token')
+        if not token or count >= max_results:
+            return
+        try:
+            page = await fetch_next_nearby_page(token)
+        except Exception as e:
+            nutrigo.metrics.inc('upstream_errors_total', service='nearby_search')
+            print(f"Error fetching the next Nearby Search page: {str(e)}")
+            return
+
+
+async def fetch_place_details(place_ids, timeout=None, on_result=None):
+    """Fetch Place Details for an async iterable of place_ids concurrently, preserving order
+
+    Each lookup starts as soon as its id arrives and timeout counts from the last
+    one; on_result(details) is called as each lookup succeeds.
+    """
+    if timeout is None:
+        timeout = nutrigo.PLACE_DETAILS_TIMEOUT
+    semaphore = asyncio.Semaphore(nutrigo.PLACE_DETAILS_MAX_WORKERS)
+    fields = ','.join(nutrigo.PLACE_DETAILS_FIELDS)
+
+    async def lookup(place_id):
+        async with semaphore:
+            body = await maps_get("place/details/json", {"place_id": place_id, "fields": fields})
+        if body.get('result') and on_result is not None:
+            on_result(body['result'])
+        return body
+
+    lookups = []
+    async for place_id in place_ids:
+        lookups.append((place_id, asyncio.ensure_future(lookup(place_id))))
+    if not lookups:
+        return []
+    _, pending = await asyncio.wait([task for _, task in lookups], timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    restaurants = []
+    failed = 0
+    for place_id, task in lookups:
+        # Cancelled tasks only finish on the next loop iteration, so check pending rather than cancelled()
+        if task in pending or task.exception() is not None:
+            # Skip this place but keep the rest of the results
+            failed += 1
+            nutrigo.metrics.inc('upstream_errors_total', service='place_details')
+            error = 'Timeout' if task in pending else f"{type(task.exception()).__name__}: {task.exception()}"
+            print(f"Error fetching details for place {place_id}: {error}")
+        elif task.result().get('result'):
+            restaurants.append(task.result()['result'])
+
+    if failed:
+        print(f"Place Details: {failed} of {len(lookups)} lookups failed")
+    return restaurants
+
+
+async def fetch_restaurants_by_zipcode(zipcode, radius=5000, open_now=True, on_restaurant=None):
+    """Get restaurants using the Places web services by zipcode
+
+    Place Details lookups start while later result pages are still being fetched;
+    on_restaurant(details) is called as each one arrives.
+    """
+    try:
+        location = await geocode_zipcode(zipcode)
+        if location is None:
+            print(f"Could not find location for zipcode: {zipcode}")
+            print("Using a fallback location (San Francisco) for testing purposes.")
+            location = {"lat": 37.7749, "lng": -122.4194}
+
+        places = iter_nearby_places(location, radius, open_now)
+        first_place = await anext(places, None)
+        if first_place is None:
+            print(f"No restaurants found near {zipcode}. Using a fallback location.")
+            places = iter_nearby_places({"lat": 37.7749, "lng": -122.4194}, radius, open_now)
+
+        async def place_ids():
+            if first_place is not None:
+                yield first_place['place_id']
+            async for place in places:
+                yield place['place_id']
+
+        with nutrigo.metrics.timer('place_details'):
+            restaurants = await fetch_place_details(place_ids(), on_result=on_restaurant)
+
+        if not restaurants:
+            print("No restaurants found. Using sample data instead.")
+            nutrigo.metrics.inc('sample_fallback_total', reason='no_results')
+            return nutrigo.SAMPLE_RESTAURANTS
+
+        return restaurants
+    except Exception as e:
+        print(f"Error fetching restaurants: {str(e)}")
+        nutrigo.metrics.inc('upstream_errors_total', service='google_maps')
+        nutrigo.metrics.inc('sample_fallback_total', reason='maps_error')
+        print("Using sample restaurant data instead.")
+        return nutrigo.SAMPLE_RESTAURANTS
+
+
+async def catalog_restaurants(zipcode, radius, open_now):
+    """Restaurants near a zipcode from the local catalog, or None to use the Places API"""
+    try:
+        location = await geocode_zipcode(zipcode)
+    except Exception as e:
+        print(f"Error geocoding {zipcode} for the restaurant catalog: {str(e)}")
+        return None
+    if location is None:
+        return None
+    # Catalog queries and the demand write are SQLite calls
+    return await asyncio.to_thread(nutrigo.catalog_lookup, location, radius, open_now)
+
+
+async def known_restaurants(zipcode, radius, open_now):
+    """Restaurants available without a Places lookup (sample data, the catalog or the cache), else None"""
+    if not nutrigo.maps_api_available:
+        print("Google Maps API is not available. Using sample restaurant data instead.")
+        nutrigo.metrics.inc('sample_fallback_total', reason='maps_unavailable')
+        return nutrigo.SAMPLE_RESTAURANTS
+
+    if nutrigo.restaurant_catalog is not None:
+        restaurants = await catalog_restaurants(zipcode, radius, open_now)
+        if restaurants:
+            return restaurants
+
+    async def reload():
+        return await restaurant_stream(zipcode, radius, open_now).result()
+
+    return nutrigo.restaurant_cache.get(
+        nutrigo.restaurant_cache_key(zipcode, radius, open_now),
+        reload,
+        should_cache=nutrigo.is_cacheable_restaurants
+    )
+
+
+def restaurant_stream(zipcode, radius, open_now):
+    """Start (or join) the Places lookup for a search and return its AsyncResultStream of restaurants"""
+    key = nutrigo.restaurant_cache_key(zipcode, radius, open_now)
+
+    async def produce(publish):
+        restaurants = await fetch_restaurants_by_zipcode(zipcode, radius, open_now, on_restaurant=publish)
+        nutrigo.restaurant_cache.set(key, restaurants, should_cache=nutrigo.is_cacheable_restaurants)
+        return restaurants
+
+    return restaurant_flight.stream(key, produce)
+
+
+async def get_restaurants_by_zipcode(zipcode, radius=5000, open_now=True):
+    """Get restaurants by zipcode, served from the shared restaurant cache when possible"""
+    restaurants = await known_restaurants(zipcode, radius, open_now)
+    if restaurants is not None:
+        return restaurants
+    return await restaurant_stream(zipcode, radius, open_now).result()
+
+
+async def gather_restaurants(zipcode, preferences, radius=5000, open_now=True):
+    """Restaurants to recommend from, returned once enough good candidates have arrived (see app.py)"""
+    restaurants = await known_restaurants(zipcode, radius, open_now)
+    if restaurants is not None:
+        return restaurants
+
+    stream = restaurant_stream(zipcode, radius, open_now)
+    if nutrigo.RESTAURANT_EARLY_CANDIDATES > 0:
+        threshold = nutrigo.RESTAURANT_EARLY_MIN_QUALITY * max_restaurant_score()
+        arrived = []
+        good = 0
+        async for restaurant in stream:
+            arrived.append(restaurant)
+            if score_restaurant(restaurant, preferences) >= threshold:
+                good += 1
+                if good >= nutrigo.RESTAURANT_EARLY_CANDIDATES:
+                    nutrigo.metrics.inc('restaurant_early_starts_total')
+                    return arrived
+    return await stream.result()
+
+
+# --- OpenAI ----------------------------------------------------------------
+
+async def call_openai(request_kwargs, deadline, hedge=False, stage='openai_attempt'):
+    """Async call_openai: deadline-bounded attempts, retries and optional hedging"""
+    async def attempt():
+        with nutrigo.metrics.timer(stage):
+            try:
+                return await async_client.chat.completions.create(
+                    **request_kwargs, timeout=nutrigo.openai_timeout(deadline)
+                )
+            except Exception:
+                nutrigo.metrics.inc('upstream_errors_total', service='openai')
+                raise
+
+    async def attempt_once():
+        if not hedge:
+            return await attempt()
+        return await async_hedged_call(attempt, min(nutrigo.hedge_delay(), deadline.remaining()),
+                                       on_hedge=lambda: nutrigo.metrics.inc('openai_hedges_total'))
+
+    def on_retry(error, retry):
+        nutrigo.metrics.inc('openai_retries_total')
+        print(f"Retrying OpenAI call after {type(error).__name__}: {str(error)}")
+
+    return await async_retry_call(
+        attempt_once, nutrigo.OPENAI_RETRIES, nutrigo.OPENAI_RETRY_BASE_DELAY, nutrigo.OPENAI_RETRY_MAX_DELAY,
+        deadline=deadline, should_retry=nutrigo.is_transient_openai_error, on_retry=on_retry
+    )
+
+
+async def generate_completion_text(rag_prompt, deadline):
+    """Call OpenAI for a prompt, sharing the call with identical requests already in flight"""
+    request_kwargs = nutrigo.build_completion_request(rag_prompt)
+    key = hashlib.sha256(json.dumps(request_kwargs, sort_keys=True).encode('utf-8')).hexdigest()
+
+    async def create():
+        with nutrigo.metrics.timer('openai_completion'):
+            completion = await call_openai(request_kwargs, deadline, hedge=nutrigo.OPENAI_HEDGE_ENABLED)
+        nutrigo.record_token_usage(getattr(completion, 'usage', None))
+        return nutrigo.message_text(completion.choices[0].message)
+
+    return await completion_flight.do(key, create)
+
+
+async def stream_completion_text(rag_prompt, deadline):
+    """Call OpenAI with streaming enabled and yield the response text as it arrives"""
+    start = time.perf_counter()
+    stream = await call_openai(
+        {**nutrigo.build_completion_request(rag_prompt), "stream": True, "stream_options": {"include_usage": True}},
+        deadline,
+        stage='openai_stream_connect'
+    )
+    try:
+        first_chunk = True
+        async for event in stream:
+            if getattr(event, 'usage', None):
+                nutrigo.record_token_usage(event.usage)
+            text = nutrigo.message_text(event.choices[0].delta) if event.choices else None
+            if text:
+                if first_chunk:
+                    nutrigo.metrics.observe('stage_duration_seconds', time.perf_counter() - start, stage='openai_first_token')
+                    first_chunk = False
+                yield text
+    except Exception:
+        nutrigo.metrics.inc('upstream_errors_total', service='openai')
+        raise
+    finally:
+        nutrigo.metrics.observe('stage_duration_seconds', time.perf_counter() - start, stage='openai_completion')
+
+
+def run_optimizer(restaurants, preferences):
+    """Validated optimizer recommendations; runs in a thread since it reads SQLite and may call OpenAI"""
+    return nutrigo.validate_recommendations(
+        {"recommendations": nutrigo.optimize_recommendations(restaurants, preferences)},
+        preferences,
+        nutrigo.RECOMMENDATION_LIMIT
+    )
+
+
+def build_prompt(restaurants, preferences):
+    """The RAG prompt and its cache key; runs in a thread since it reads menus from SQLite and counts tokens"""
+    restaurant_context = nutrigo.build_restaurant_context(restaurants, preferences)
+    rag_prompt = nutrigo.create_rag_prompt(restaurant_context, preferences)
+    return rag_prompt, nutrigo.recommendation_cache_key(restaurant_context, preferences)
+
+
+def validate_response(recommendations_data, restaurants, preferences):
+    """Grounded, validated recommendations; runs in a thread since grounding reads menus from SQLite"""
+    recommendations_data = nutrigo.ground_recommendations(recommendations_data, restaurants)
+    return nutrigo.validate_recommendations(recommendations_data, preferences, nutrigo.RECOMMENDATION_LIMIT)
+
+
+# --- HTTP ------------------------------------------------------------------
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope.get('headers', [])}
+        self.args = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.body = body
+        self.trace_id = nutrigo.new_trace_id()
+        self.client_request_id = self.headers.get('x-request-id', '')[:nutrigo.CLIENT_REQUEST_ID_MAX_LENGTH]
+        self.started = time.monotonic()
+        self.deadline = Deadline(nutrigo.REQUEST_DEADLINE)
+
+    @property
+    def is_json(self):
+        mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        return mimetype == 'application/json' or mimetype.endswith('+json')
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def response_headers(request, headers=None, content_type='application/json'):
+    merged = {
+        'content-type': content_type,
+        'access-control-allow-origin': '*',
+        'x-trace-id': request.trace_id,
+        **{key.lower(): value for key, value in (headers or {}).items()}
+    }
+    return [(key.encode('latin-1'), str(value).encode('latin-1')) for key, value in merged.items()]
+
+
+def record_request(request, endpoint, status):
+    nutrigo.metrics.observe('request_duration_seconds', time.monotonic() - request.started, endpoint=endpoint)
+    nutrigo.metrics.inc('requests_total', endpoint=endpoint, status=status)
+
+
+async def send_json(send, request, endpoint, data, status=200, headers=None):
+    body = json.dumps(data).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers(request, headers)})
+    await send({'type': 'http.response.body', 'body': body})
+    record_request(request, endpoint, status)
+
+
+async def get_restaurants(request, send):
+    """Get restaurants by ZIP code"""
+    zipcode = request.args.get('zipcode', '46556')
+    radius = int(request.args.get('radius', 5000))
+    open_now = request.args.get('open_now', 'true').lower() != 'false'
+
+    restaurants = await get_restaurants_by_zipcode(zipcode, radius, open_now)
+    await send_json(send, request, 'get_restaurants', restaurants)
+
+
+async def parse_recommendation_request(request, send, endpoint):
+    """Validate the request body; returns (data, preferences) or None after sending an error"""
+    if not request.is_json:
+        await send_json(send, request, endpoint, {'error': 'Request must be JSON'}, 400)
+        return None
+    if async_client is None:
+        await send_json(send, request, endpoint, {'error': 'OpenAI API is not available'}, 503)
+        return None
+    try:
+        data = request.json()
+    except ValueError:
+        # Malformed JSON or a body that is not UTF-8
+        await send_json(send, request, endpoint, {'error': 'Request body is not valid JSON'}, 400)
+        return None
+
+    nutrigo.log_to_file(data, 'request', request.trace_id, client_request_id=request.client_request_id)
+    if not data or 'preferences' not in data:
+        await send_json(send, request, endpoint, {'error': 'Missing preferences'}, 400)
+        return None
+    preferences = data.get('preferences', {})
+    if not preferences.get('zipcode', ''):
+        await send_json(send, request, endpoint, {'error': 'ZIP code is required'}, 400)
+        return None
+    return data, preferences
+
+
+async def prepare_recommendations(request, send, endpoint):
+    """Everything before the OpenAI call: parse the body, find restaurants, try the optimizer, build the prompt
+
+    Returns None after sending an error response, ('optimizer', recommendations)
+    or ('llm', (restaurants, preferences, rag_prompt, cache_key)).
+    """
+    trace_id = request.trace_id
+    parsed = await parse_recommendation_request(request, send, endpoint)
+    if parsed is None:
+        return None
+    data, preferences = parsed
+
+    with nutrigo.metrics.timer('restaurant_lookup'):
+        restaurants = await gather_restaurants(preferences['zipcode'], preferences)
+    nutrigo.log_to_file(restaurants, 'restaurants', trace_id)
+
+    # Prefer the local optimizer when enough restaurants have menu data
+    if data.get('mode') != 'llm':
+        optimized = await asyncio.to_thread(run_optimizer, restaurants, preferences)
+        if len(optimized) >= nutrigo.OPTIMIZER_MIN_RESULTS or (optimized and data.get('mode') == 'optimizer'):
+            nutrigo.log_to_file({"recommendations": optimized, "source": "optimizer"}, 'final_recommendations', trace_id)
+            return 'optimizer', optimized
+
+    with nutrigo.metrics.timer('prompt_build'):
+        rag_prompt, cache_key = await asyncio.to_thread(build_prompt, restaurants, preferences)
+    nutrigo.log_to_file({"prompt": rag_prompt}, 'prompt', trace_id)
+    return 'llm', (restaurants, preferences, rag_prompt, cache_key)
+
+
+async def send_server_error(send, request, endpoint, error):
+    """Answer a request that failed before its response started, in the same shape as the Flask app"""
+    print(f"Error in {endpoint} endpoint: {error}")
+    error_response = {'error': f'Server error: {str(error)}', 'recommendations': []}
+    nutrigo.log_to_file(error_response, 'error', request.trace_id)
+    await send_json(send, request, endpoint, error_response)
+
+
+async def get_recommendations(request, send):
+    """Get restaurant recommendations based on user preferences"""
+    endpoint = 'get_recommendations'
+    trace_id = request.trace_id
+    print(f"\n=== New Recommendation Request [{trace_id}] ===")
+    try:
+        prepared = await prepare_recommendations(request, send, endpoint)
+    except Exception as e:
+        await send_server_error(send, request, endpoint, e)
+        return
+    if prepared is None:
+        return
+    source, result = prepared
+    if source == 'optimizer':
+        await send_json(send, request, endpoint, {"recommendations": result},
+                        headers={'X-Recommendation-Source': 'optimizer'})
+        return
+    restaurants, preferences, rag_prompt, cache_key = result
+
+    use_cache = 'no-cache' not in request.headers.get('cache-control', '').lower()
+    response_text = nutrigo.recommendation_cache.get(cache_key) if use_cache else None
+    cache_status = 'HIT' if response_text is not None else ('BYPASS' if not use_cache else 'MISS')
+
+    try:
+        if response_text is None:
+            response_text = await generate_completion_text(rag_prompt, request.deadline)
+        nutrigo.log_to_file({"raw_response": response_text, "cache": cache_status, "endpoint": "recommendations",
+                             "limit": nutrigo.RECOMMENDATION_LIMIT}, 'openai_response', trace_id)
+
+        try:
+            with nutrigo.metrics.timer('json_parse'):
+                recommendations_data = parse_recommendations(response_text)
+        except json.JSONDecodeError as e:
+            nutrigo.metrics.inc('parse_failures_total')
+            print(f"Error parsing OpenAI response as JSON: {e}")
+            error_response = {"error": "Failed to parse recommendations", "recommendations": [], "raw_response": response_text}
+            nutrigo.log_to_file(error_response, 'error', trace_id)
+            await send_json(send, request, endpoint, error_response)
+            return
+        nutrigo.recommendation_cache.set(cache_key, response_text)
+
+        with nutrigo.metrics.timer('validation'):
+            valid_recommendations = await asyncio.to_thread(validate_response, recommendations_data, restaurants, preferences)
+        nutrigo.log_to_file({"recommendations": valid_recommendations}, 'final_recommendations', trace_id)
+
+        if not valid_recommendations:
+            await send_json(send, request, endpoint, {
+                "error": "No recommendations found that match your dietary goals",
+                "recommendations": []
+            }, headers={'X-Cache': cache_status})
+            return
+        await send_json(send, request, endpoint, {"recommendations": valid_recommendations}, headers={'X-Cache': cache_status})
+    except Exception as e:
+        print(f"Error calling OpenAI API: {e}")
+        error_response = {'error': f'Error generating recommendations: {str(e)}', 'recommendations': []}
+        nutrigo.log_to_file(error_response, 'error', trace_id)
+        await send_json(send, request, endpoint, error_response)
+
+
+async def stream_recommendations(request, send):
+    """Stream validated recommendations as NDJSON as soon as each one is generated"""
+    endpoint = 'stream_recommendations'
+    trace_id = request.trace_id
+    print(f"\n=== New Streaming Recommendation Request [{trace_id}] ===")
+    try:
+        prepared = await prepare_recommendations(request, send, endpoint)
+    except Exception as e:
+        # Same JSON error shape as /api/recommendations when anything fails before streaming starts
+        await send_server_error(send, request, endpoint, e)
+        return
+    if prepared is None:
+        return
+    source, result = prepared
+
+    async def start(headers):
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': response_headers(request, headers, 'application/x-ndjson')})
+        record_request(request, endpoint, 200)
+
+    async def emit(event, more=True):
+        await send({'type': 'http.response.body', 'body': (json.dumps(event) + "\n").encode('utf-8'), 'more_body': more})
+
+    # Optimizer results are already complete, so send them all at once
+    if source == 'optimizer':
+        await start({'X-Recommendation-Source': 'optimizer'})
+        for rec in result:
+            await emit({"type": "recommendation", "recommendation": rec})
+        await emit({"type": "done", "count": len(result)}, more=False)
+        return
+    restaurants, preferences, rag_prompt, cache_key = result
+
+    use_cache = 'no-cache' not in request.headers.get('cache-control', '').lower()
+    cached_text = nutrigo.recommendation_cache.get(cache_key) if use_cache else None
+    cache_status = 'HIT' if cached_text is not None else ('BYPASS' if not use_cache else 'MISS')
+
+    await start({'X-Cache': cache_status, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    parser = RecommendationStreamParser()
+    seen_restaurants = set()
+    sent = []
+    response_parts = []
+    try:
+        async def cached():
+            yield cached_text
+        chunks = cached() if cached_text is not None else stream_completion_text(rag_prompt, request.deadline)
+        async for chunk in chunks:
+            response_parts.append(chunk)
+            for rec in parser.feed(chunk):
+                # Validate each recommendation as soon as its object closes
+                with nutrigo.metrics.timer('validation'):
+                    validated = await asyncio.to_thread(nutrigo.validate_streamed_recommendation,
+                                                        rec, restaurants, preferences, seen_restaurants)
+                for enhanced_rec in validated:
+                    sent.append(enhanced_rec)
+                    await emit({"type": "recommendation", "recommendation": enhanced_rec})
+
+        response_text = ''.join(response_parts)
+        nutrigo.log_to_file({"raw_response": response_text, "cache": cache_status, "endpoint": "stream", "limit": None},
+                            'openai_response', trace_id)
+        try:
+            parse_recommendations(response_text)
+            nutrigo.recommendation_cache.set(cache_key, response_text)
+        except json.JSONDecodeError as e:
+            nutrigo.metrics.inc('parse_failures_total')
+            print(f"Streamed OpenAI response is not valid JSON: {e}")
+        nutrigo.log_to_file({"recommendations": sent}, 'final_recommendations', trace_id)
+
+        if not sent:
+            await emit({"type": "error", "error": "No recommendations found that match your dietary goals"})
+        await emit({"type": "done", "count": len(sent)}, more=False)
+    except Exception as e:
+        print(f"Error streaming recommendations: {e}")
+        error_response = {'error': f'Error generating recommendations: {str(e)}', 'recommendations': sent}
+        nutrigo.log_to_file(error_response, 'error', trace_id)
+        await emit({"type": "error", "error": error_response['error']}, more=False)
+
+
+ROUTES = {
+    ('GET', '/api/restaurants'): get_restaurants,
+    ('POST', '/api/recommendations'): get_recommendations,
+    ('POST', '/api/recommendations/stream'): stream_recommendations
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            init_async_clients()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    handler = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is None:
+        # Everything else, including CORS preflight requests, is served by Flask
+        await flask_app(scope, receive, send)
+        return
+
+    init_async_clients()
+    request = Request(scope, await read_body(receive))
+    await handler(request, send)
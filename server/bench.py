@@ -0,0 +1,223 @@
+"""
+Offline benchmark for the NutriGo API.
+
+Replaces the Google Maps and OpenAI clients with the local stand-ins from
+fakes.py, drives the API in-process at a configurable concurrency and reports
+throughput, latency percentiles and the per-stage breakdown from /api/metrics.
+With --url, drives a running server over HTTP instead (see gunicorn.conf.py
+for serving it with fake upstreams).
+
+Usage:
+    python bench.py --requests 500 --concurrency 32 --openai-latency 1.5
+    python bench.py --url http://127.0.0.1:5001 --requests 2000 --concurrency 500
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep the benchmark off the network and out of the real log directory
+os.environ.setdefault("HEALTH_PROBE_ENABLED", "false")
+os.environ.setdefault("LOG_DIR", os.path.join(tempfile.gettempdir(), "nutrigo-bench-logs"))
+
+import requests  # noqa: E402
+
+import app as nutrigo  # noqa: E402
+from fakes import install_fakes  # noqa: E402
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def clear_caches():
+    """Start from cold caches"""
+    nutrigo.geocode_cache.memory.clear()
+    nutrigo.restaurant_cache.clear()
+    nutrigo.recommendation_cache.clear()
+
+
+def build_request(endpoint, index, args):
+    """Return (method, path, kwargs) for the index-th request"""
+    zipcode = str(10000 + index % args.zipcodes)
+    if endpoint == 'restaurants':
+        return 'get', '/api/restaurants', {"query_string": {"zipcode": zipcode}}
+
+    preferences = {
+        "calorie_count": 700 + (index % 4) * 100,
+        "macronutrients": {"protein_grams": 40, "carbs_grams": 80, "fats_grams": 25},
+        "zipcode": zipcode,
+        "cuisine_preferences": [],
+        "allergies": [],
+        "price_range": [10, 25]
+    }
+    headers = {"Cache-Control": "no-cache"} if args.no_cache else {}
+    path = '/api/recommendations/stream' if endpoint == 'stream' else '/api/recommendations'
+    return 'post', path, {"json": {"preferences": preferences}, "headers": headers}
+
+
+def make_sender(args):
+    """Return send(method, path, kwargs) -> status, for the in-process app or the server at --url"""
+    local = threading.local()
+
+    if args.url:
+        def send(method, path, kwargs):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            try:
+                response = local.session.request(
+                    method, args.url.rstrip('/') + path,
+                    params=kwargs.get('query_string'), json=kwargs.get('json'), headers=kwargs.get('headers'),
+                    timeout=args.timeout
+                )
+                response.content  # drain streamed bodies
+            except requests.RequestException as e:
+                return type(e).__name__
+            return response.status_code
+        return send
+
+    def send(method, path, kwargs):
+        if not hasattr(local, 'client'):
+            local.client = nutrigo.app.test_client()
+        response = getattr(local.client, method)(path, **kwargs)
+        response.get_data()  # drain streamed bodies
+        return response.status_code
+    return send
+
+
+def run(args):
+    maps = llm = None
+    if not args.url:
+        maps, llm = install_fakes(
+            nutrigo,
+            places=args.places,
+            maps_latency=args.maps_latency,
+            openai_latency=args.openai_latency,
+            jitter=args.jitter,
+            maps_error_rate=args.maps_error_rate,
+            openai_error_rate=args.openai_error_rate,
+            seed=args.seed
+        )
+        clear_caches()
+
+    endpoints = args.endpoint.split(',')
+    send = make_sender(args)
+    latencies = {endpoint: [] for endpoint in endpoints}
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def one(index):
+        endpoint = endpoints[index % len(endpoints)]
+        method, path, kwargs = build_request(endpoint, index, args)
+        start = time.perf_counter()
+        status = send(method, path, kwargs)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[endpoint].append(elapsed)
+            statuses[f"{endpoint}:{status}"] += 1
+
+    # The app prints a line per stage; keep the benchmark output readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            if args.warmup:
+                # Warm the caches, then measure from clean counters
+                list(pool.map(one, range(args.warmup)))
+                for values in latencies.values():
+                    values.clear()
+                statuses.clear()
+                if not args.url:
+                    nutrigo.log_writer.flush()
+                    nutrigo.metrics.reset()
+                    maps.calls = maps.errors = llm.calls = llm.errors = 0
+
+            started = time.perf_counter()
+            list(pool.map(one, range(args.requests)))
+            wall = time.perf_counter() - started
+        nutrigo.log_writer.flush()
+
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(args.requests / wall, 2) if wall else 0.0,
+        "statuses": dict(statuses),
+        "endpoints": {},
+        # Stage timings and upstream counts are only visible in-process
+        "stages": nutrigo.metrics.stage_summary() if not args.url else {},
+        "upstream_calls": {"maps": maps.calls, "maps_errors": maps.errors, "openai": llm.calls, "openai_errors": llm.errors} if not args.url else {}
+    }
+    for endpoint, values in latencies.items():
+        values.sort()
+        report["endpoints"][endpoint] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests at concurrency {report['concurrency']} "
+          f"in {report['wall_seconds']}s -> {report['requests_per_second']} req/s")
+    print(f"Statuses: {report['statuses']}")
+    if report["upstream_calls"]:
+        print(f"Upstream calls: {report['upstream_calls']}")
+    print()
+    print(f"{'endpoint':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<28}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    if not report["stages"]:
+        return
+    print()
+    print(f"{'stage':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in sorted(report["stages"].items()):
+        print(f"{stage:<28}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the NutriGo API against stubbed Google Maps and OpenAI backends")
+    parser.add_argument('--url', default=None,
+                        help="Base URL of a running server to benchmark over HTTP instead of in-process")
+    parser.add_argument('--timeout', type=float, default=60, help="HTTP timeout per request with --url")
+    parser.add_argument('--endpoint', default='recommendations',
+                        help="Comma-separated mix of recommendations, stream and restaurants (default: recommendations)")
+    parser.add_argument('--requests', type=int, default=200, help="Total requests to send")
+    parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight at once")
+    parser.add_argument('--zipcodes', type=int, default=20, help="Distinct ZIP codes to spread requests over")
+    parser.add_argument('--places', type=int, default=20, help="Results returned by each nearby search")
+    parser.add_argument('--maps-latency', type=float, default=0.05, help="Seconds per Google Maps call")
+    parser.add_argument('--openai-latency', type=float, default=1.0, help="Seconds per OpenAI completion")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Latency jitter as a fraction of the latency")
+    parser.add_argument('--maps-error-rate', type=float, default=0.0, help="Fraction of Google Maps calls that fail")
+    parser.add_argument('--openai-error-rate', type=float, default=0.0, help="Fraction of OpenAI calls that fail")
+    parser.add_argument('--no-cache', action='store_true', help="Send Cache-Control: no-cache on recommendation requests")
+    parser.add_argument('--warmup', type=int, default=0, help="Unmeasured requests sent first to warm the caches")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for latency and error injection")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,551 @@
+"""
+Caching helpers for the NutriGo backend.
+"""
+
+import asyncio
+import csv
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Store value under key; a ttl of None uses the cache default, 0 never expires"""
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def normalize_zipcode(zipcode):
+    """Normalize a ZIP code string so equivalent inputs share a cache key"""
+    return str(zipcode).strip().upper()
+
+
+class GeocodeCache:
+    """ZIP code -> {"lat", "lng"} cache with an optional SQLite store shared across workers"""
+
+    def __init__(self, db_path=None, maxsize=10000, ttl=30 * 24 * 3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+        if db_path:
+            with self._lock:
+                self._connection()
+
+    def _connection(self):
+        # Reopen after fork so each gunicorn worker has its own handle on the shared file
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                "zipcode TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, expires_at REAL)"
+            )
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get(self, zipcode):
+        """Return the cached location for zipcode, or None"""
+        key = normalize_zipcode(zipcode)
+        location = self.memory.get(key)
+        if location is not None or not self.db_path:
+            return location
+
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT lat, lng, expires_at FROM geocodes WHERE zipcode = ?", (key,)
+            ).fetchone()
+        if row is None or (row[2] is not None and row[2] <= time.time()):
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        location = {"lat": row[0], "lng": row[1]}
+        ttl = 0 if row[2] is None else max(1, row[2] - time.time())
+        self.memory.set(key, location, ttl=ttl)
+        return location
+
+    def set(self, zipcode, location, ttl=None):
+        """Cache a location; a ttl of 0 marks it as permanent"""
+        if ttl is None:
+            ttl = self.ttl
+        key = normalize_zipcode(zipcode)
+        location = {"lat": float(location["lat"]), "lng": float(location["lng"])}
+        self.memory.set(key, location, ttl=ttl)
+        if self.db_path:
+            self._write([(key, location["lat"], location["lng"], time.time() + ttl if ttl else None)])
+
+    def _write(self, rows):
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocodes (zipcode, lat, lng, expires_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.commit()
+
+    def preload_csv(self, path, ttl=0):
+        """Seed the cache from a CSV of ZIP centroids (zipcode, lat, lng columns)
+
+        Preloaded entries never expire by default. Returns the number of rows loaded.
+        """
+        rows = []
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+            zip_col = next((fields[c] for c in ('zipcode', 'zip', 'zip_code', 'postal_code') if c in fields), None)
+            lat_col = next((fields[c] for c in ('lat', 'latitude') if c in fields), None)
+            lng_col = next((fields[c] for c in ('lng', 'lon', 'long', 'longitude') if c in fields), None)
+            if not (zip_col and lat_col and lng_col):
+                raise ValueError("CSV must have zipcode, lat and lng columns")
+
+            for record in reader:
+                try:
+                    key = normalize_zipcode(record[zip_col])
+                    lat, lng = float(record[lat_col]), float(record[lng_col])
+                except (TypeError, ValueError):
+                    continue
+                if not key:
+                    continue
+                rows.append((key, lat, lng, time.time() + ttl if ttl else None))
+
+        for key, lat, lng, _ in rows:
+            self.memory.set(key, {"lat": lat, "lng": lng}, ttl=ttl)
+        if self.db_path and rows:
+            self._write(rows)
+        return len(rows)
+
+    def stats(self):
+        """Return memory and disk hit/miss counters"""
+        stats = self.memory.stats()
+        stats["disk_enabled"] = bool(self.db_path)
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_misses"] = self.disk_misses
+        return stats
+
+
+class StaleWhileRevalidateCache:
+    """TTL cache that serves stale entries while refreshing them in the background
+
+    Entries are fresh for ttl seconds, then served stale for up to stale_ttl more
+    seconds while a single background refresh per key reloads them.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, stale_ttl=3600):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get(self, key, loader=None, should_cache=None):
+        """Return the cached value for key (fresh or stale), or None on a miss
+
+        A stale value is refreshed in the background with loader(), if given; a
+        coroutine function loader is refreshed in a task on the running loop.
+        should_cache(value) can veto caching a result, e.g. a fallback response.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, fresh_until = entry
+        if fresh_until <= time.time():
+            self.stale_hits += 1
+            if asyncio.iscoroutinefunction(loader):
+                self._refresh_task(key, loader, should_cache)
+            elif loader is not None:
+                self._refresh_in_background(key, loader, should_cache)
+        return value
+
+    def set(self, key, value, should_cache=None):
+        self._store(key, value, should_cache)
+
+    def _refresh_task(self, key, loader, should_cache):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                self._store(key, await loader(), should_cache)
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"Background refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        task = asyncio.ensure_future(refresh())
+        # Keep a reference so the task is not garbage collected before it finishes
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _store(self, key, value, should_cache):
+        if should_cache is None or should_cache(value):
+            self._entries.set(key, (value, time.time() + self.ttl))
+
+    def _refresh_in_background(self, key, loader, should_cache):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(key, loader(), should_cache)
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"Background refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name='cache-refresh', daemon=True).start()
+
+    def invalidate(self, key):
+        self._entries.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        """Return size, hit/miss and refresh counters"""
+        stats = self._entries.stats()
+        stats["stale_hits"] = self.stale_hits
+        stats["refreshes"] = self.refreshes
+        stats["refresh_errors"] = self.refresh_errors
+        return stats
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one in-flight execution"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.collapsed = 0
+
+    def do(self, key, fn):
+        """Run fn() for key, or wait for and share the result of a call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.collapsed += 1
+                leader = False
+            else:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    def stats(self):
+        """Return how many calls ran upstream and how many were collapsed onto them"""
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": in_flight
+        }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key, fn):
+        """Await fn() for key, or share the result of a call already in flight"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.collapsed += 1
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+
+        self.executions += 1
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._calls)
+        }
+
+
+class ResultStream:
+    """Items published by one in-flight call, readable by any number of consumers while it runs"""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.value = None
+        self.error = None
+        self._changed = threading.Condition()
+
+    def publish(self, item):
+        with self._changed:
+            if self.done:
+                return
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def finish(self, value=None, error=None):
+        with self._changed:
+            self.done = True
+            self.value = value
+            self.error = error
+            self._changed.notify_all()
+
+    def __iter__(self):
+        """Yield every item published so far, then each new one as it arrives, until the call finishes"""
+        index = 0
+        while True:
+            with self._changed:
+                while index >= len(self.items) and not self.done:
+                    self._changed.wait()
+                if index >= len(self.items):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                item = self.items[index]
+            index += 1
+            yield item
+
+    def result(self):
+        """Wait for the call to finish and return its value"""
+        with self._changed:
+            while not self.done:
+                self._changed.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class StreamingSingleFlight:
+    """SingleFlight for calls that publish partial results as they run
+
+    fn(publish) runs in a background thread, so a caller can stop reading once it
+    has what it needs without cancelling the call, and concurrent callers for the
+    same key share one ResultStream.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.collapsed = 0
+
+    def stream(self, key, fn):
+        """Start fn(publish) for key in the background, or join the call already in flight"""
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is not None:
+                self.collapsed += 1
+                return stream
+            stream = ResultStream()
+            self._streams[key] = stream
+            self.executions += 1
+
+        def run():
+            try:
+                stream.finish(value=fn(stream.publish))
+            except Exception as e:
+                stream.finish(error=e)
+            finally:
+                with self._lock:
+                    self._streams.pop(key, None)
+
+        threading.Thread(target=run, name='single-flight-stream', daemon=True).start()
+        return stream
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._streams)
+        return {
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": in_flight
+        }
+
+
+class AsyncResultStream:
+    """ResultStream for coroutines running on one event loop"""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.value = None
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event and give later waiters a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        if self.done:
+            return
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, value=None, error=None):
+        self.done = True
+        self.value = value
+        self.error = error
+        self._notify()
+
+    async def __aiter__(self):
+        index = 0
+        while True:
+            if index < len(self.items):
+                yield self.items[index]
+                index += 1
+                continue
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+    async def result(self):
+        while not self.done:
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class AsyncStreamingSingleFlight:
+    """StreamingSingleFlight for coroutine functions; the call runs as a background task"""
+
+    def __init__(self):
+        self._streams = {}
+        self._tasks = set()
+        self.executions = 0
+        self.collapsed = 0
+
+    def stream(self, key, fn):
+        """Start fn(publish) for key as a task, or join the call already in flight"""
+        stream = self._streams.get(key)
+        if stream is not None:
+            self.collapsed += 1
+            return stream
+        stream = AsyncResultStream()
+        self._streams[key] = stream
+        self.executions += 1
+
+        async def run():
+            try:
+                stream.finish(value=await fn(stream.publish))
+            except Exception as e:
+                stream.finish(error=e)
+            finally:
+                self._streams.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        # Keep a reference so the task is not garbage collected before it finishes
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return stream
+
+    def stats(self):
+        return {
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._streams)
+        }
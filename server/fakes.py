@@ -0,0 +1,298 @@
+"""
+Local stand-ins for googlemaps.Client and openai.OpenAI.
+
+Used by the benchmark harness to exercise the API without network access.
+Latency, jitter and error rate are configurable per client. The async pipeline
+in asgi.py uses FakeMapsClient.transport() with httpx and
+FakeOpenAIClient(asynchronous=True).
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import googlemaps
+import httpx
+import openai
+
+
+class _Upstream:
+    """Shared latency and error injection for the fake clients"""
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        """Pick the latency and outcome of one call: (seconds, fails)"""
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            fail = self._random.random() < self.error_rate
+            self.calls += 1
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def _delay(self):
+        """Sleep for the configured latency and return whether this call fails"""
+        delay, fail = self._draw()
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    async def _async_delay(self):
+        delay, fail = self._draw()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return fail
+
+
+class FakeMapsClient(_Upstream):
+    """googlemaps.Client look-alike serving synthetic restaurants"""
+
+    CUISINES = ['american', 'mexican', 'italian', 'japanese', 'indian', 'mediterranean', 'thai', 'vegetarian']
+    # Like the real API, results come in pages of 20 with a next_page_token for the rest
+    PAGE_SIZE = 20
+
+    def __init__(self, places_per_search=20, **kwargs):
+        super().__init__(**kwargs)
+        self.places_per_search = places_per_search
+
+    def geocode(self, address):
+        if self._delay():
+            raise googlemaps.exceptions.Timeout()
+        return self._geocode_results(address)
+
+    def places_nearby(self, location=None, radius=None, type=None, open_now=False, page_token=None, **kwargs):
+        if self._delay():
+            raise googlemaps.exceptions.Timeout()
+        if page_token:
+            return self._nearby_response(*self._parse_page_token(page_token))
+        prefix = f"{location['lat']:.3f},{location['lng']:.3f}" if location else 'page'
+        return self._nearby_response(prefix)
+
+    def place(self, place_id, fields=None, **kwargs):
+        if self._delay():
+            raise googlemaps.exceptions.Timeout()
+        return self._place_response(place_id, fields)
+
+    def transport(self):
+        """httpx.MockTransport serving the Geocoding, Nearby Search and Place Details web services"""
+        async def handle(request):
+            if await self._async_delay():
+                raise httpx.ReadTimeout("Fake Google Maps timeout", request=request)
+            params = request.url.params
+            if request.url.path.endswith('/geocode/json'):
+                return httpx.Response(200, json={"status": "OK", "results": self._geocode_results(params.get('address'))})
+            if request.url.path.endswith('/nearbysearch/json'):
+                if params.get('pagetoken'):
+                    return httpx.Response(200, json=self._nearby_response(*self._parse_page_token(params['pagetoken'])))
+                lat, lng = (float(value) for value in params.get('location', '0,0').split(','))
+                return httpx.Response(200, json=self._nearby_response(f"{lat:.3f},{lng:.3f}"))
+            if request.url.path.endswith('/details/json'):
+                return httpx.Response(200, json=self._place_response(params.get('place_id'), params.get('fields', '').split(',')))
+            return httpx.Response(404, json={"status": "NOT_FOUND"})
+
+        return httpx.MockTransport(handle)
+
+    def _geocode_results(self, address):
+        digits = int(re.sub(r'\D', '', str(address)) or 0)
+        # Real geocodes carry seven decimals, finer than the catalog's area centres
+        lat = round(25 + (digits % 2000) / 100 + (digits % 997) * 1.3e-7, 7)
+        lng = round(-120 + (digits % 5000) / 100 - (digits % 991) * 1.7e-7, 7)
+        return [{"geometry": {"location": {"lat": lat, "lng": lng}}}]
+
+    def _nearby_response(self, prefix, page=0):
+        start = page * self.PAGE_SIZE
+        end = min(start + self.PAGE_SIZE, self.places_per_search)
+        response = {
+            "status": "OK",
+            "results": [
+                {"place_id": f"{prefix}:{i}", "geometry": {"location": self._place_location(f"{prefix}:{i}")}}
+                for i in range(start, end)
+            ]
+        }
+        if end < self.places_per_search:
+            response["next_page_token"] = f"{prefix}|{page + 1}"
+        return response
+
+    def _parse_page_token(self, page_token):
+        prefix, _, page = str(page_token).rpartition('|')
+        return prefix, int(page or 0)
+
+    def _place_location(self, place_id):
+        """Places sit on a grid about 500 m apart around the search location encoded in the place_id"""
+        prefix, _, index = str(place_id).rpartition(':')
+        try:
+            lat, lng = (float(value) for value in prefix.split(','))
+        except ValueError:
+            lat, lng = 0.0, 0.0
+        index = int(index or 0)
+        return {"lat": lat + (index % 5) * 0.005, "lng": lng + (index // 5) * 0.005}
+
+    def _place_response(self, place_id, fields=None):
+        index = int(str(place_id).rsplit(':', 1)[-1] or 0)
+        cuisine = self.CUISINES[index % len(self.CUISINES)]
+        result = {
+            "place_id": place_id,
+            "name": f"{cuisine.title()} Kitchen {index}",
+            "formatted_address": f"{100 + index} Main St, Anytown, CA 90210",
+            "rating": round(3.5 + (index % 15) / 10, 1),
+            "price_level": 1 + index % 4,
+            "opening_hours": {"open_now": True, "periods": [{"open": {"day": 0, "time": "0000"}}]},
+            "business_status": "OPERATIONAL",
+            "user_ratings_total": 50 + index * 7
+        }
+        # Like the real API, only the fields in the mask are returned
+        if fields and 'type' in fields:
+            # Place types are generic; the cuisine only shows in the name
+            result["types"] = ["restaurant", "food", "point_of_interest", "establishment"]
+        if fields and 'geometry' in fields:
+            result["geometry"] = {"location": self._place_location(place_id)}
+        if fields and 'utc_offset' in fields:
+            result["utc_offset"] = 0
+        return {"status": "OK", "result": result}
+
+
+class FakeOpenAIClient(_Upstream):
+    """openai.OpenAI look-alike whose completions return recommendations near the prompt's targets"""
+
+    TARGET_PATTERNS = {
+        "calories": r'Total calories: (\d+(?:\.\d+)?)',
+        "protein": r'Protein: (\d+(?:\.\d+)?) grams',
+        "carbs": r'Carbs: (\d+(?:\.\d+)?) grams',
+        "fats": r'Fats: (\d+(?:\.\d+)?) grams',
+        "min_price": r'Price range: \$(\d+(?:\.\d+)?)',
+        "max_price": r'Price range: \$\d+(?:\.\d+)? - \$(\d+(?:\.\d+)?)'
+    }
+
+    def __init__(self, recommendations=4, chunk_size=40, asynchronous=False, **kwargs):
+        super().__init__(**kwargs)
+        self.recommendations = recommendations
+        self.chunk_size = chunk_size
+        # asynchronous=True mimics openai.AsyncOpenAI: create is a coroutine and streams are async iterators
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._async_create if asynchronous else self._create))
+        self.models = SimpleNamespace(list=lambda: [])
+
+    def _targets(self, prompt):
+        targets = {"calories": 800, "protein": 40, "carbs": 80, "fats": 25, "min_price": 10, "max_price": 25}
+        for name, pattern in self.TARGET_PATTERNS.items():
+            match = re.search(pattern, prompt)
+            if match:
+                targets[name] = float(match.group(1))
+        return targets
+
+    def _response_text(self, prompt):
+        targets = self._targets(prompt)
+        names = re.findall(r'"name":"([^"]+)"', prompt) or ["Fake Restaurant"]
+        # hash() of a str changes between processes, so seed from a stable digest
+        rng = random.Random(int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:8], 'big'))
+        recommendations = []
+        for i in range(self.recommendations):
+            recommendations.append({
+                "restaurant_name": names[i % len(names)],
+                "address": f"{100 + i} Main St",
+                "dish_name": f"Grilled Bowl #{i + 1} + Side Salad",
+                "calories": round(targets["calories"] * rng.uniform(0.8, 1.2)),
+                "macronutrients": {
+                    "protein": round(targets["protein"] * rng.uniform(0.5, 1.5)),
+                    "carbs": round(targets["carbs"] * rng.uniform(0.5, 1.5)),
+                    "fats": round(targets["fats"] * rng.uniform(0.5, 1.5))
+                },
+                "reason": "Balanced portion sized to the calorie and macro targets",
+                "price_range": round(rng.uniform(targets["min_price"], targets["max_price"] * 1.1), 2)
+            })
+        return json.dumps({"recommendations": recommendations}, indent=2)
+
+    def _error(self):
+        return openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+
+    def _create(self, messages=None, stream=False, **kwargs):
+        prompt = messages[-1]["content"] if messages else ''
+        text = self._response_text(prompt)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4)
+
+        if not stream:
+            if self._delay():
+                raise self._error()
+            message = SimpleNamespace(content=text, role='assistant')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')], usage=usage)
+
+        # One draw per completion, like the non-streaming call; its latency is spread over the chunks
+        delay, fail = self._draw()
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        pause = max(delay, 0) / max(1, len(chunks))
+
+        def events():
+            for index, chunk in enumerate(chunks):
+                time.sleep(pause)
+                if fail and index == 0:
+                    raise self._error()
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+
+        return events()
+
+    async def _async_create(self, messages=None, stream=False, **kwargs):
+        prompt = messages[-1]["content"] if messages else ''
+        text = self._response_text(prompt)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4)
+
+        if not stream:
+            if await self._async_delay():
+                raise self._error()
+            message = SimpleNamespace(content=text, role='assistant')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')], usage=usage)
+
+        delay, fail = self._draw()
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        pause = max(delay, 0) / max(1, len(chunks))
+
+        async def events():
+            for index, chunk in enumerate(chunks):
+                await asyncio.sleep(pause)
+                if fail and index == 0:
+                    raise self._error()
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+
+        return events()
+
+    async def close(self):
+        pass
+
+
+def install_fakes(nutrigo, places=20, maps_latency=0.05, openai_latency=1.0, jitter=0.2,
+                  maps_error_rate=0.0, openai_error_rate=0.0, seed=None):
+    """Point an imported app module at fake upstream clients; returns (maps, llm)
+
+    jitter is a fraction of each client's latency.
+    """
+    maps = FakeMapsClient(
+        places_per_search=places,
+        latency=maps_latency,
+        jitter=maps_latency * jitter,
+        error_rate=maps_error_rate,
+        seed=seed
+    )
+    llm = FakeOpenAIClient(
+        latency=openai_latency,
+        jitter=openai_latency * jitter,
+        error_rate=openai_error_rate,
+        seed=seed
+    )
+    nutrigo.gmaps = maps
+    nutrigo.client = llm
+    nutrigo.maps_api_available = True
+    nutrigo.clients_initialized = True
+    return maps, llm
@@ -0,0 +1,59 @@
+"""
+Gunicorn configuration for production serving.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers use gevent by default, so a request waiting on Google Maps or OpenAI
+parks a greenlet instead of an OS thread and each worker can keep
+GUNICORN_WORKER_CONNECTIONS requests in flight. Set GUNICORN_WORKER_CLASS=gthread
+to fall back to plain threads.
+"""
+
+import multiprocessing
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+
+if worker_class == "gevent":
+    # Patch before the app (and with it requests, googlemaps, httpx/openai and ssl)
+    # is imported, so their sockets, locks and thread pools are cooperative.
+    # Gunicorn loads this file before importing the app.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+    # Pool threads become greenlets, so the shared upstream pools can be much larger
+    # than with OS threads; otherwise they cap the requests in flight per worker
+    os.environ.setdefault("PLACE_DETAILS_MAX_WORKERS", "256")
+    os.environ.setdefault("OPENAI_HEDGE_MAX_WORKERS", "256")
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', 5001)}")
+
+# The work is I/O-bound, so one worker per core is enough with gevent
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Concurrent requests per gevent worker; threads per worker for gthread
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Must outlast REQUEST_DEADLINE so requests time out in the app, not by the worker being killed
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+
+
+def post_worker_init(worker):
+    """With NUTRIGO_FAKE_UPSTREAMS=true, serve from the fake clients in fakes.py (benchmarking only)"""
+    if os.environ.get("NUTRIGO_FAKE_UPSTREAMS", "false").lower() != "true":
+        return
+    import app
+    from fakes import install_fakes
+
+    install_fakes(
+        app,
+        maps_latency=float(os.environ.get("FAKE_MAPS_LATENCY", 0.05)),
+        openai_latency=float(os.environ.get("FAKE_OPENAI_LATENCY", 1.0))
+    )
+    worker.log.warning("Serving with fake Google Maps and OpenAI clients")
@@ -0,0 +1,207 @@
+"""
+Background request logging for the NutriGo backend.
+
+Log entries are serialized and queued on the request thread and written in
+batches by a writer thread to one append-only JSONL file per day and process.
+"""
+
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+def format_json(data):
+    """Parse data that is a JSON string; text that is not JSON becomes {"raw_text": ...}"""
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError:
+            return {"raw_text": data}
+    return data
+
+
+class LogWriter:
+    """Queue plus writer thread that batches log entries into daily JSONL files
+
+    Each process writes its own files, so gunicorn workers never rotate a file
+    another worker is appending to.
+    """
+
+    def __init__(self, log_dir='logs', max_queue=10000, batch_size=100, flush_interval=0.5,
+                 max_bytes=50 * 1024 * 1024, retention_days=7, prefix='nutrigo'):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.prefix = prefix
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0
+
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        atexit.register(self.close)
+
+    def write(self, entry):
+        """Queue an entry for writing; never blocks, drops the entry if the queue is full
+
+        The entry is serialized here, so later changes to it by the caller are not logged.
+        """
+        try:
+            line = json.dumps({**entry, "data": format_json(entry.get("data"))}, default=str)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error serializing log entry: {str(e)}")
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so each worker process starts its own writer
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, lines):
+        try:
+            path = self._current_path()
+            with open(path, 'a') as f:
+                f.write("\n".join(lines) + "\n")
+            self.written += len(lines)
+            self._cleanup()
+        except Exception as e:
+            self.errors += 1
+            print(f"Error writing log batch: {str(e)}")
+
+    def _current_path(self):
+        """Return this process's log file for today, rotating it once it exceeds max_bytes"""
+        path = os.path.join(self.log_dir, f"{self.prefix}-{datetime.now().strftime('%Y%m%d')}-{os.getpid()}.jsonl")
+        if self.max_bytes and os.path.exists(path) and os.path.getsize(path) >= self.max_bytes:
+            base = path[:-len('.jsonl')]
+            index = 1
+            while os.path.exists(f"{base}.{index}.jsonl"):
+                index += 1
+            os.rename(path, f"{base}.{index}.jsonl")
+        return path
+
+    def _cleanup(self):
+        """Delete log files older than retention_days, at most once an hour"""
+        if not self.retention_days or time.time() - self._last_cleanup < 3600:
+            return
+        self._last_cleanup = time.time()
+        cutoff = time.time() - self.retention_days * 24 * 3600
+        for path in glob.glob(os.path.join(self.log_dir, f"{self.prefix}-*.jsonl")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def flush(self, timeout=5):
+        """Wait until queued entries are written, up to timeout seconds"""
+        if self._thread is None or self._thread_pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
+
+
+def read_entries(path):
+    """Yield the log entries stored in a JSONL log file"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def render_summary(entries):
+    """Render log entries as the human-readable per-request summary text"""
+    lines = []
+    for entry in entries:
+        prefix = entry.get("type")
+        data = entry.get("data") or {}
+        lines.append('=' * 50)
+        lines.append(f"Log Entry: {prefix}")
+        lines.append(f"Trace ID: {entry.get('trace_id')}")
+        lines.append(f"Time: {entry.get('timestamp')}")
+        lines.append('=' * 50)
+
+        if prefix == 'request' and isinstance(data, dict):
+            prefs = data.get('preferences', {})
+            price_range = prefs.get('price_range', [0, 0])
+            lines.append("User Preferences:")
+            lines.append(f"- Calories: {prefs.get('calorie_count')} kcal")
+            lines.append(f"- Protein: {prefs.get('macronutrients', {}).get('protein_grams')}g")
+            lines.append(f"- Price Range: ${price_range[0]} - ${price_range[1]}")
+
+        elif prefix == 'restaurants' and isinstance(data, list):
+            lines.append(f"Found {len(data)} restaurants")
+            for restaurant in data[:5]:  # Show first 5
+                lines.append(f"- {restaurant.get('name', 'Unknown')}")
+            if len(data) > 5:
+                lines.append(f"  ... and {len(data) - 5} more")
+
+        elif prefix == 'final_recommendations' and isinstance(data, dict):
+            recs = data.get('recommendations', [])
+            lines.append(f"Generated {len(recs)} recommendations")
+            for idx, rec in enumerate(recs, 1):
+                lines.append("")
+                lines.append(f"{idx}. {rec.get('restaurant_name')}")
+                lines.append(f"   Dish: {rec.get('dish_name')}")
+                lines.append(f"   Calories: {rec.get('calories')} kcal")
+                lines.append(f"   Price: ${rec.get('price_range')}")
+
+        elif prefix == 'error' and isinstance(data, dict):
+            lines.append(f"Error: {data.get('error')}")
+
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+"""
+File-backed menu nutrition store.
+
+Menu items live in a SQLite file keyed by restaurant (place_id, or name for
+sample data) with nutrition and price columns, indexed for per-restaurant and
+macro-range lookups.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+
+COLUMNS = ('name', 'calories', 'protein', 'carbs', 'fats', 'price')
+
+
+class MenuStore:
+    """SQLite-backed menu items with indexed lookups by restaurant and macro ranges"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection()
+
+    def _connection(self):
+        # Reopen after fork so each gunicorn worker has its own handle on the shared file
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS menu_items ("
+                "id INTEGER PRIMARY KEY, restaurant_key TEXT NOT NULL, name TEXT NOT NULL, "
+                "calories REAL NOT NULL, protein REAL NOT NULL, carbs REAL NOT NULL, fats REAL NOT NULL, price REAL NOT NULL, "
+                "UNIQUE (restaurant_key, name));"
+                "CREATE INDEX IF NOT EXISTS idx_menu_restaurant_calories ON menu_items (restaurant_key, calories);"
+                "CREATE INDEX IF NOT EXISTS idx_menu_calories ON menu_items (calories);"
+                "CREATE INDEX IF NOT EXISTS idx_menu_protein ON menu_items (protein);"
+                "CREATE INDEX IF NOT EXISTS idx_menu_price ON menu_items (price);"
+            )
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._connection().execute(sql, params).fetchall()]
+
+    def import_items(self, rows, replace_restaurants=True):
+        """Bulk insert (restaurant_key, item dict) pairs; returns the number of items stored
+
+        With replace_restaurants, existing items for each imported restaurant are removed first.
+        """
+        records = []
+        for key, item in rows:
+            try:
+                records.append((str(key), str(item['name']).strip(), *(float(item[c]) for c in COLUMNS[1:])))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if replace_restaurants:
+                    conn.executemany("DELETE FROM menu_items WHERE restaurant_key = ?", {(r[0],) for r in records})
+                conn.executemany(
+                    "INSERT OR REPLACE INTO menu_items (restaurant_key, name, calories, protein, carbs, fats, price) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", records
+                )
+        return len(records)
+
+    def import_file(self, path):
+        """Import a JSON file ({restaurant_key: [items]}) or a CSV with a restaurant_key column"""
+        if path.lower().endswith('.csv'):
+            with open(path, newline='') as f:
+                rows = [(record.get('restaurant_key') or record.get('place_id'), record) for record in csv.DictReader(f)]
+            return self.import_items([row for row in rows if row[0]])
+
+        with open(path) as f:
+            menus = json.load(f)
+        return self.import_items((key, item) for key, items in menus.items() for item in items)
+
+    def get_menus(self, keys):
+        """Return {restaurant_key: [items]} for the given keys in one indexed query"""
+        keys = [key for key in keys if key]
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        menus = {}
+        for row in self._query(
+            f"SELECT restaurant_key, name, calories, protein, carbs, fats, price FROM menu_items "
+            f"WHERE restaurant_key IN ({placeholders}) ORDER BY restaurant_key, calories", keys
+        ):
+            menus.setdefault(row.pop('restaurant_key'), []).append(row)
+        return menus
+
+    def get_menu(self, key):
+        return self.get_menus([key]).get(key, [])
+
+    def closest_items(self, key, calories, limit=8):
+        """Return up to limit items at a restaurant whose calories are closest to the given value"""
+        return self._query(
+            "SELECT name, calories, protein, carbs, fats, price FROM menu_items WHERE restaurant_key = ? "
+            "ORDER BY ABS(calories - ?) LIMIT ?", (key, float(calories), limit)
+        )
+
+    def find_items(self, key=None, calories=None, protein=None, carbs=None, fats=None, max_price=None, limit=100):
+        """Return items within the given (low, high) ranges, optionally at one restaurant"""
+        clauses, params = [], []
+        if key is not None:
+            clauses.append("restaurant_key = ?")
+            params.append(key)
+        for column, bounds in (('calories', calories), ('protein', protein), ('carbs', carbs), ('fats', fats)):
+            if bounds is not None:
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                params.extend(bounds)
+        if max_price is not None:
+            clauses.append("price <= ?")
+            params.append(max_price)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self._query(
+            f"SELECT restaurant_key, name, calories, protein, carbs, fats, price FROM menu_items {where} LIMIT ?",
+            (*params, limit)
+        )
+
+    def stats(self):
+        rows = self._query("SELECT COUNT(*) AS items, COUNT(DISTINCT restaurant_key) AS restaurants FROM menu_items")
+        return rows[0]
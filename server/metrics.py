@@ -0,0 +1,165 @@
+"""
+In-process metrics for the NutriGo backend, rendered in Prometheus text format.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Summary:
+    """Count, sum and quantiles over a sliding window of recent observations"""
+
+    def __init__(self, window=1024):
+        self.count = 0
+        self.total = 0.0
+        self._samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self._samples.append(value)
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """Return {q: value} over the recent window, using nearest-rank"""
+        samples = sorted(self._samples)
+        if not samples:
+            return {q: 0.0 for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+
+class MetricsRegistry:
+    """Thread-safe registry of labelled counters, gauges and summaries"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, namespace='nutrigo', window=1024):
+        self.namespace = namespace
+        self.window = window
+        self._counters = {}
+        self._summaries = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Drop all recorded values, keeping HELP texts"""
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    def _name(self, name):
+        return f"{self.namespace}_{name}"
+
+    def describe(self, name, help_text):
+        """Set the HELP text shown for a metric"""
+        self._help[self._name(name)] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        """Increment a counter"""
+        key = (self._name(name), tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record an observation (usually seconds) in a summary"""
+        key = (self._name(name), tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = Summary(self.window)
+            summary.observe(value)
+
+    def quantile(self, name, q, min_count=1, **labels):
+        """Return the q quantile of a summary, or None with fewer than min_count observations"""
+        key = (self._name(name), tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None or summary.count < min_count:
+                return None
+            return summary.quantiles((q,))[q]
+
+    @contextmanager
+    def timer(self, stage):
+        """Time a block and record it under stage_duration_seconds{stage=...}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - start, stage=stage)
+
+    def stage_summary(self):
+        """Return {stage: {count, p50, p95, p99}} in milliseconds for stage timers"""
+        name = self._name('stage_duration_seconds')
+        report = {}
+        with self._lock:
+            for (metric, labels), summary in self._summaries.items():
+                if metric != name:
+                    continue
+                stage = dict(labels).get('stage')
+                quantiles = summary.quantiles(self.QUANTILES)
+                report[stage] = {
+                    "count": summary.count,
+                    "p50_ms": round(quantiles[0.5] * 1000, 2),
+                    "p95_ms": round(quantiles[0.95] * 1000, 2),
+                    "p99_ms": round(quantiles[0.99] * 1000, 2)
+                }
+        return report
+
+    def render(self, gauges=None):
+        """Render all metrics in Prometheus text exposition format
+
+        gauges is an optional list of (name, labels dict, value) sampled at scrape time.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items(), key=lambda item: item[0])
+            snapshots = [(key, summary.count, summary.total, summary.quantiles(self.QUANTILES)) for key, summary in summaries]
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), count, total, quantiles in snapshots:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} summary")
+            for q, value in quantiles.items():
+                lines.append(f"{name}{_format_labels(labels + (('quantile', q),))} {_format_value(float(value))}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(total))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for name, labels, value in sorted(gauges or [], key=lambda g: (g[0], sorted(g[1].items()))):
+            name = self._name(name)
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,238 @@
+"""
+Deterministic meal optimizer.
+
+Searches combinations of menu items at each restaurant for the ones closest
+to the user's calorie, macro and price targets, so recommendations can be
+built from real menu data without waiting on the LLM.
+"""
+
+import heapq
+
+import numpy as np
+
+# Relative weight of each target when scoring a combination
+TARGET_WEIGHTS = {"calories": 0.4, "protein": 0.25, "carbs": 0.175, "fats": 0.175}
+
+# Calories must land within this band of the target, matching validate_recommendations
+CALORIE_TOLERANCE = 0.15
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_targets(preferences):
+    """Extract numeric targets and the price range from user preferences"""
+    macros = preferences.get('macronutrients', {}) or {}
+    price_range = preferences.get('price_range', [10, 25])
+    return {
+        "calories": _number(preferences.get('calorie_count')),
+        "protein": _number(macros.get('protein_grams')),
+        "carbs": _number(macros.get('carbs_grams')),
+        "fats": _number(macros.get('fats_grams')),
+        "min_price": float(price_range[0]),
+        "max_price": float(price_range[1])
+    }
+
+
+def score_totals(totals, targets):
+    """Weighted relative distance of a meal's totals to the targets (0 is a perfect match)"""
+    score = 0.0
+    for name, weight in TARGET_WEIGHTS.items():
+        target = targets.get(name)
+        if target:
+            score += weight * abs(totals[name] - target) / target
+    return score
+
+
+def _suffix_top_sums(values, max_items):
+    """top[r][i]: per field, the sum of the r largest values among rows i: of values, for r up to max_items"""
+    count, fields = values.shape
+    top = np.zeros((max_items + 1, count + 1, fields))
+    largest = np.zeros((max_items, fields))
+    for i in range(count - 1, -1, -1):
+        # Largest first; the zero padding never outranks a real (non-negative) value
+        largest = -np.sort(-np.vstack([largest, values[i]]), axis=0)[:max_items]
+        top[1:, i] = np.cumsum(largest, axis=0)
+    return top
+
+
+def find_meal_combinations(items, preferences, max_items=3, limit=3):
+    """Return up to limit item combinations that best meet the targets
+
+    items are dicts with name, calories, protein, carbs, fats and price. Every
+    returned combination is within the calorie band and the price range.
+
+    Combinations are a prefix of items found by depth-first search plus a tail
+    of one or two items scored with NumPy over every candidate at once. A
+    prefix is dropped (branch and bound) once even the best totals its
+    remaining items could reach score no better than the limit-th best so far.
+    Ties go to the combination whose items come first on the menu.
+    """
+    targets = get_targets(preferences)
+    calorie_target = targets["calories"]
+    calorie_low = calorie_target * (1 - CALORIE_TOLERANCE) if calorie_target else 0.0
+    calorie_high = calorie_target * (1 + CALORIE_TOLERANCE) if calorie_target else float('inf')
+    min_price, max_price = targets["min_price"], targets["max_price"]
+
+    menu = []
+    for item in items:
+        values = [_number(item.get(key)) for key in ('calories', 'protein', 'carbs', 'fats', 'price')]
+        if any(value is None or value < 0 for value in values):
+            continue
+        menu.append((values, item))
+    if not menu or max_items < 1 or limit < 1:
+        return []
+    # Ascending calories lets the search stop as soon as an item overshoots the band
+    menu.sort(key=lambda entry: entry[0][0])
+    values = np.array([entry[0] for entry in menu])
+    count = len(menu)
+    # (field index, weight, target) for each target that is set, as in score_totals
+    weighted = [(k, TARGET_WEIGHTS[name], targets[name])
+                for k, name in enumerate(('calories', 'protein', 'carbs', 'fats')) if targets.get(name)]
+
+    # Tails: single items, and pairs j < k ordered by j so the pairs after a prefix are a suffix
+    singles = (np.arange(count)[:, None], values)
+    first, second = np.triu_indices(count, 1) if max_items >= 2 else (np.array([], dtype=int),) * 2
+    pair_values = values[first] + values[second]
+    within = (pair_values[:, 0] <= calorie_high) & (pair_values[:, 4] <= max_price)
+    pairs = (np.stack([first[within], second[within]], axis=1), pair_values[within])
+    pair_starts = np.searchsorted(pairs[0][:, 0], np.arange(count + 1))
+    top = _suffix_top_sums(values, max_items) if max_items > 2 else None
+
+    best = []  # min-heap of (-score, negated item indices), so the root is the worst kept
+
+    def worst():
+        return -best[0][0] if len(best) == limit else float('inf')
+
+    def score_rows(totals):
+        score = np.zeros(len(totals))
+        for k, weight, target in weighted:
+            score += weight * np.abs(totals[:, k] - target) / target
+        return score
+
+    def consider_tail(chosen, totals, tail, offset):
+        indices, tail_values = tail[0][offset:], tail[1][offset:]
+        if not len(indices):
+            return
+        combined = totals + tail_values
+        valid = ((combined[:, 0] >= calorie_low) & (combined[:, 0] <= calorie_high)
+                 & (combined[:, 4] >= min_price) & (combined[:, 4] <= max_price))
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return
+        scores = score_rows(combined[rows])
+        keep = scores <= worst()
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > limit:
+            # Keep every row tied with the limit-th best so ties are broken by menu order
+            cutoff = np.partition(scores, limit - 1)[limit - 1]
+            keep = scores <= cutoff
+            rows, scores = rows[keep], scores[keep]
+        for row, score in zip(rows, scores):
+            combination = chosen + [int(i) for i in indices[row]]
+            entry = (-float(score), tuple(-i for i in combination), combination, combined[row].tolist())
+            if len(best) < limit:
+                heapq.heappush(best, entry)
+            elif entry[:2] > best[0][:2]:
+                heapq.heapreplace(best, entry)
+
+    def lower_bound(start, slots, totals):
+        """Lowest score any combination extending totals with up to slots items from menu[start:] can have"""
+        reach = top[slots][start]
+        bound = 0.0
+        for k, weight, target in weighted:
+            low, high = totals[k], totals[k] + reach[k]
+            if k == 0:
+                low, high = max(low, calorie_low), min(high, calorie_high)
+            if target < low:
+                bound += weight * (low - target) / target
+            elif target > high:
+                bound += weight * (target - high) / target
+        return bound
+
+    def search(start, chosen, totals):
+        """Score the tails after this prefix, then extend it while two or more slots remain after"""
+        slots = max_items - len(chosen)
+        if start >= count:
+            return
+        if top is not None and (totals[0] + top[slots][start][0] < calorie_low or lower_bound(start, slots, totals) > worst()):
+            return
+        if slots >= 2:
+            consider_tail(chosen, totals, pairs, pair_starts[start])
+        if slots < 3:
+            return
+        for i in range(start, count):
+            item_values = values[i]
+            if totals[0] + item_values[0] > calorie_high:
+                break
+            if totals[4] + item_values[4] > max_price:
+                continue
+            search(i + 1, chosen + [i], totals + item_values)
+
+    consider_tail([], np.zeros(5), singles, 0)
+    search(0, [], np.zeros(5))
+
+    combinations = []
+    for negative_score, _, chosen, totals in sorted(best, reverse=True):
+        combinations.append({
+            "items": [menu[i][1] for i in chosen],
+            "calories": round(totals[0]),
+            "protein": round(totals[1]),
+            "carbs": round(totals[2]),
+            "fats": round(totals[3]),
+            "price": round(totals[4], 2),
+            "score": round(-negative_score, 4)
+        })
+    return combinations
+
+
+def describe_combination(combination, preferences):
+    """Plain-language reason for a combination, used when no LLM prose is requested"""
+    targets = get_targets(preferences)
+    parts = [f"{combination['calories']} kcal (target {targets['calories']:g})" if targets["calories"] else f"{combination['calories']} kcal"]
+    for name in ('protein', 'carbs', 'fats'):
+        if targets[name]:
+            parts.append(f"{combination[name]}g {name} (target {targets[name]:g}g)")
+    return f"Closest menu combination to your targets: {', '.join(parts)}, for about ${combination['price']:.2f}."
+
+
+def build_recommendations(restaurants, menus, preferences, per_restaurant=1, limit=5, max_items=3):
+    """Build API-shaped recommendations from restaurant menus, best matches first
+
+    menus maps a restaurant key (see restaurant_key) to its list of menu items.
+    """
+    candidates = []
+    for restaurant in restaurants:
+        items = menus.get(restaurant_key(restaurant))
+        if not items:
+            continue
+        for combination in find_meal_combinations(items, preferences, max_items=max_items, limit=per_restaurant):
+            candidates.append((combination["score"], restaurant, combination))
+
+    candidates.sort(key=lambda candidate: candidate[0])
+    recommendations = []
+    for _, restaurant, combination in candidates[:limit]:
+        recommendations.append({
+            "restaurant_name": restaurant.get("name", "Unknown"),
+            "address": restaurant.get("formatted_address", "Address not available"),
+            "dish_name": " + ".join(item.get("name", "Item") for item in combination["items"]),
+            "calories": combination["calories"],
+            "macronutrients": {
+                "protein": combination["protein"],
+                "carbs": combination["carbs"],
+                "fats": combination["fats"]
+            },
+            "reason": describe_combination(combination, preferences),
+            "price_range": combination["price"],
+            "source": "optimizer"
+        })
+    return recommendations
+
+
+def restaurant_key(restaurant):
+    """Key used to look up a restaurant's menu: its place_id, or its name for sample data"""
+    return restaurant.get("place_id") or restaurant.get("name")
@@ -0,0 +1,106 @@
+"""
+Helpers for parsing recommendation JSON produced by the OpenAI API.
+"""
+
+import json
+
+_decoder = json.JSONDecoder()
+
+
+def parse_recommendations(text, array_key='recommendations'):
+    """Parse a model response into a dict, tolerating surrounding prose, code fences,
+    trailing garbage and truncated output
+
+    Well-formed JSON takes the plain json.loads path. Otherwise the first JSON
+    object in the text is decoded and anything after it ignored; if the text was
+    cut off, every complete object in the array_key array is salvaged. Raises
+    json.JSONDecodeError when nothing can be recovered.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        error = e
+    else:
+        return {array_key: data} if isinstance(data, list) else data
+
+    start = text.find('{')
+    if start != -1:
+        try:
+            data, _ = _decoder.raw_decode(text, start)
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+
+    recommendations = RecommendationStreamParser(array_key).feed(text)
+    if recommendations:
+        return {array_key: recommendations}
+    raise error
+
+
+class RecommendationStreamParser:
+    """Incrementally extracts objects from the "recommendations" array of a streamed response
+
+    Feed text chunks as they arrive; each call returns the recommendation objects
+    whose closing brace was seen in that chunk.
+    """
+
+    def __init__(self, array_key='recommendations'):
+        self.array_key = f'"{array_key}"'
+        self.buffer = ''
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None
+        self.done = False
+        self.errors = 0
+
+    def feed(self, chunk):
+        """Add a chunk of streamed text and return any newly completed objects"""
+        self.buffer += chunk
+        completed = []
+        if self.done:
+            return completed
+
+        if not self._in_array:
+            key_index = self.buffer.find(self.array_key)
+            if key_index == -1:
+                return completed
+            bracket_index = self.buffer.find('[', key_index + len(self.array_key))
+            if bracket_index == -1:
+                return completed
+            self._in_array = True
+            self._pos = bracket_index + 1
+
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    try:
+                        completed.append(json.loads(buffer[self._start:i + 1]))
+                    except json.JSONDecodeError:
+                        self.errors += 1
+                    self._start = None
+            elif char == ']' and self._depth == 0:
+                self.done = True
+                break
+        self._pos = len(buffer)
+
+        return completed
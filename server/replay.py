@@ -0,0 +1,212 @@
+"""
+Replay recorded requests from logs/ through the CPU-side pipeline.
+
+Each recording is fed back through create_rag_prompt, parse_recommendations
+and the same grounding and validation its endpoint ran, with the OpenAI response
+served from the recording: the top RECOMMENDATION_LIMIT for /api/recommendations,
+one recommendation at a time in arrival order for the streaming endpoint. The
+tool reports the CPU cost per request and whether the regenerated prompt and
+recommendations still match what was logged.
+
+Reads both the daily JSONL logs (grouped by trace_id) and the older
+logs/session_*/ directories.
+
+Usage:
+    python replay.py logs/ --iterations 20 --check
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("HEALTH_PROBE_ENABLED", "false")
+os.environ.setdefault("LOG_DIR", os.path.join(tempfile.gettempdir(), "nutrigo-replay-logs"))
+
+import app as nutrigo  # noqa: E402
+from log_writer import read_entries  # noqa: E402
+from parsing import parse_recommendations  # noqa: E402
+
+
+def load_session_dir(path):
+    """Load one legacy logs/session_*/ directory as {type: data}"""
+    recording = {"id": os.path.basename(path.rstrip(os.sep))}
+    for filename in glob.glob(os.path.join(path, '*.json')):
+        try:
+            with open(filename) as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        recording[entry.get("type") or os.path.splitext(os.path.basename(filename))[0]] = entry.get("data")
+    return recording
+
+
+def load_jsonl(path):
+    """Load a JSONL log file as a list of recordings grouped by trace_id"""
+    recordings = {}
+    for entry in read_entries(path):
+        trace_id = entry.get("trace_id") or entry.get("session")
+        recording = recordings.setdefault(trace_id, {"id": trace_id})
+        recording[entry.get("type")] = entry.get("data")
+    return list(recordings.values())
+
+
+def load_recordings(paths):
+    """Collect replayable recordings from log directories, JSONL files and session directories"""
+    recordings = []
+    for path in paths:
+        if os.path.isfile(path):
+            recordings.extend(load_jsonl(path))
+        elif os.path.basename(path.rstrip(os.sep)).startswith('session_'):
+            recordings.append(load_session_dir(path))
+        elif os.path.isdir(path):
+            for jsonl in sorted(glob.glob(os.path.join(path, '*.jsonl'))):
+                recordings.extend(load_jsonl(jsonl))
+            for session in sorted(glob.glob(os.path.join(path, 'session_*'))):
+                recordings.append(load_session_dir(session))
+
+    # Only recordings that reached the model can be replayed end to end
+    return [r for r in recordings
+            if isinstance(r.get("request"), dict) and isinstance(r.get("restaurants"), list)
+            and isinstance(r.get("openai_response"), dict) and "raw_response" in r["openai_response"]]
+
+
+def replay_one(recording):
+    """Run one recording through the pipeline and return timings and outputs"""
+    preferences = recording["request"].get("preferences", {})
+    restaurants = recording["restaurants"]
+    response_text = recording["openai_response"]["raw_response"]
+
+    timings = {}
+    start = time.perf_counter()
+    prompt = nutrigo.create_rag_prompt(nutrigo.build_restaurant_context(restaurants, preferences), preferences)
+    timings["prompt_build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        recommendations_data = parse_recommendations(response_text)
+    except (TypeError, json.JSONDecodeError):
+        recommendations_data = None
+    timings["json_parse"] = time.perf_counter() - start
+
+    recommendations = None
+    if recommendations_data is not None:
+        start = time.perf_counter()
+        if is_stream(recording):
+            seen_restaurants = set()
+            recommendations = []
+            for rec in recommendations_data.get('recommendations', []):
+                recommendations.extend(nutrigo.validate_streamed_recommendation(rec, restaurants, preferences, seen_restaurants))
+        else:
+            grounded = nutrigo.ground_recommendations(recommendations_data, restaurants)
+            recommendations = nutrigo.validate_recommendations(grounded, preferences, recording_limit(recording))
+        timings["validation"] = time.perf_counter() - start
+
+    return prompt, recommendations, timings
+
+
+def is_stream(recording):
+    return recording["openai_response"].get("endpoint") == "stream"
+
+
+def recording_limit(recording):
+    """RECOMMENDATION_LIMIT the recording was served with; recordings made before it was logged use the current one"""
+    response = recording["openai_response"]
+    return response["limit"] if "limit" in response else nutrigo.RECOMMENDATION_LIMIT
+
+
+def _canonical(recommendations):
+    # Compare through a JSON round trip, the same way the recording was stored
+    return [json.dumps(rec, sort_keys=True, default=str) for rec in recommendations]
+
+
+def compare(recording, prompt, recommendations):
+    """Return the list of outputs that differ from the recording"""
+    mismatches = []
+    recorded_prompt = (recording.get("prompt") or {}).get("prompt")
+    if recorded_prompt is not None and recorded_prompt != prompt:
+        mismatches.append("prompt")
+    recorded_final = recording.get("final_recommendations")
+    if isinstance(recorded_final, dict):
+        recorded = _canonical(recorded_final.get("recommendations") or [])
+        replayed = _canonical(recommendations or [])
+        # Streamed recommendations are sent as they validate, so only the set has to match
+        if (sorted(recorded) != sorted(replayed)) if is_stream(recording) else (recorded != replayed):
+            mismatches.append("recommendations")
+    return mismatches
+
+
+def run(args):
+    recordings = load_recordings(args.paths)
+    results = []
+    stage_totals = {}
+
+    # validate_recommendations prints a line per recommendation; keep the report readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for recording in recordings:
+            best = None
+            cpu_start = time.process_time()
+            for _ in range(args.iterations):
+                prompt, recommendations, timings = replay_one(recording)
+                if best is None or sum(timings.values()) < sum(best.values()):
+                    best = timings
+            cpu = (time.process_time() - cpu_start) / args.iterations
+
+            for stage, seconds in best.items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+            results.append({
+                "id": recording["id"],
+                "cpu_ms": round(cpu * 1000, 3),
+                "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in best.items()},
+                "mismatches": compare(recording, prompt, recommendations)
+            })
+
+    return {
+        "recordings": len(results),
+        "iterations": args.iterations,
+        "mean_cpu_ms": round(sum(r["cpu_ms"] for r in results) / len(results), 3) if results else 0.0,
+        "mean_stages_ms": {stage: round(total * 1000 / len(results), 3) for stage, total in stage_totals.items()},
+        "mismatched": [r["id"] for r in results if r["mismatches"]],
+        "results": results
+    }
+
+
+def print_report(report):
+    print(f"Replayed {report['recordings']} recordings x {report['iterations']} iterations")
+    print(f"Mean CPU per request: {report['mean_cpu_ms']} ms")
+    for stage, ms in sorted(report["mean_stages_ms"].items()):
+        print(f"  {stage:<16}{ms:>10} ms")
+    print()
+    for result in report["results"]:
+        status = "MISMATCH " + ",".join(result["mismatches"]) if result["mismatches"] else "ok"
+        print(f"{result['id']:<40}{result['cpu_ms']:>10} ms  {status}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay logged requests through prompt building and validation")
+    parser.add_argument('paths', nargs='*', default=['logs'],
+                        help="Log directories, JSONL log files or session_* directories (default: logs)")
+    parser.add_argument('--iterations', type=int, default=10, help="Times to replay each recording")
+    parser.add_argument('--check', action='store_true', help="Exit with status 1 if any output differs from the recording")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.check and report["mismatched"]:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
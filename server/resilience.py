@@ -0,0 +1,125 @@
+"""
+Deadlines, retries and hedged calls for slow upstream APIs.
+"""
+
+import asyncio
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when there is no time left to start or wait for an upstream call"""
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, limit):
+        """Timeout for one call: limit, shortened to the time remaining"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(limit, remaining)
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff before retry number attempt (0-based)"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_call(fn, retries, base_delay, max_delay, deadline=None, should_retry=None, on_retry=None):
+    """Call fn, retrying up to retries times on errors should_retry accepts
+
+    Backoff sleeps never run past the deadline; when the next attempt could not
+    start in time, the last error is raised.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or (should_retry is not None and not should_retry(e)):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if deadline is not None and deadline.remaining() <= delay:
+                raise
+            if on_retry is not None:
+                on_retry(e, attempt)
+            time.sleep(delay)
+            attempt += 1
+
+
+def hedged_call(fn, hedge_delay, executor, on_hedge=None):
+    """Call fn and, if it has not finished after hedge_delay seconds, call it again
+
+    The first successful result wins; the error is raised only if every call
+    fails. The slower call is not interrupted, it finishes in the background.
+    """
+    futures = [executor.submit(fn)]
+    done, _ = wait(futures, timeout=hedge_delay)
+    if not done:
+        if on_hedge is not None:
+            on_hedge()
+        futures.append(executor.submit(fn))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def async_retry_call(fn, retries, base_delay, max_delay, deadline=None, should_retry=None, on_retry=None):
+    """retry_call for a coroutine function"""
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt >= retries or (should_retry is not None and not should_retry(e)):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if deadline is not None and deadline.remaining() <= delay:
+                raise
+            if on_retry is not None:
+                on_retry(e, attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def async_hedged_call(fn, hedge_delay, on_hedge=None):
+    """hedged_call for a coroutine function; the slower call is cancelled once one succeeds"""
+    tasks = [asyncio.ensure_future(fn())]
+    done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+    if not done:
+        if on_hedge is not None:
+            on_hedge()
+        tasks.append(asyncio.ensure_future(fn()))
+
+    error = None
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,280 @@
+"""
+File-backed restaurant catalog with a spatial index.
+
+Restaurants found by the crawler are stored in a SQLite file with their
+location and opening hours, together with the areas (circles) that were
+searched. Each process keeps the restaurants in an in-memory grid, so
+"restaurants within radius of lat/lng, open now" is answered in microseconds
+without a Places Nearby Search whenever a recently crawled area covers the
+query circle.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+# Grid cells are CELL_DEGREES of latitude by CELL_DEGREES of longitude (~5.5 km north-south)
+CELL_DEGREES = 0.05
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Area centres are rounded to AREA_DECIMALS so nearby requests share one crawl area.
+# A query at the unrounded point can then be up to AREA_SLACK_M from the stored centre
+AREA_DECIMALS = 4
+AREA_SLACK_M = math.hypot(0.5, 0.5) * 10 ** -AREA_DECIMALS * METERS_PER_DEGREE
+
+# Kept in their own columns rather than in the stored details
+LOCATION_FIELDS = ('geometry', 'utc_offset')
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell(lat, lng):
+    return math.floor(lat / CELL_DEGREES), math.floor(lng / CELL_DEGREES)
+
+
+def _area_key(lat, lng, radius):
+    return round(lat, AREA_DECIMALS), round(lng, AREA_DECIMALS), float(radius)
+
+
+def _minute_of_week(point):
+    """Minutes since Sunday 00:00 for a Places {"day", "time": "HHMM"} point"""
+    return int(point['day']) * MINUTES_PER_DAY + int(point['time'][:2]) * 60 + int(point['time'][2:])
+
+
+def is_open_at(opening_hours, utc_offset, when):
+    """Whether a place is open at the UTC datetime when; None if its hours are unknown"""
+    periods = (opening_hours or {}).get('periods')
+    if not periods or utc_offset is None:
+        return None
+    local = when + timedelta(minutes=utc_offset)
+    # Places numbers days from Sunday = 0
+    now = ((local.weekday() + 1) % 7) * MINUTES_PER_DAY + local.hour * 60 + local.minute
+    try:
+        for period in periods:
+            if period.get('close') is None:
+                # A single period without a close time means open around the clock
+                return True
+            start = _minute_of_week(period['open'])
+            end = _minute_of_week(period['close'])
+            if end <= start:
+                end += MINUTES_PER_WEEK
+            if start <= now < end or start <= now + MINUTES_PER_WEEK < end:
+                return True
+    except (KeyError, TypeError, ValueError):
+        return None
+    return False
+
+
+class RestaurantCatalog:
+    """SQLite-backed restaurants and crawl areas with an in-memory grid index for radius queries"""
+
+    def __init__(self, db_path, max_age=7 * 24 * 3600, reload_interval=30, claim_timeout=600):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.reload_interval = reload_interval
+        self.claim_timeout = claim_timeout
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._areas = []
+        self._count = 0
+        self._data_version = None
+        self._checked_at = 0.0
+        self._dirty = True
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._connection()
+
+    def _connection(self):
+        # Reopen after fork so each gunicorn worker has its own handle on the shared file
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS restaurants ("
+                "place_id TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, utc_offset INTEGER, "
+                "details TEXT NOT NULL, crawled_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS idx_restaurants_location ON restaurants (lat, lng);"
+                "CREATE TABLE IF NOT EXISTS crawl_areas ("
+                "id INTEGER PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, radius REAL NOT NULL, "
+                "crawled_at REAL NOT NULL DEFAULT 0, claimed_at REAL, "
+                "UNIQUE (lat, lng, radius));"
+            )
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+            self._dirty = True
+        return self._conn
+
+    def _refresh_index(self):
+        """Rebuild the in-memory index when this or another process has written to the file"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty and now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            conn = self._connection()
+            # data_version changes when another connection commits
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if not self._dirty and version == self._data_version:
+                return
+            rows = conn.execute("SELECT place_id, lat, lng, utc_offset, details FROM restaurants").fetchall()
+            areas = conn.execute("SELECT lat, lng, radius, crawled_at FROM crawl_areas WHERE crawled_at > 0").fetchall()
+            self._data_version = version
+            self._dirty = False
+
+        cells = {}
+        for row in rows:
+            entry = (row['lat'], row['lng'], row['utc_offset'], json.loads(row['details']))
+            cells.setdefault(_cell(row['lat'], row['lng']), []).append(entry)
+        self._cells = cells
+        self._areas = [tuple(area) for area in areas]
+        self._count = len(rows)
+
+    def covers(self, lat, lng, radius):
+        """Whether a crawl area younger than max_age contains the whole circle, give or take AREA_SLACK_M"""
+        self._refresh_index()
+        fresh_after = time.time() - self.max_age
+        return any(
+            crawled_at >= fresh_after and distance_m(lat, lng, area_lat, area_lng) + radius <= area_radius + AREA_SLACK_M
+            for area_lat, area_lng, area_radius, crawled_at in self._areas
+        )
+
+    def nearby(self, lat, lng, radius, open_now=False, limit=20, now=None):
+        """Restaurants within radius meters, closest first; None if no fresh crawl area covers the circle
+
+        open_now is evaluated from each place's opening hours at the time of the
+        query; places with unknown hours are left out when open_now is set.
+        """
+        if not self.covers(lat, lng, radius):
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = now or datetime.now(timezone.utc)
+
+        dlat = radius / METERS_PER_DEGREE
+        dlng = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        low_i, low_j = _cell(lat - dlat, lng - dlng)
+        high_i, high_j = _cell(lat + dlat, lng + dlng)
+        cells = self._cells
+
+        found = []
+        for i in range(low_i, high_i + 1):
+            for j in range(low_j, high_j + 1):
+                for place_lat, place_lng, utc_offset, details in cells.get((i, j), ()):
+                    distance = distance_m(lat, lng, place_lat, place_lng)
+                    if distance > radius:
+                        continue
+                    is_open = is_open_at(details.get('opening_hours'), utc_offset, now)
+                    if open_now and not is_open:
+                        continue
+                    found.append((distance, is_open, details))
+        found.sort(key=lambda item: item[0])
+
+        restaurants = []
+        for _, is_open, details in found[:limit]:
+            restaurant = dict(details)
+            if is_open is not None:
+                restaurant['opening_hours'] = {**restaurant['opening_hours'], 'open_now': is_open}
+            restaurants.append(restaurant)
+        return restaurants
+
+    def request_area(self, lat, lng, radius):
+        """Queue an area for crawling; returns True if it was not known yet"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO crawl_areas (lat, lng, radius) VALUES (?, ?, ?)",
+                    _area_key(lat, lng, radius)
+                )
+        return cursor.rowcount > 0
+
+    def claim_areas(self, refresh_interval, limit=10):
+        """Claim up to limit areas not crawled within refresh_interval seconds, never crawled ones first
+
+        A claim lasts claim_timeout seconds, so workers sharing the file do not crawl
+        the same area and an area whose crawl failed is retried later.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, lat, lng, radius FROM crawl_areas "
+                    "WHERE crawled_at < ? AND (claimed_at IS NULL OR claimed_at < ?) ORDER BY crawled_at LIMIT ?",
+                    (now - refresh_interval, now - self.claim_timeout, limit)
+                ).fetchall()
+                conn.executemany("UPDATE crawl_areas SET claimed_at = ? WHERE id = ?", [(now, row['id']) for row in rows])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return [(row['lat'], row['lng'], row['radius']) for row in rows]
+
+    def store_area(self, lat, lng, radius, places):
+        """Store the places found by crawling an area and mark the area as crawled now
+
+        Each place needs geometry.location; utc_offset is used to evaluate opening hours.
+        """
+        now = time.time()
+        records = []
+        for place in places:
+            try:
+                location = place['geometry']['location']
+                details = {key: value for key, value in place.items() if key not in LOCATION_FIELDS}
+                records.append((place['place_id'], float(location['lat']), float(location['lng']),
+                                place.get('utc_offset'), json.dumps(details), now))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO restaurants (place_id, lat, lng, utc_offset, details, crawled_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", records
+                )
+                key = _area_key(lat, lng, radius)
+                conn.execute("INSERT OR IGNORE INTO crawl_areas (lat, lng, radius) VALUES (?, ?, ?)", key)
+                conn.execute(
+                    "UPDATE crawl_areas SET crawled_at = ?, claimed_at = NULL WHERE lat = ? AND lng = ? AND radius = ?",
+                    (now, *key)
+                )
+            self._dirty = True
+        return len(records)
+
+    def stats(self):
+        self._refresh_index()
+        fresh_after = time.time() - self.max_age
+        lookups = self.hits + self.misses
+        return {
+            "restaurants": self._count,
+            "areas": len(self._areas),
+            "fresh_areas": sum(1 for area in self._areas if area[3] >= fresh_after),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,168 @@
+"""
+Vectorized scoring of meal candidates against calorie, macro and price targets.
+
+Takes parallel sequences (or NumPy arrays) of calories, protein, carbs, fats
+and price for any number of candidates and computes in-range masks, relative
+deviations, a weighted score and a ranking in a single NumPy pass. Also ranks
+restaurants against the user's price range, cuisines and ratings before they
+are packed into the prompt.
+"""
+
+import numpy as np
+
+from optimizer import TARGET_WEIGHTS
+
+# (low, high) multipliers of the target, the same bands validate_recommendations has always used
+CALORIE_BOUNDS = (0.85, 1.15)
+MACRO_BOUNDS = (0.55, 1.45)
+
+# Extra score per dollar outside the price range, relative to the range's upper bound
+PRICE_WEIGHT = 0.5
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def as_array(values):
+    """Convert a sequence to a float array; values that are not numbers become NaN"""
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'fiu':
+        return values.astype(float, copy=False)
+    return np.array([_to_float(value) for value in values], dtype=float)
+
+
+def _present(values, array):
+    """Mask of values that count as given (validate_recommendations treats 0 and None as missing)"""
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'fiu':
+        return array != 0
+    return np.array([bool(value) for value in values], dtype=bool)
+
+
+def _target(value):
+    """Numeric target, or None when no target is set"""
+    return _to_float(value) if value else None
+
+
+def score_candidates(calories, protein, carbs, fats, price, preferences, enforce_price=True):
+    """Score candidates against the targets in preferences
+
+    Returns a dict of arrays:
+    - values: {name: float array}, NaN where a value is not a number
+    - in_range: {name: bool mask}; missing values and missing targets count as in range
+    - required_ok: calories and (if enforce_price) price are in range
+    - deviation: {name: relative distance |value - target| / target}, 0 without a target
+    - score: weighted distance to the targets, lower is better; inf for non-numeric values
+    - order: indices sorted by required_ok first, then score
+    """
+    macros = preferences.get('macronutrients', {}) or {}
+    targets = {
+        "calories": _target(preferences.get('calorie_count')),
+        "protein": _target(macros.get('protein_grams')),
+        "carbs": _target(macros.get('carbs_grams')),
+        "fats": _target(macros.get('fats_grams'))
+    }
+    price_range = preferences.get('price_range', [10, 25])
+    min_price, max_price = float(price_range[0]), float(price_range[1])
+
+    raw = {"calories": calories, "protein": protein, "carbs": carbs, "fats": fats, "price": price}
+    values = {name: as_array(column) for name, column in raw.items()}
+    present = {name: _present(raw[name], values[name]) for name in raw}
+    count = len(values["calories"])
+
+    in_range = {}
+    deviation = {}
+    score = np.zeros(count)
+    for name, target in targets.items():
+        value = values[name]
+        if target is None:
+            in_range[name] = np.ones(count, dtype=bool)
+            deviation[name] = np.zeros(count)
+            continue
+        low, high = CALORIE_BOUNDS if name == 'calories' else MACRO_BOUNDS
+        within = (value >= target * low) & (value <= target * high)
+        in_range[name] = ~present[name] | within
+        deviation[name] = np.where(present[name], np.abs(value - target) / target, 0.0)
+        score += TARGET_WEIGHTS[name] * deviation[name]
+
+    price_value = values["price"]
+    in_range["price"] = ~present["price"] | ((price_value >= min_price) & (price_value <= max_price))
+    price_gap = np.where(present["price"], np.maximum(min_price - price_value, 0) + np.maximum(price_value - max_price, 0), 0.0)
+    deviation["price"] = price_gap / max_price if max_price else price_gap
+    score += PRICE_WEIGHT * deviation["price"]
+
+    # Non-numeric values can never be ranked ahead of real numbers
+    score = np.where(np.isnan(score), np.inf, score)
+
+    required_ok = in_range["calories"] & in_range["price"] if enforce_price else in_range["calories"].copy()
+    order = np.lexsort((score, ~required_ok))
+
+    return {
+        "values": values,
+        "in_range": in_range,
+        "required_ok": required_ok,
+        "deviation": deviation,
+        "score": score,
+        "order": order
+    }
+
+
+# Typical meal cost in dollars for each Google Places price_level
+PRICE_LEVEL_COST = {1: 10.0, 2: 20.0, 3: 35.0, 4: 60.0}
+
+# Relative weight of each signal when pre-ranking restaurants
+RESTAURANT_WEIGHTS = {"price": 1.0, "cuisine": 1.0, "rating": 0.5, "open_now": 0.25}
+
+
+def score_restaurant(restaurant, preferences):
+    """Score how well a restaurant fits the preferences (higher is better)
+
+    Combines fit of its price_level to the price range, a match on the
+    preferred cuisines, its rating and whether it is open now.
+    """
+    price_range = preferences.get('price_range', [10, 25])
+    min_price, max_price = float(price_range[0]), float(price_range[1])
+
+    score = 0.0
+    cost = PRICE_LEVEL_COST.get(restaurant.get('price_level'))
+    if cost is not None and max_price > 0:
+        gap = max(min_price - cost, 0.0) + max(cost - max_price, 0.0)
+        score += RESTAURANT_WEIGHTS["price"] * (1.0 - min(gap / max_price, 1.0))
+    else:
+        # Unknown price level: neither rewarded nor ruled out
+        score += RESTAURANT_WEIGHTS["price"] * 0.5
+
+    cuisines = [str(c).strip().lower() for c in preferences.get('cuisine_preferences', []) or [] if c]
+    if cuisines:
+        haystack = ' '.join([str(restaurant.get('name', ''))] + [str(t) for t in restaurant.get('types', []) or []]).lower()
+        if any(cuisine in haystack for cuisine in cuisines):
+            score += RESTAURANT_WEIGHTS["cuisine"]
+
+    try:
+        rating = float(restaurant.get('rating') or 0)
+    except (TypeError, ValueError):
+        rating = 0.0
+    score += RESTAURANT_WEIGHTS["rating"] * min(max(rating, 0.0), 5.0) / 5.0
+
+    if (restaurant.get('opening_hours') or {}).get('open_now'):
+        score += RESTAURANT_WEIGHTS["open_now"]
+    return score
+
+
+def max_restaurant_score():
+    """Highest score_restaurant any restaurant can be expected to reach
+
+    Leaves out the cuisine weight: Place types do not name cuisines, so only a
+    restaurant whose name matches earns it. Such a match still lifts a score
+    above this.
+    """
+    return sum(weight for signal, weight in RESTAURANT_WEIGHTS.items() if signal != "cuisine")
+
+
+def rank_restaurants(restaurants, preferences):
+    """Return restaurants ordered by score_restaurant, best first; ties keep their original order"""
+    scored = [(-score_restaurant(restaurant, preferences), i) for i, restaurant in enumerate(restaurants)]
+    scored.sort()
+    return [restaurants[i] for _, i in scored]
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Tests import the server modules the way app.py does, from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep request logs written by app.py out of the source tree
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="nutrigo-test-logs-"))
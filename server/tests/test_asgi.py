@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import app as nutrigo
+import asgi
+
+BAD_PREFERENCES = {"preferences": {"zipcode": "46601", "calorie_count": 700, "price_range": [10]}}
+
+
+@pytest.fixture
+def fake_upstreams(monkeypatch):
+    monkeypatch.setenv("NUTRIGO_FAKE_UPSTREAMS", "true")
+    monkeypatch.setenv("FAKE_MAPS_LATENCY", "0")
+    monkeypatch.setenv("FAKE_OPENAI_LATENCY", "0")
+    monkeypatch.setattr(nutrigo, 'HEALTH_PROBE_ENABLED', False)
+    monkeypatch.setattr(asgi, 'maps_http', None)
+    monkeypatch.setattr(asgi, 'async_client', None)
+    for name in ('client', 'gmaps', 'maps_api_available', 'clients_initialized'):
+        monkeypatch.setattr(nutrigo, name, getattr(nutrigo, name))
+
+
+def post(path, content, headers=None):
+    async def main():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, content=content, headers={"content-type": "application/json", **(headers or {})})
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("path", ["/api/recommendations", "/api/recommendations/stream"])
+def test_failure_before_streaming_returns_the_flask_error_shape(fake_upstreams, path):
+    response = post(path, json.dumps(BAD_PREFERENCES))
+    flask_response = nutrigo.app.test_client().post(path, json=BAD_PREFERENCES)
+
+    assert response.status_code == flask_response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == flask_response.get_json()
+    assert response.json()["error"].startswith("Server error: ")
+    assert response.json()["recommendations"] == []
+
+
+@pytest.mark.parametrize("body", [b'{"preferences": ', b'\xff\xfe{"preferences": {}}'])
+def test_body_that_is_not_json_is_a_bad_request(fake_upstreams, body):
+    response = post("/api/recommendations", body)
+    assert response.status_code == 400
+    assert response.json() == {"error": "Request body is not valid JSON"}
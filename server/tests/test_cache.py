@@ -0,0 +1,261 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import (AsyncSingleFlight, AsyncStreamingSingleFlight, SingleFlight, StaleWhileRevalidateCache,
+                   StreamingSingleFlight)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_fresh_hit_does_not_call_the_loader(clock):
+    swr = StaleWhileRevalidateCache(ttl=10, stale_ttl=100)
+    swr.set('k', 'old')
+    clock.now += 9
+
+    def loader():
+        raise AssertionError("loader called on a fresh hit")
+
+    assert swr.get('k', loader) == 'old'
+    assert swr.stale_hits == 0
+
+
+def test_stale_hit_returns_old_value_and_refreshes_once(clock):
+    swr = StaleWhileRevalidateCache(ttl=10, stale_ttl=100)
+    swr.set('k', 'old')
+    clock.now += 11
+
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return 'new'
+
+    assert swr.get('k', loader) == 'old'
+    assert swr.get('k', loader) == 'old'
+    release.set()
+    wait_for(lambda: swr.refreshes == 1)
+
+    assert len(calls) == 1
+    assert swr.stale_hits == 2
+    assert swr.get('k', loader) == 'new'
+    assert len(calls) == 1
+
+
+def test_entry_past_stale_ttl_is_a_miss(clock):
+    swr = StaleWhileRevalidateCache(ttl=10, stale_ttl=100)
+    swr.set('k', 'old')
+    clock.now += 111
+
+    def loader():
+        raise AssertionError("expired entries are not refreshed in the background")
+
+    # The caller loads synchronously and stores the result
+    assert swr.get('k', loader) is None
+    swr.set('k', 'new')
+    assert swr.get('k', loader) == 'new'
+
+
+def test_should_cache_vetoes_a_refresh(clock):
+    swr = StaleWhileRevalidateCache(ttl=10, stale_ttl=100)
+    swr.set('k', 'old')
+    clock.now += 11
+
+    assert swr.get('k', lambda: 'fallback', should_cache=lambda value: value != 'fallback') == 'old'
+    wait_for(lambda: swr.refreshes == 1)
+    assert swr.get('k') == 'old'
+
+
+def run_concurrently(flight, fn, callers=5):
+    """Call flight.do('k', fn) from several threads; returns the threads and their results or errors"""
+    results = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do('k', fn)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(2)
+        return 'value'
+
+    threads, results = run_concurrently(flight, fn)
+    wait_for(lambda: flight.collapsed == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['value'] * 5
+
+
+def test_single_flight_error_reaches_every_waiter_and_releases_the_key():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(2)
+        raise ValueError("upstream down")
+
+    threads, results = run_concurrently(flight, fail)
+    wait_for(lambda: flight.collapsed == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()['in_flight'] == 0
+    assert flight.do('k', lambda: 'retried') == 'retried'
+    assert flight.executions == 2
+
+
+def test_async_single_flight_collapses_concurrent_calls():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'value'
+
+        results = await asyncio.gather(*(flight.do('k', fn) for _ in range(5)))
+        return calls, results, flight
+
+    calls, results, flight = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == ['value'] * 5
+    assert flight.collapsed == 4
+
+
+def test_async_single_flight_error_reaches_every_waiter_and_releases_the_key():
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        results = await asyncio.gather(*(flight.do('k', fail) for _ in range(3)), return_exceptions=True)
+
+        async def retried():
+            return 'retried'
+
+        return results, await flight.do('k', retried), flight
+
+    results, retried, flight = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == 'retried'
+    assert flight.executions == 2
+
+
+def test_streaming_single_flight_replays_emitted_items_to_a_late_joiner():
+    flight = StreamingSingleFlight()
+    published = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def produce(publish):
+        calls.append(1)
+        publish('a')
+        publish('b')
+        published.set()
+        release.wait(2)
+        publish('c')
+        return ['a', 'b', 'c']
+
+    first = flight.stream('k', produce)
+    assert published.wait(2)
+    late = flight.stream('k', produce)
+    release.set()
+
+    assert late is first
+    assert list(late) == ['a', 'b', 'c']
+    assert late.result() == ['a', 'b', 'c']
+    assert len(calls) == 1
+    assert flight.collapsed == 1
+
+
+def test_streaming_single_flight_error_reaches_readers_and_releases_the_key():
+    flight = StreamingSingleFlight()
+
+    def fail(publish):
+        publish('a')
+        raise ValueError("upstream down")
+
+    stream = flight.stream('k', fail)
+    items = []
+    with pytest.raises(ValueError):
+        for item in stream:
+            items.append(item)
+    assert items == ['a']
+    with pytest.raises(ValueError):
+        stream.result()
+
+    wait_for(lambda: flight.stats()['in_flight'] == 0)
+    assert flight.stream('k', lambda publish: 'retried').result() == 'retried'
+
+
+def test_async_streaming_single_flight_replays_emitted_items_to_a_late_joiner():
+    async def main():
+        flight = AsyncStreamingSingleFlight()
+        release = asyncio.Event()
+
+        async def produce(publish):
+            publish('a')
+            publish('b')
+            await release.wait()
+            publish('c')
+            return ['a', 'b', 'c']
+
+        first = flight.stream('k', produce)
+        await asyncio.sleep(0)
+        late = flight.stream('k', produce)
+        release.set()
+        items = [item async for item in late]
+        return first, late, items, await late.result(), flight
+
+    first, late, items, value, flight = asyncio.run(main())
+    assert late is first
+    assert items == ['a', 'b', 'c']
+    assert value == ['a', 'b', 'c']
+    assert flight.executions == 1
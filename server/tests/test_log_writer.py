@@ -0,0 +1,28 @@
+import glob
+import os
+
+from log_writer import LogWriter, read_entries
+
+
+def test_entry_is_logged_as_it_was_when_written(tmp_path):
+    writer = LogWriter(log_dir=str(tmp_path), flush_interval=0.01)
+    data = {"recommendations": [{"dish_name": "Bowl"}]}
+    writer.write({"type": "final_recommendations", "data": data})
+    data["recommendations"].append({"dish_name": "Added later"})
+    data["unserializable"] = object()
+    writer.flush()
+
+    [path] = glob.glob(os.path.join(str(tmp_path), "*.jsonl"))
+    assert path.endswith(f"-{os.getpid()}.jsonl")
+    [entry] = read_entries(path)
+    assert entry["data"] == {"recommendations": [{"dish_name": "Bowl"}]}
+
+
+def test_text_that_is_not_json_is_kept_raw(tmp_path):
+    writer = LogWriter(log_dir=str(tmp_path), flush_interval=0.01)
+    writer.write({"type": "openai_response", "data": '{"recommendations": []}'})
+    writer.write({"type": "openai_response", "data": "not json"})
+    writer.flush()
+
+    [path] = glob.glob(os.path.join(str(tmp_path), "*.jsonl"))
+    assert [entry["data"] for entry in read_entries(path)] == [{"recommendations": []}, {"raw_text": "not json"}]
@@ -0,0 +1,86 @@
+import csv
+import json
+
+import pytest
+
+from menu_store import MenuStore
+
+
+def item(name, calories, protein=30, carbs=40, fats=10, price=10.0):
+    return {"name": name, "calories": calories, "protein": protein, "carbs": carbs, "fats": fats, "price": price}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MenuStore(str(tmp_path / "menus.db"))
+
+
+def write_json(tmp_path, menus):
+    path = tmp_path / "menus.json"
+    path.write_text(json.dumps(menus))
+    return str(path)
+
+
+def test_import_json(store, tmp_path):
+    path = write_json(tmp_path, {
+        "place-a": [item("Bowl", 600), item("Salad", 350)],
+        "place-b": [item("Wrap", 500), {"name": "No nutrition"}]
+    })
+
+    # Items without every nutrition column are skipped
+    assert store.import_file(path) == 3
+    assert store.stats() == {"items": 3, "restaurants": 2}
+    assert [i["name"] for i in store.get_menu("place-a")] == ["Salad", "Bowl"]
+
+
+def test_import_csv_accepts_restaurant_key_or_place_id(store, tmp_path):
+    path = tmp_path / "menus.csv"
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["restaurant_key", "place_id", "name", "calories", "protein", "carbs", "fats", "price"])
+        writer.writeheader()
+        writer.writerow({"restaurant_key": "place-a", "name": "Bowl", "calories": 600, "protein": 40, "carbs": 60, "fats": 20, "price": 12.5})
+        writer.writerow({"place_id": "place-b", "name": "Wrap", "calories": 500, "protein": 30, "carbs": 50, "fats": 15, "price": 9})
+        writer.writerow({"name": "Orphan", "calories": 400, "protein": 20, "carbs": 40, "fats": 10, "price": 8})
+
+    assert store.import_file(str(path)) == 2
+    assert store.get_menu("place-a") == [{"name": "Bowl", "calories": 600.0, "protein": 40.0, "carbs": 60.0, "fats": 20.0, "price": 12.5}]
+    assert [i["name"] for i in store.get_menu("place-b")] == ["Wrap"]
+
+
+def test_import_replaces_a_restaurants_menu(store, tmp_path):
+    store.import_file(write_json(tmp_path, {"place-a": [item("Bowl", 600), item("Salad", 350)], "place-b": [item("Wrap", 500)]}))
+    store.import_file(write_json(tmp_path, {"place-a": [item("Bowl", 650)]}))
+
+    assert store.get_menu("place-a") == [item("Bowl", 650.0, 30.0, 40.0, 10.0)]
+    # Restaurants missing from the new file keep their items
+    assert [i["name"] for i in store.get_menu("place-b")] == ["Wrap"]
+
+
+def test_get_menus_returns_only_known_keys(store):
+    store.import_items([("place-a", item("Bowl", 600)), ("place-b", item("Wrap", 500))])
+
+    menus = store.get_menus(["place-a", "place-missing", None])
+    assert list(menus) == ["place-a"]
+    assert store.get_menus([]) == {}
+
+
+def test_closest_items_orders_by_calorie_distance(store):
+    store.import_items([("place-a", item(name, calories)) for name, calories in
+                        [("Soup", 200), ("Salad", 350), ("Bowl", 600), ("Burger", 900), ("Platter", 1400)]])
+    store.import_items([("place-b", item("Other", 590))])
+
+    assert [i["name"] for i in store.closest_items("place-a", 620, limit=3)] == ["Bowl", "Salad", "Burger"]
+
+
+def test_find_items_filters_by_ranges_and_price(store):
+    store.import_items([
+        ("place-a", item("Bowl", 600, protein=45, price=12)),
+        ("place-a", item("Salad", 350, protein=20, price=9)),
+        ("place-b", item("Steak", 800, protein=60, price=28)),
+        ("place-b", item("Wrap", 550, protein=35, price=10))
+    ])
+
+    found = store.find_items(calories=(500, 900), protein=(30, 70), max_price=20)
+    assert sorted((i["restaurant_key"], i["name"]) for i in found) == [("place-a", "Bowl"), ("place-b", "Wrap")]
+    assert [i["name"] for i in store.find_items(key="place-b", protein=(50, 100))] == ["Steak"]
+    assert len(store.find_items(limit=2)) == 2
@@ -0,0 +1,65 @@
+import itertools
+import random
+import time
+
+from optimizer import CALORIE_TOLERANCE, find_meal_combinations, get_targets, score_totals
+
+
+def make_menu(count, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        protein, carbs, fats = rng.uniform(2, 60), rng.uniform(5, 120), rng.uniform(1, 45)
+        items.append({
+            "name": f"Item {i}",
+            "calories": round(4 * protein + 4 * carbs + 9 * fats),
+            "protein": round(protein),
+            "carbs": round(carbs),
+            "fats": round(fats),
+            "price": round(rng.uniform(2, 16), 2)
+        })
+    return items
+
+
+def make_preferences(calories):
+    return {
+        "calorie_count": calories,
+        "macronutrients": {
+            "protein_grams": round(calories * 0.3 / 4),
+            "carbs_grams": round(calories * 0.4 / 4),
+            "fats_grams": round(calories * 0.3 / 9)
+        },
+        "price_range": [10, 40]
+    }
+
+
+def brute_force_scores(items, preferences, max_items, limit):
+    targets = get_targets(preferences)
+    low, high = targets["calories"] * (1 - CALORIE_TOLERANCE), targets["calories"] * (1 + CALORIE_TOLERANCE)
+    scores = []
+    for size in range(1, max_items + 1):
+        for combination in itertools.combinations(items, size):
+            totals = {name: sum(item[name] for item in combination) for name in ('calories', 'protein', 'carbs', 'fats', 'price')}
+            if low <= totals["calories"] <= high and targets["min_price"] <= totals["price"] <= targets["max_price"]:
+                scores.append(round(score_totals(totals, targets), 4))
+    return sorted(scores)[:limit]
+
+
+def test_matches_exhaustive_search():
+    for seed in range(20):
+        items = make_menu(25, seed)
+        preferences = make_preferences(random.Random(seed).choice([500, 800, 1200, 1500]))
+        found = [combination["score"] for combination in find_meal_combinations(items, preferences, max_items=3, limit=3)]
+        assert found == brute_force_scores(items, preferences, 3, 3)
+
+
+def test_large_menu_is_fast():
+    items = make_menu(150)
+    preferences = make_preferences(1500)
+    find_meal_combinations(items, preferences)
+    start = time.perf_counter()
+    combinations = find_meal_combinations(items, preferences)
+    elapsed = time.perf_counter() - start
+    assert len(combinations) == 3
+    # Runs on the request path for every restaurant with a menu; about 20 ms on a laptop
+    assert elapsed < 0.25
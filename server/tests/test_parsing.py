@@ -0,0 +1,102 @@
+import codecs
+import json
+
+import pytest
+
+from parsing import RecommendationStreamParser, parse_recommendations
+
+RECOMMENDATIONS = [
+    {"restaurant_name": "Café \"Brace\" {Bar}", "dish_name": "Bowl [large] \\ extra", "calories": 650,
+     "macronutrients": {"protein": 45, "carbs": 60, "fats": 20}, "price_range": 14.5},
+    {"restaurant_name": "Thai Kitchen", "dish_name": "Pad Thai é中", "calories": 720,
+     "macronutrients": {"protein": 30, "carbs": 90, "fats": 25}, "price_range": 12},
+    {"restaurant_name": "Green Place", "dish_name": "Salad } ] \"", "calories": 480,
+     "macronutrients": {"protein": 25, "carbs": 40, "fats": 18}, "price_range": 11}
+]
+PAYLOAD = json.dumps({"recommendations": RECOMMENDATIONS}, indent=2)
+ESCAPED_PAYLOAD = json.dumps({"recommendations": RECOMMENDATIONS}, ensure_ascii=True)
+
+
+def test_well_formed_json():
+    assert parse_recommendations(PAYLOAD) == {"recommendations": RECOMMENDATIONS}
+
+
+def test_top_level_array_is_wrapped():
+    assert parse_recommendations(json.dumps(RECOMMENDATIONS)) == {"recommendations": RECOMMENDATIONS}
+
+
+def test_code_fence():
+    assert parse_recommendations(f"```json\n{PAYLOAD}\n```") == {"recommendations": RECOMMENDATIONS}
+
+
+def test_prose_before_and_after():
+    text = f"Here are some meals that fit your goals:\n{PAYLOAD}\nEnjoy, and let me know if you need more!"
+    assert parse_recommendations(text) == {"recommendations": RECOMMENDATIONS}
+
+
+def test_trailing_garbage():
+    assert parse_recommendations(PAYLOAD + '}\n]"extra') == {"recommendations": RECOMMENDATIONS}
+
+
+def test_truncated_array_keeps_complete_objects():
+    cut = PAYLOAD.index('"Green Place"')
+    assert parse_recommendations(PAYLOAD[:cut]) == {"recommendations": RECOMMENDATIONS[:2]}
+
+
+def test_truncated_inside_a_string_with_a_brace():
+    cut = PAYLOAD.index('Salad }') + len('Salad }')
+    assert parse_recommendations(PAYLOAD[:cut]) == {"recommendations": RECOMMENDATIONS[:2]}
+
+
+def test_nothing_recoverable_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse_recommendations('Sorry, I cannot help with that. {"recommendations": [{"dish_name": "Bo')
+    with pytest.raises(json.JSONDecodeError):
+        parse_recommendations('')
+
+
+def feed_chunks(chunks):
+    parser = RecommendationStreamParser()
+    found = []
+    for chunk in chunks:
+        found.extend(parser.feed(chunk))
+    return found, parser
+
+
+@pytest.mark.parametrize("payload", [PAYLOAD, ESCAPED_PAYLOAD, f"```json\n{PAYLOAD}\n```"])
+def test_stream_split_at_every_offset(payload):
+    for offset in range(len(payload) + 1):
+        found, parser = feed_chunks([payload[:offset], payload[offset:]])
+        assert found == RECOMMENDATIONS, f"split at {offset}"
+        assert parser.done
+
+
+@pytest.mark.parametrize("payload", [PAYLOAD, ESCAPED_PAYLOAD])
+def test_stream_one_character_at_a_time(payload):
+    found, parser = feed_chunks(payload)
+    assert found == RECOMMENDATIONS
+    assert parser.errors == 0
+
+
+def test_stream_utf8_split_at_every_byte_offset():
+    # Bytes decoded incrementally, the way a streamed HTTP body is turned into text
+    data = PAYLOAD.encode('utf-8')
+    for offset in range(len(data) + 1):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        found, _ = feed_chunks([decoder.decode(data[:offset]), decoder.decode(data[offset:], final=True)])
+        assert found == RECOMMENDATIONS, f"split at byte {offset}"
+
+
+def test_stream_returns_each_object_once_as_it_closes():
+    parser = RecommendationStreamParser()
+    first_end = PAYLOAD.index('"Thai Kitchen"')
+    assert parser.feed(PAYLOAD[:first_end]) == RECOMMENDATIONS[:1]
+    assert parser.feed(PAYLOAD[first_end:]) == RECOMMENDATIONS[1:]
+    assert parser.feed('{"dish_name": "after the array"}') == []
+
+
+def test_stream_counts_invalid_objects_and_keeps_going():
+    text = '{"recommendations": [{"dish_name": tru}, {"dish_name": "Bowl"}]}'
+    found, parser = feed_chunks([text[:25], text[25:]])
+    assert found == [{"dish_name": "Bowl"}]
+    assert parser.errors == 1
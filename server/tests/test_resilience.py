@@ -0,0 +1,237 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import resilience
+from app import is_transient_openai_error
+from resilience import (Deadline, DeadlineExceeded, async_hedged_call, async_retry_call, hedged_call,
+                        retry_call)
+
+
+class Clock:
+    """Fake monotonic clock whose sleep only advances time"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+STATUS_ERRORS = {
+    400: openai.BadRequestError,
+    401: openai.AuthenticationError,
+    404: openai.NotFoundError,
+    429: openai.RateLimitError,
+    500: openai.InternalServerError,
+    503: openai.InternalServerError
+}
+
+
+def status_error(status):
+    """The error the OpenAI SDK raises for an HTTP status"""
+    response = httpx.Response(status, request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+    return STATUS_ERRORS[status](f"HTTP {status}", response=response, body=None)
+
+
+def failing(errors, result='ok'):
+    """fn that raises each of errors in turn, then returns result; records its calls"""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+def test_deadline_timeout_is_cut_to_the_time_left(clock):
+    deadline = Deadline(5)
+    assert deadline.timeout(20) == 5
+    clock.now += 4
+    assert deadline.timeout(20) == pytest.approx(1)
+    clock.now += 1
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(20)
+
+
+def test_backoff_never_sleeps_past_the_deadline(clock, monkeypatch):
+    for seed in range(50):
+        monkeypatch.setattr(resilience, 'random', random.Random(seed))
+        start = clock.now
+        deadline = Deadline(3)
+        fn = failing([TimeoutError()] * 100)
+        with pytest.raises(TimeoutError):
+            retry_call(fn, retries=100, base_delay=0.5, max_delay=4, deadline=deadline)
+        assert clock.now - start < 3
+        assert len(fn.calls) == len(clock.sleeps) + 1
+        clock.sleeps.clear()
+
+
+def test_retries_transient_errors_until_success(clock):
+    fn = failing([status_error(429), status_error(503), openai.APIConnectionError(request=httpx.Request('POST', 'https://x'))])
+    retried = []
+    assert retry_call(fn, retries=3, base_delay=0.1, max_delay=1, should_retry=is_transient_openai_error,
+                      on_retry=lambda error, attempt: retried.append(attempt)) == 'ok'
+    assert retried == [0, 1, 2]
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(clock, status):
+    fn = failing([status_error(status)])
+    with pytest.raises(openai.APIStatusError):
+        retry_call(fn, retries=3, base_delay=0.1, max_delay=1, should_retry=is_transient_openai_error)
+    assert len(fn.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_gives_up_after_the_last_retry(clock):
+    fn = failing([status_error(500)] * 5)
+    with pytest.raises(openai.InternalServerError):
+        retry_call(fn, retries=2, base_delay=0.1, max_delay=1, should_retry=is_transient_openai_error)
+    assert len(fn.calls) == 3
+
+
+def test_async_retry_stops_at_client_errors_and_the_deadline():
+    async def main():
+        fn_calls = []
+
+        async def bad_request():
+            fn_calls.append(1)
+            raise status_error(400)
+
+        with pytest.raises(openai.BadRequestError):
+            await async_retry_call(bad_request, retries=3, base_delay=0.01, max_delay=0.01,
+                                   should_retry=is_transient_openai_error)
+        assert len(fn_calls) == 1
+
+        async def rate_limited():
+            raise status_error(429)
+
+        start = time.monotonic()
+        with pytest.raises(openai.RateLimitError):
+            await async_retry_call(rate_limited, retries=100, base_delay=0.05, max_delay=0.1,
+                                   deadline=Deadline(0.3), should_retry=is_transient_openai_error)
+        assert time.monotonic() - start < 0.3
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def test_hedge_is_not_started_before_the_delay(executor):
+    calls = []
+    hedges = []
+
+    def fn():
+        calls.append(1)
+        return 'fast'
+
+    assert hedged_call(fn, 0.5, executor, on_hedge=lambda: hedges.append(1)) == 'fast'
+    assert calls == [1]
+    assert hedges == []
+
+
+def test_hedge_fires_after_the_delay_and_first_success_wins(executor):
+    release_first = threading.Event()
+    started = []
+
+    def fn():
+        started.append(time.monotonic())
+        if len(started) == 1:
+            release_first.wait(2)
+            return 'first'
+        return 'second'
+
+    hedges = []
+    start = time.monotonic()
+    assert hedged_call(fn, 0.05, executor, on_hedge=lambda: hedges.append(1)) == 'second'
+    release_first.set()
+    assert hedges == [1]
+    assert started[1] - start >= 0.05
+
+
+def test_hedge_error_does_not_mask_a_later_success(executor):
+    first_failed = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.1)
+            first_failed.set()
+            raise TimeoutError("first attempt timed out")
+        first_failed.wait(2)
+        time.sleep(0.05)
+        return 'second'
+
+    assert hedged_call(fn, 0.02, executor) == 'second'
+
+
+def test_hedge_raises_when_every_call_fails(executor):
+    def fn():
+        time.sleep(0.05)
+        raise TimeoutError("upstream down")
+
+    with pytest.raises(TimeoutError):
+        hedged_call(fn, 0.01, executor)
+
+
+def test_async_hedge_first_success_wins_and_errors_do_not_mask_it():
+    async def main():
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(0.1)
+                raise TimeoutError("first attempt timed out")
+            await asyncio.sleep(0.15)
+            return 'second'
+
+        hedges = []
+        result = await async_hedged_call(fn, 0.02, on_hedge=lambda: hedges.append(1))
+        return result, hedges
+
+    assert asyncio.run(main()) == ('second', [1])
+
+
+def test_async_hedge_is_not_started_before_the_delay():
+    async def main():
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            return 'fast'
+
+        return await async_hedged_call(fn, 0.5), calls
+
+    assert asyncio.run(main()) == ('fast', [1])
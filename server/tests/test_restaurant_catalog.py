@@ -0,0 +1,38 @@
+from restaurant_catalog import RestaurantCatalog
+
+# A geocode at the precision the Geocoding API returns
+LAT, LNG, RADIUS = 41.7001908, -86.2379328, 5000
+
+
+def make_places(lat, lng, count=3):
+    return [{
+        "place_id": f"place-{i}",
+        "name": f"Restaurant {i}",
+        "geometry": {"location": {"lat": lat + i * 0.001, "lng": lng}},
+        "utc_offset": 0,
+        "opening_hours": {"periods": [{"open": {"day": 0, "time": "0000"}}]}
+    } for i in range(count)]
+
+
+def test_crawled_area_covers_the_exact_geocode(tmp_path):
+    catalog = RestaurantCatalog(str(tmp_path / "catalog.db"))
+    assert catalog.request_area(LAT, LNG, RADIUS)
+    assert not catalog.covers(LAT, LNG, RADIUS)
+
+    # The crawler searches around the centre it claimed, which is stored rounded
+    [(lat, lng, radius)] = catalog.claim_areas(refresh_interval=0)
+    catalog.store_area(lat, lng, radius, make_places(lat, lng))
+
+    assert catalog.covers(LAT, LNG, RADIUS)
+    restaurants = catalog.nearby(LAT, LNG, RADIUS, open_now=True)
+    assert [r["place_id"] for r in restaurants] == ["place-0", "place-1", "place-2"]
+
+
+def test_area_stored_at_the_exact_geocode_covers_it(tmp_path):
+    catalog = RestaurantCatalog(str(tmp_path / "catalog.db"))
+    catalog.store_area(LAT, LNG, RADIUS, make_places(LAT, LNG))
+
+    assert catalog.covers(LAT, LNG, RADIUS)
+    assert catalog.nearby(LAT, LNG, RADIUS) is not None
+    # Slack is only for rounding, not for a circle that reaches well outside the area
+    assert not catalog.covers(LAT + 0.01, LNG, RADIUS)
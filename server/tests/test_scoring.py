@@ -0,0 +1,23 @@
+from scoring import RESTAURANT_WEIGHTS, max_restaurant_score, score_restaurant
+
+PREFERENCES = {"price_range": [10, 25], "cuisine_preferences": ["thai"]}
+
+
+def place(name, types=("restaurant", "food", "point_of_interest", "establishment")):
+    return {
+        "name": name,
+        "types": list(types),
+        "price_level": 2,
+        "rating": 5.0,
+        "opening_hours": {"open_now": True}
+    }
+
+
+def test_best_restaurant_without_a_cuisine_match_reaches_the_maximum():
+    # Place types never name a cuisine, so a well-fitting restaurant must still count as good
+    assert score_restaurant(place("Corner Bistro"), PREFERENCES) == max_restaurant_score()
+
+
+def test_cuisine_match_scores_above_the_maximum():
+    score = score_restaurant(place("Bangkok Thai Kitchen"), PREFERENCES)
+    assert score == max_restaurant_score() + RESTAURANT_WEIGHTS["cuisine"]
@@ -0,0 +1,64 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import tokens
+
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture
+def slow_tiktoken(monkeypatch):
+    """A tiktoken whose encoding files take until release is set to download"""
+    release = threading.Event()
+
+    def encoding_for_model(model):
+        release.wait(5)
+        return FakeEncoding()
+
+    monkeypatch.setattr(tokens, 'tiktoken', SimpleNamespace(encoding_for_model=encoding_for_model))
+    monkeypatch.setattr(tokens, '_encodings', {})
+    monkeypatch.setattr(tokens, '_loads', {})
+    monkeypatch.setattr(tokens, 'LOAD_TIMEOUT', 0.1)
+    yield release
+    release.set()
+
+
+def test_slow_download_falls_back_to_the_estimate(slow_tiktoken):
+    start = time.monotonic()
+    assert tokens.count_tokens("one two three four", "model") == 5
+    assert tokens.count_tokens("one two three four", "model") == 5
+    # Both calls together wait at most LOAD_TIMEOUT
+    assert time.monotonic() - start < 0.5
+
+    slow_tiktoken.set()
+    tokens._loads["model"][1].wait(1)
+    assert tokens.count_tokens("one two three four", "model") == 4
+
+
+def test_warm_starts_one_load(slow_tiktoken):
+    assert tokens.warm("model") is tokens.warm("model")
+    slow_tiktoken.set()
+    tokens._loads["model"][1].wait(1)
+    assert isinstance(tokens.get_encoding("model"), FakeEncoding)
+
+
+def test_failed_load_is_remembered(monkeypatch):
+    calls = []
+
+    def encoding_for_model(model):
+        calls.append(model)
+        raise OSError("no network")
+
+    monkeypatch.setattr(tokens, 'tiktoken', SimpleNamespace(encoding_for_model=encoding_for_model))
+    monkeypatch.setattr(tokens, '_encodings', {})
+    monkeypatch.setattr(tokens, '_loads', {})
+
+    assert tokens.count_tokens("abcdefgh", "model") == 2
+    assert tokens.count_tokens("abcdefgh", "model") == 2
+    assert calls == ["model"]
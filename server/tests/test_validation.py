@@ -0,0 +1,145 @@
+import math
+import random
+
+import app
+from optimizer import TARGET_WEIGHTS
+from scoring import PRICE_WEIGHT
+
+
+def baseline_validate(recommendations, preferences):
+    """The range checks validate_recommendations used before they were vectorized, in model order"""
+    target_calories = preferences.get('calorie_count')
+    target_macros = preferences.get('macronutrients', {})
+    targets = {name: target_macros.get(f'{name}_grams') for name in ('protein', 'carbs', 'fats')}
+
+    def is_within_range(value, target, low, high):
+        if not target or not value:
+            return True
+        try:
+            return float(target) * low <= float(value) <= float(target) * high
+        except (TypeError, ValueError):
+            return False
+
+    kept = []
+    seen_restaurants = set()
+    for rec in recommendations:
+        try:
+            calories = rec.get('calories', 0)
+            macros = rec.get('macronutrients', {})
+            restaurant_name = rec.get('restaurant_name', '')
+            if not is_within_range(calories, target_calories, 0.85, 1.15):
+                # The old code compared the value to build its message; non-numbers raised and were skipped
+                calories < float(target_calories) * 0.85
+                continue
+            missing = []
+            for name in ('protein', 'carbs', 'fats'):
+                value = macros.get(name, 0)
+                if not is_within_range(value, targets[name], 0.55, 1.45):
+                    direction = "Low" if value < float(targets[name]) * 0.55 else "High"
+                    missing.append(f"{direction} {name}: {value}g (target: {targets[name]}g)")
+            enhanced = {**rec, "missing_targets": missing, "matches_all_targets": not missing}
+            if missing:
+                suggestions = []
+                if any("Low carbs" in m for m in missing):
+                    suggestions.append("Add a side of rice, bread, or potatoes to increase carbs")
+                if any("Low protein" in m for m in missing):
+                    suggestions.append("Add grilled chicken or a protein shake to increase protein")
+                if any("Low fats" in m for m in missing):
+                    suggestions.append("Add avocado, dressing, or nuts to increase fats")
+                enhanced["suggestions"] = suggestions
+            if restaurant_name not in seen_restaurants or len(missing) <= 1:
+                kept.append(enhanced)
+                seen_restaurants.add(restaurant_name)
+        except Exception:
+            continue
+    return kept
+
+
+def baseline_distance(rec, preferences):
+    """Weighted relative distance to the targets, computed one value at a time"""
+    macros = preferences.get('macronutrients', {})
+    targets = {
+        "calories": preferences.get('calorie_count'),
+        "protein": macros.get('protein_grams'),
+        "carbs": macros.get('carbs_grams'),
+        "fats": macros.get('fats_grams')
+    }
+    rec_macros = rec.get('macronutrients', {})
+    values = {"calories": rec.get('calories', 0), **{name: rec_macros.get(name, 0) for name in ('protein', 'carbs', 'fats')}}
+    try:
+        distance = 0.0
+        for name, target in targets.items():
+            if target and values[name]:
+                distance += TARGET_WEIGHTS[name] * abs(float(values[name]) - float(target)) / float(target)
+        price = rec.get('price_range', 0)
+        if price:
+            min_price, max_price = (float(p) for p in preferences.get('price_range', [10, 25]))
+            gap = max(min_price - float(price), 0) + max(float(price) - max_price, 0)
+            distance += PRICE_WEIGHT * gap / max_price
+        return distance
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def random_value(rng, typical):
+    roll = rng.random()
+    if roll < 0.05:
+        return None
+    if roll < 0.1:
+        return 0
+    if roll < 0.13:
+        return "n/a"
+    if roll < 0.2:
+        return str(round(rng.uniform(0.3, 1.7) * typical))
+    if roll < 0.5:
+        return round(rng.uniform(0.3, 1.7) * typical, 1)
+    return round(rng.uniform(0.3, 1.7) * typical)
+
+
+def random_case(rng):
+    calories = rng.choice([None, 0, rng.randrange(300, 1500)])
+    preferences = {
+        "calorie_count": calories,
+        "macronutrients": {
+            "protein_grams": rng.choice([None, rng.randrange(20, 120)]),
+            "carbs_grams": rng.choice([None, rng.randrange(30, 200)]),
+            "fats_grams": rng.choice([None, rng.randrange(10, 80)])
+        },
+        "price_range": sorted([rng.randrange(5, 20), rng.randrange(15, 45)])
+    }
+    recommendations = []
+    for i in range(rng.randrange(0, 12)):
+        rec = {
+            "restaurant_name": f"Restaurant {rng.randrange(4)}",
+            "dish_name": f"Dish {i}",
+            "calories": random_value(rng, calories or 700),
+            "price_range": random_value(rng, 18)
+        }
+        roll = rng.random()
+        if roll < 0.05:
+            rec["macronutrients"] = None
+        elif roll < 0.95:
+            rec["macronutrients"] = {
+                "protein": random_value(rng, preferences["macronutrients"]["protein_grams"] or 40),
+                "carbs": random_value(rng, preferences["macronutrients"]["carbs_grams"] or 80),
+                "fats": random_value(rng, preferences["macronutrients"]["fats_grams"] or 30)
+            }
+        recommendations.append(rec)
+    return recommendations, preferences
+
+
+def test_validation_matches_baseline_on_random_inputs():
+    rng = random.Random(15)
+    for _ in range(500):
+        recommendations, preferences = random_case(rng)
+        limit = rng.choice([None, 1, 3, 5])
+
+        kept = baseline_validate(recommendations, preferences)
+        ranked = sorted(enumerate(kept), key=lambda pair: (round(baseline_distance(pair[1], preferences), 4), pair[0]))
+        expected = [rec for _, rec in ranked][:limit]
+
+        result = app.validate_recommendations({"recommendations": recommendations}, preferences, limit)
+        assert [{k: v for k, v in rec.items() if k != 'target_distance'} for rec in result] == expected
+        assert [rec['target_distance'] for rec in result] == [
+            round(baseline_distance(rec, preferences), 4) for rec in expected
+        ]
@@ -0,0 +1,85 @@
+"""
+Prompt token counting.
+
+Uses tiktoken's encoding for the model when it is installed and its encoding
+files can be loaded; otherwise falls back to the ~4 characters per token
+estimate. Encodings load in a background thread, so importing this module or
+counting tokens never blocks on the download for more than LOAD_TIMEOUT.
+"""
+
+import os
+import threading
+import time
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+
+# Seconds after a load starts that callers wait for it before estimating instead.
+# tiktoken downloads encoding files on first use, with no timeout of its own
+LOAD_TIMEOUT = 2.0
+
+_encodings = {}
+_loads = {}
+_lock = threading.Lock()
+
+
+def _load(model, ready):
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Remember the failure so we only try once
+        print(f"tiktoken encoding for {model} unavailable, estimating tokens: {str(e)}")
+        encoding = None
+    _encodings[model] = encoding
+    ready.set()
+
+
+def warm(model):
+    """Start loading the encoding for model in a background thread, once per process
+
+    Returns (started_at, ready event), or None without tiktoken.
+    """
+    if tiktoken is None:
+        return None
+    with _lock:
+        load = _loads.get(model)
+        # Threads do not survive fork, so a load started in a parent is started again
+        if load is None or load[2] != os.getpid():
+            ready = threading.Event()
+            load = _loads[model] = (time.monotonic(), ready, os.getpid())
+            threading.Thread(target=_load, args=(model, ready), name='tokenizer-load', daemon=True).start()
+    return load
+
+
+def get_encoding(model, timeout=None):
+    """Return the tiktoken encoding for model, or None if it is unavailable or still loading
+
+    Waits for a load in progress until timeout (default LOAD_TIMEOUT) seconds after
+    it started, so a slow download never holds up a request for longer than that.
+    """
+    encoding = _encodings.get(model)
+    if encoding is not None or model in _encodings:
+        return encoding
+    load = warm(model)
+    if load is None:
+        return None
+    started_at, ready, _ = load
+    if timeout is None:
+        timeout = LOAD_TIMEOUT
+    ready.wait(max(started_at + timeout - time.monotonic(), 0))
+    return _encodings.get(model)
+
+
+def count_tokens(text, model):
+    """Number of tokens text encodes to for model, estimated while the encoding is unavailable"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,136 @@
+"""
+Pooled HTTP transports for the Google Maps and OpenAI clients.
+
+googlemaps and openai each create an HTTP client with default settings when
+none is passed in. HttpPools builds them instead, with pools sized for the
+process's concurrency, connections kept alive between requests and separate
+connect and read timeouts, so TLS handshakes happen once per connection rather
+than on every request. stats() reports how busy each pool is and how many
+connections it has had to open.
+"""
+
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import h2  # httpx needs it for HTTP/2
+except ImportError:
+    h2 = None
+
+CONNECT_EVENT = 'connection.connect_tcp.complete'
+TLS_EVENT = 'connection.start_tls.complete'
+
+
+class ConnectionCounter:
+    """Connections and TLS handshakes opened by an httpx client, counted from httpcore's trace events"""
+
+    def __init__(self):
+        self.opened = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def record(self, event_name):
+        if event_name == CONNECT_EVENT:
+            with self._lock:
+                self.opened += 1
+        elif event_name == TLS_EVENT:
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def hook(self, asynchronous=False):
+        """Request event hook that asks httpcore to report connection events to this counter"""
+        if asynchronous:
+            async def trace(event_name, info):
+                self.record(event_name)
+
+            async def attach(request):
+                request.extensions['trace'] = trace
+            return attach
+
+        def trace(event_name, info):
+            self.record(event_name)
+
+        def attach(request):
+            request.extensions['trace'] = trace
+        return attach
+
+
+class HttpPools:
+    """Creates pooled HTTP clients and reports their utilization by name"""
+
+    def __init__(self, pool_size, keepalive_expiry, connect_timeout, read_timeout, http2=False):
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        if http2 and h2 is None:
+            print("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def requests_session(self, name):
+        """requests.Session whose per-host pool holds pool_size connections (used by googlemaps)"""
+        session = requests.Session()
+        # Retries are left to the callers; pool_block=False opens extra connections rather than waiting
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        with self._lock:
+            self._pools[name] = ('requests', adapter, None)
+        return session
+
+    def httpx_client(self, name, timeout=None, asynchronous=False, transport=None):
+        """httpx client with pool_size keep-alive connections (used by openai and the ASGI app)"""
+        counter = ConnectionCounter()
+        kwargs = {
+            "timeout": timeout if timeout is not None else httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            "http2": self.http2,
+            "event_hooks": {"request": [counter.hook(asynchronous)]}
+        }
+        if transport is not None:
+            kwargs["transport"] = transport
+        http_client = httpx.AsyncClient(**kwargs) if asynchronous else httpx.Client(**kwargs)
+        with self._lock:
+            self._pools[name] = ('httpx', http_client, counter)
+        return http_client
+
+    def stats(self):
+        """{name: {"size", "in_use", "idle", "opened", ...}} for every pool created"""
+        with self._lock:
+            pools = list(self._pools.items())
+        return {name: self._pool_stats(kind, pool, counter) for name, (kind, pool, counter) in pools}
+
+    def _pool_stats(self, kind, pool, counter):
+        stats = {"size": self.pool_size, "in_use": 0, "idle": 0, "opened": 0}
+        if kind == 'requests':
+            # One urllib3 pool per host; each queue slot holds an idle connection or None
+            manager = pool.poolmanager
+            for key in list(manager.pools.keys()):
+                host_pool = manager.pools.get(key)
+                if host_pool is None:
+                    continue
+                idle = sum(1 for conn in list(host_pool.pool.queue) if conn is not None)
+                stats["idle"] += idle
+                stats["in_use"] += host_pool.pool.maxsize - host_pool.pool.qsize()
+                stats["opened"] += host_pool.num_connections
+            return stats
+
+        stats["opened"] = counter.opened
+        stats["tls_handshakes"] = counter.tls_handshakes
+        connection_pool = getattr(getattr(pool, '_transport', None), '_pool', None)
+        for conn in list(getattr(connection_pool, 'connections', [])):
+            if conn.is_idle():
+                stats["idle"] += 1
+            elif not conn.is_closed():
+                stats["in_use"] += 1
+        return stats